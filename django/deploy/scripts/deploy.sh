@@ -7,6 +7,8 @@ REPO_URL="https://github.com/LoopCh/web_fefu_2025"
 DB_NAME="fefu_lab_db"
 DB_USER="fefu_user"
 DB_PASSWORD="admin"
+# gunicorn.service - синхронные воркеры (WSGI), gunicorn-asgi.service - uvicorn-воркеры (ASGI)
+GUNICORN_UNIT="${GUNICORN_UNIT:-gunicorn.service}"
 
 echo "=== Деплой Django приложения ==="
 
@@ -88,12 +90,34 @@ sudo nginx -t
 
 # 9. Настройка и запуск Gunicorn 
 echo "[9/10] Настройка Gunicorn..."
-sudo cp "$PROJECT_DIR/deploy/systemd/gunicorn.service" /etc/systemd/system/
+sudo cp "$PROJECT_DIR/deploy/systemd/$GUNICORN_UNIT" /etc/systemd/system/gunicorn.service
 sudo systemctl daemon-reload
+# Кеш на диске переживает перезапуск: страницы и фрагменты отрисованы прежними шаблонами
+sudo -u www-data DJANGO_ENV=production \
+     DB_NAME="$DB_NAME" \
+     DB_USER="$DB_USER" \
+     DB_PASSWORD="$DB_PASSWORD" \
+     DB_HOST=localhost \
+     DB_PORT=5432 \
+     DJANGO_SECRET_KEY=your-secret-key-here-change-this \
+     "$PROJECT_DIR/venv/bin/python" manage.py invalidate_cache fefu_lab:page --settings=web_2025.settings
+# Аватары, загруженные до появления обработки или прерванные перезапуском
+sudo -u www-data DJANGO_ENV=production \
+     DB_NAME="$DB_NAME" \
+     DB_USER="$DB_USER" \
+     DB_PASSWORD="$DB_PASSWORD" \
+     DB_HOST=localhost \
+     DB_PORT=5432 \
+     DJANGO_SECRET_KEY=your-secret-key-here-change-this \
+     "$PROJECT_DIR/venv/bin/python" manage.py process_avatars --settings=web_2025.settings
 sudo systemctl restart gunicorn
 sudo systemctl enable gunicorn
 sudo systemctl restart nginx
 sudo systemctl enable nginx
+# Очистка истекших сессий по таймеру
+sudo cp "$PROJECT_DIR/deploy/systemd/fefu-clearsessions.service" "$PROJECT_DIR/deploy/systemd/fefu-clearsessions.timer" /etc/systemd/system/
+sudo systemctl daemon-reload
+sudo systemctl enable --now fefu-clearsessions.timer
 
 # 10. Проверка работоспособности
 echo "[10/10] Проверка доступности приложения..."
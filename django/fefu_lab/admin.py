@@ -1,5 +1,14 @@
-from django.contrib import admin
+import io
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
+from .forms import StudentImportForm
+from .importers import StudentImporter
 from .models import Student, Instructor, Course, Enrollment
 
 
@@ -28,6 +37,62 @@ class StudentAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.prefetch_related('enrollments')
+    
+    def get_urls(self):
+        urls = [
+            path(
+                'import-csv/',
+                self.admin_site.admin_view(self.import_csv),
+                name='fefu_lab_student_import_csv',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def import_csv(self, request):
+        """Массовый импорт студентов и записей на курсы из CSV"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        
+        report = None
+        if request.method == 'POST':
+            form = StudentImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                fh = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+                # Без пула процессов: fork внутри воркера gunicorn небезопасен,
+                # большие файлы загружаются командой import_students
+                # Ссылки сброса пароля админка не показывает: без пароля студент
+                # не сможет войти, поэтому пароль обязателен
+                importer = StudentImporter(
+                    hash_workers=1,
+                    max_passwords=settings.STUDENT_IMPORT_ADMIN_MAX_PASSWORDS,
+                    require_password=True,
+                )
+                try:
+                    report = importer.run(fh, dry_run=form.cleaned_data['dry_run'])
+                except UnicodeDecodeError:
+                    # Файл разбирается целиком до записи в БД - ничего не создано
+                    form.add_error('csv_file', 'Файл не в кодировке UTF-8: сохраните его как «CSV UTF-8»')
+                if report and report.created_users and not report.errors:
+                    self.message_user(
+                        request,
+                        f'Импортировано студентов: {report.created_users}, '
+                        f'записей на курсы: {report.created_enrollments}',
+                        messages.SUCCESS,
+                    )
+                    return redirect('admin:fefu_lab_student_changelist')
+        else:
+            form = StudentImportForm()
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Импорт студентов из CSV',
+            'form': form,
+            'report': report,
+            'max_passwords': settings.STUDENT_IMPORT_ADMIN_MAX_PASSWORDS,
+            'errors': sorted(report.errors.items()) if report else [],
+        }
+        return TemplateResponse(request, 'admin/fefu_lab/student/import_csv.html', context)
 
 
 @admin.register(Instructor)
@@ -87,7 +152,7 @@ class CourseAdmin(admin.ModelAdmin):
     )
     
     def enrolled_students(self, obj):
-        count = obj.enrollments.filter(status='ACTIVE').count()
+        count = obj.enrolled_count
         if count >= obj.max_students:
             color = 'red'
         elif count >= obj.max_students * 0.8:
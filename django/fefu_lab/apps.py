@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FefuLabConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fefu_lab'
+    
+    def ready(self):
+        # Регистрация обработчиков сигналов
+        from . import auth_cache, avatars, metrics, page_cache, search, sessions, stats  # noqa: F401
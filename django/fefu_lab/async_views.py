@@ -0,0 +1,141 @@
+"""
+Асинхронные версии страниц каталога для ASGI-воркеров (ASYNC_VIEWS).
+
+Данные читаются через асинхронный ORM; независимые чтения выполняются
+конкурентно (asyncio.gather). Шаблон рендерится в sync_to_async:
+контекст-процессоры обращаются к сессии, пользователю и сообщениям
+через синхронный API. Логика фильтров, пагинации, кеша страниц и
+условного GET общая с views.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.shortcuts import aget_object_or_404, render
+
+from .models import Student, Course
+from . import conditional, page_cache
+from .pagination import KeysetPaginator
+from .stats import get_site_stats
+from .views import COURSE_ORDERING, STUDENT_ORDERING, filter_courses, filter_students, keyset_ordering
+
+
+arender = sync_to_async(render)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def apaginate(request, queryset, ordering, per_page):
+    """views.paginate для асинхронных представлений: COUNT и строки через async ORM"""
+    if settings.KEYSET_PAGINATION or 'cursor' in request.GET:
+        paginator = KeysetPaginator(
+            queryset, keyset_ordering(queryset, ordering), per_page,
+            count_limit=settings.KEYSET_PAGINATION_COUNT_LIMIT
+        )
+        page, _ = await asyncio.gather(paginator.aget_page(request.GET.get('cursor')), paginator.acount())
+        return page
+    
+    paginator = Paginator(queryset, per_page)
+    # count - cached_property: заполняем заранее, get_page не выполнит запрос
+    paginator.count = await queryset.acount()
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = await alist(page.object_list)
+    return page
+
+
+@page_cache.cache_anonymous_page()
+async def home(request):
+    stats, recent_courses = await asyncio.gather(
+        sync_to_async(get_site_stats)(),
+        alist(Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')[:3]),
+    )
+    page_cache.depends_on(request, page_cache.CATALOG, page_cache.STATS, *page_cache.course_groups(recent_courses))
+    
+    ctx = {
+        "title": "Главная",
+        "total_students": stats['active_students'],
+        "total_courses": stats['active_courses'],
+        "total_instructors": stats['active_instructors'],
+        "recent_courses": recent_courses
+    }
+    return await arender(request, "fefu_lab/home.html", ctx)
+
+
+@conditional.conditional_page(conditional.student_list_state)
+async def student_list(request):
+    """Список студентов с поиском и фильтрацией"""
+    # Проверка FTS-таблицы поиска выполняет запрос
+    students, search_query, faculty = await sync_to_async(filter_students)(request)
+    page_obj = await apaginate(request, students, STUDENT_ORDERING, 10)
+    
+    context = {
+        'title': 'Студенты',
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'faculty': faculty,
+        'faculty_choices': Student.FACULTY_CHOICES
+    }
+    return await arender(request, 'fefu_lab/student_list.html', context)
+
+
+@conditional.conditional_page(conditional.student_detail_state)
+async def student_detail(request, student_id):
+    """Детальная информация о студенте"""
+    student = await aget_object_or_404(
+        Student.objects.select_related('user'),
+        pk=student_id,
+        is_active=True
+    )
+    
+    enrollments = await alist(student.enrollments.filter(status='ACTIVE').select_related('course__instructor'))
+    
+    context = {
+        'title': f'{student.full_name}',
+        'student': student,
+        'student_id': student_id,
+        'enrollments': enrollments
+    }
+    return await arender(request, 'fefu_lab/student_detail.html', context)
+
+
+@page_cache.cache_anonymous_page(params=('search', 'level', 'page', 'cursor'))
+@conditional.conditional_page(conditional.course_list_state)
+async def course_list(request):
+    """Список курсов"""
+    courses, search_query, level = await sync_to_async(filter_courses)(request)
+    page_obj = await apaginate(request, courses, COURSE_ORDERING, 9)
+    # Карточки курсов кешируются как фрагменты с версией курса в ключе
+    page_obj.object_list = await sync_to_async(page_cache.attach_versions)(page_obj.object_list)
+    page_cache.depends_on(request, page_cache.CATALOG, *page_cache.course_groups(page_obj.object_list))
+    
+    context = {
+        'title': 'Курсы',
+        'page_obj': page_obj,
+        'search_query': search_query,
+        'level': level,
+        'level_choices': Course.LEVEL_CHOICES,
+        'card_cache_timeout': settings.PAGE_CACHE_FRAGMENT_TIMEOUT,
+    }
+    return await arender(request, 'fefu_lab/course_list.html', context)
+
+
+@page_cache.cache_anonymous_page()
+@conditional.conditional_page(conditional.course_detail_state)
+async def course_detail(request, course_slug):
+    """Детальная информация о курсе"""
+    course = await aget_object_or_404(
+        Course.objects.select_related('instructor'),
+        slug=course_slug,
+        is_active=True
+    )
+    page_cache.depends_on(request, *page_cache.course_groups([course]))
+    
+    context = {
+        'title': course.title,
+        'course': course,
+        'course_slug': course_slug,
+    }
+    return await arender(request, 'fefu_lab/course_detail.html', context)
@@ -0,0 +1,129 @@
+"""
+Кеш пользователя сессии вместе с профилем.
+
+AuthenticationMiddleware загружает пользователя на каждый запрос; при
+AUTH_USER_CACHE снимок полей User и Student берется из кеша, и запрос
+к БД не выполняется. Снимок удаляется при сохранении или удалении
+пользователя и профиля, включая смену пароля и деактивацию.
+Изменения через QuerySet.update() сигналов не вызывают - после них
+нужно вызвать invalidate_user().
+
+Хеш пароля в снимок не попадает: кеш общий и хранится на диске. Для
+проверки сессии снимок содержит готовый HMAC get_session_auth_hash(),
+сам хеш загружается из БД при обращении к user.password.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import checks
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Student
+
+
+# Меняется при изменении формата снимка - старые записи просто не читаются
+SNAPSHOT_VERSION = 2
+
+# Поля User, которые не кешируются (загружаются отложенно)
+EXCLUDED_USER_FIELDS = ('password',)
+
+
+def is_enabled():
+    return getattr(settings, 'AUTH_USER_CACHE', False)
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+
+def cache_key(user_id):
+    return f'fefu_lab:auth_user:v{SNAPSHOT_VERSION}:{user_id}'
+
+
+def _snapshot(obj, exclude=()):
+    # Значения в виде для БД: FieldFile аватара хранится как имя файла
+    fields = [f for f in obj._meta.concrete_fields if f.attname not in exclude]
+    return [f.attname for f in fields], [f.get_prep_value(getattr(obj, f.attname)) for f in fields]
+
+
+def dump_user(user):
+    """Снимок пользователя и загруженного вместе с ним профиля"""
+    try:
+        profile = user.student_profile
+    except Student.DoesNotExist:
+        profile = None
+    return {
+        'user': _snapshot(user, exclude=EXCLUDED_USER_FIELDS),
+        'session_auth_hash': user.get_session_auth_hash(),
+        'profile': _snapshot(profile) if profile is not None else None,
+    }
+
+
+def _session_auth_hash(user, cached_hash):
+    def get_session_auth_hash():
+        # После set_password() хеш пароля загружен - HMAC считается заново
+        if 'password' in user.get_deferred_fields():
+            return cached_hash
+        return User.get_session_auth_hash(user)
+    return get_session_auth_hash
+
+
+def load_user(snapshot, using='default'):
+    # Поля, которых нет в снимке, становятся отложенными
+    user = User.from_db(using, *snapshot['user'])
+    user.get_session_auth_hash = _session_auth_hash(user, snapshot['session_auth_hash'])
+    profile = Student.from_db(using, *snapshot['profile']) if snapshot['profile'] else None
+    # Заполняем кеш связи в обе стороны, как это делает select_related
+    Student.user.field.remote_field.set_cached_value(user, profile)
+    if profile is not None:
+        Student.user.field.set_cached_value(profile, user)
+    return user
+
+
+def get_user(user_id):
+    """Пользователь с профилем из кеша или из БД (None, если не найден)"""
+    key = cache_key(user_id)
+    snapshot = _cache().get(key)
+    if snapshot is not None:
+        return load_user(snapshot)
+    try:
+        user = User.objects.select_related('student_profile').get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+    _cache().set(key, dump_user(user), timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    return user
+
+
+def invalidate_user(user_id):
+    if is_enabled():
+        _cache().delete(cache_key(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Локальный кеш процесса не видит инвалидацию из других воркеров"""
+    if not is_enabled():
+        return []
+    alias = getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache'):
+        return [checks.Warning(
+            f'AUTH_USER_CACHE использует локальный кеш процесса "{alias}"',
+            hint='Смена пароля или роли в одном воркере не сбросит снимок в других '
+                 'до истечения AUTH_USER_CACHE_TIMEOUT; используйте общий кеш.',
+            id='fefu_lab.W001',
+        )]
+    return []
@@ -0,0 +1,268 @@
+"""
+Обработка аватаров студентов (настройки AVATAR_*).
+
+Загрузка проверяется при валидации формы (размер файла, формат, число
+пикселей) и сохраняется как есть в avatars/incoming/ - закрытый для nginx
+каталог. После фиксации транзакции пул потоков воркера уменьшает
+изображение, делает квадратные миниатюры, кодирует их в JPEG и WebP без
+EXIF и сохраняет под именами с хешем содержимого: nginx отдает их с
+бессрочным кешированием. Затем аватар студента переключается на новое
+имя, исходный файл удаляется. POST профиля не ждет обработки.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger('fefu_lab.avatars')
+
+AVATAR_DIR = 'avatars/'
+INCOMING_DIR = 'avatars/incoming/'
+# avatars/<хеш>.jpg, avatars/<хеш>-<размер>.webp, ...
+PROCESSED_NAME = re.compile(r'^avatars/(?P<digest>[0-9a-f]{20})\.jpg$')
+
+Thumbnail = namedtuple('Thumbnail', 'size url webp_url')
+
+
+def upload_to(instance, filename):
+    """Исходная загрузка: случайное имя во временном каталоге (upload_to поля Student.avatar)"""
+    ext = os.path.splitext(filename)[1].lower()[:5]
+    return f'{INCOMING_DIR}{uuid.uuid4().hex}{ext}'
+
+
+def validate_avatar(value):
+    """Размер файла, формат и число пикселей новой загрузки (уже сохраненные файлы не читаются)"""
+    if getattr(value, '_committed', True):
+        return
+    max_size = settings.AVATAR_MAX_UPLOAD_SIZE
+    if value.size > max_size:
+        raise ValidationError(
+            f'Файл больше {max_size // 2 ** 20} МБ.', code='file_too_large'
+        )
+    value.seek(0)
+    try:
+        # Только заголовок: пиксели не декодируются
+        with Image.open(value) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('Файл не является изображением.', code='invalid_image')
+    finally:
+        value.seek(0)
+    if image_format not in settings.AVATAR_FORMATS:
+        raise ValidationError(
+            f'Поддерживаются форматы: {", ".join(settings.AVATAR_FORMATS)}.', code='invalid_format'
+        )
+    if width * height > settings.AVATAR_MAX_PIXELS:
+        raise ValidationError(f'Слишком большое изображение ({width}x{height}).', code='too_many_pixels')
+
+
+def is_processed(name):
+    return bool(name and PROCESSED_NAME.match(name))
+
+
+def variant_name(name, size=None, ext='jpg'):
+    """Имя варианта обработанного аватара: основное изображение или миниатюра size"""
+    digest = PROCESSED_NAME.match(name)['digest']
+    suffix = f'-{size}' if size else ''
+    return f'{AVATAR_DIR}{digest}{suffix}.{ext}'
+
+
+def variant_names(name):
+    names = [variant_name(name), variant_name(name, ext='webp')]
+    for size in settings.AVATAR_THUMBNAIL_SIZES:
+        names += [variant_name(name, size), variant_name(name, size, 'webp')]
+    return names
+
+
+def thumbnail(name, size=None):
+    """Миниатюра для шаблонов (по умолчанию наибольшая); None, пока аватар не обработан"""
+    if not is_processed(name):
+        return None
+    size = size or max(settings.AVATAR_THUMBNAIL_SIZES)
+    return Thumbnail(
+        size,
+        default_storage.url(variant_name(name, size)),
+        default_storage.url(variant_name(name, size, 'webp')),
+    )
+
+
+# -- обработка --------------------------------------------------------------
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=settings.AVATAR_JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=settings.AVATAR_WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _load(data):
+    """RGB-изображение не больше AVATAR_SIZE по большей стороне, повернутое по EXIF"""
+    size = settings.AVATAR_SIZE
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEG декодируется сразу с уменьшением в 2-8 раз
+        source.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            # Прозрачность - на белый фон: JPEG ее не поддерживает
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    # Метаданные (EXIF, ICC, XMP) в варианты не переносятся
+    image.info = {}
+    return image
+
+
+def render_variants(data):
+    """{имя: содержимое} всех вариантов аватара; имена - по хешу основного JPEG"""
+    image = _load(data)
+    main = _encode(image, 'JPEG')
+    name = f'{AVATAR_DIR}{hashlib.sha256(main).hexdigest()[:20]}.jpg'
+    variants = {name: main, variant_name(name, ext='webp'): _encode(image, 'WEBP')}
+    for size in settings.AVATAR_THUMBNAIL_SIZES:
+        thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[variant_name(name, size)] = _encode(thumb, 'JPEG')
+        variants[variant_name(name, size, 'webp')] = _encode(thumb, 'WEBP')
+    return name, variants
+
+
+def _delete_unused(name):
+    """Удалить варианты аватара, если он ни у кого не установлен (одинаковые файлы - одно имя)"""
+    from .models import Student
+
+    if not is_processed(name) or Student.objects.filter(avatar=name).exists():
+        return
+    for variant in variant_names(name):
+        default_storage.delete(variant)
+
+
+def _switch(student_id, source, name):
+    """Заменить аватар source на name, если студент не удален и не сменил аватар"""
+    from .models import Student
+
+    with transaction.atomic():
+        student = Student.objects.select_for_update().filter(pk=student_id).first()
+        if student is None or student.avatar.name != source:
+            return False
+        student.avatar = name
+        student.save(update_fields=['avatar', 'updated_at'])
+    return True
+
+
+def _discard(student_id, source, previous):
+    """Испорченная загрузка: студент возвращается к прежнему аватару (старые исходники не трогаются)"""
+    if source.startswith(INCOMING_DIR):
+        _switch(student_id, source, previous or None)
+        default_storage.delete(source)
+    return None
+
+
+def process(student_id, source, previous=None):
+    """
+    Обработать файл source (загрузку из incoming или старый исходник) и
+    переключить на него аватар студента. source и прежний аватар удаляются
+    только после переключения; при ошибке записи файлов ничего не удаляется.
+    """
+    # Прочие ошибки чтения хранилища не перехватываются: файл остается,
+    # process_avatars повторит обработку
+    try:
+        with default_storage.open(source) as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        logger.warning('Аватар %s студента %s не найден', source, student_id)
+        return _discard(student_id, source, previous)
+    try:
+        name, variants = render_variants(data)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        logger.warning('Аватар %s студента %s не обработан', source, student_id, exc_info=True)
+        return _discard(student_id, source, previous)
+
+    try:
+        for variant, content in variants.items():
+            # Одинаковое имя - одинаковое содержимое
+            if not default_storage.exists(variant):
+                default_storage.save(variant, ContentFile(content))
+    except Exception:
+        _delete_unused(name)
+        raise
+
+    if not _switch(student_id, source, name):
+        # Пока шла обработка, студент удален или загрузил другой аватар
+        _delete_unused(name)
+        if source.startswith(INCOMING_DIR):
+            default_storage.delete(source)
+        return None
+    default_storage.delete(source)
+    if previous and previous != name:
+        _delete_unused(previous)
+    return name
+
+
+def _process_in_pool(student_id, incoming, previous):
+    try:
+        process(student_id, incoming, previous)
+    except Exception:
+        logger.exception('Ошибка обработки аватара %s студента %s', incoming, student_id)
+    finally:
+        # Соединения с БД потока пула
+        connections.close_all()
+
+
+_executor = None
+
+
+def _reset_executor():
+    global _executor
+    _executor = None
+
+
+# Потоки пула не переживают fork: у воркера gunicorn - свой пул
+os.register_at_fork(after_in_child=_reset_executor)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        # Pillow отпускает GIL при декодировании, масштабировании и кодировании
+        _executor = ThreadPoolExecutor(max_workers=settings.AVATAR_WORKERS, thread_name_prefix='avatars')
+    return _executor
+
+
+def schedule(student_id, incoming, previous=None):
+    """Обработка после фиксации транзакции: в пуле (AVATAR_ASYNC) или сразу"""
+    def submit():
+        if settings.AVATAR_ASYNC:
+            executor().submit(_process_in_pool, student_id, incoming, previous)
+        else:
+            process(student_id, incoming, previous)
+    transaction.on_commit(submit)
+
+
+@receiver(post_save, sender='fefu_lab.Student')
+def avatar_uploaded(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    name = instance.avatar.name
+    if name and name.startswith(INCOMING_DIR):
+        # Модель еще помнит значение до сохранения
+        previous = getattr(instance, '_loaded_values', {}).get('avatar')
+        schedule(instance.pk, name, getattr(previous, 'name', previous))
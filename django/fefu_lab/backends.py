@@ -1,6 +1,40 @@
+from functools import lru_cache
+
 from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.core.exceptions import PermissionDenied
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+
+from . import auth_cache, throttle
+
+
+@lru_cache(maxsize=4)
+def _dummy_hash(hasher):
+    # Хеш вычисляется один раз на процесс (и на набор хешеров)
+    return make_password(get_random_string(32), hasher=hasher.algorithm)
+
+
+def dummy_password_check(password):
+    """Проверка пароля той же стоимости, что и для существующего пользователя"""
+    check_password(password, _dummy_hash(get_hasher()))
+
+
+def find_user(login):
+    """
+    Поиск по email без учета регистра (индекс по LOWER(email)), затем по
+    username - два индексированных запроса вместо OR по неиндексированному email
+    """
+    user = (
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(email_lower=login.strip().lower())
+        .order_by('pk')
+        .first()
+    )
+    if user is None:
+        user = User.objects.filter(username=login).first()
+    return user
 
 
 class EmailBackend(BaseBackend):
@@ -10,36 +44,42 @@ class EmailBackend(BaseBackend):
     
     def authenticate(self, request, username=None, password=None, **kwargs):
         """
-        Аутентификация пользователя по email и паролю
+        Аутентификация пользователя по email и паролю.
+        При неудаче выбрасывается PermissionDenied: следующие backend'ы
+        не должны хешировать тот же пароль повторно
         """
         if username is None or password is None:
             return None
         
-        try:
-            # Ищем пользователя по email
-            user = User.objects.get(Q(email=username) | Q(username=username))
-        except User.DoesNotExist:
-            # Запускаем хеширование пароля для защиты от timing атак
-            User().set_password(password)
-            return None
-        except User.MultipleObjectsReturned:
-            # Если несколько пользователей, возвращаем первого
-            user = User.objects.filter(Q(email=username) | Q(username=username)).first()
+        # Превышен лимит попыток - отказ до какого-либо хеширования
+        if throttle.is_blocked(request, username):
+            raise PermissionDenied
         
-        # Проверяем пароль
-        if user.check_password(password) and self.user_can_authenticate(user):
+        user = find_user(username)
+        if user is None:
+            # Выравнивание времени ответа без вычисления нового хеша
+            dummy_password_check(password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            throttle.reset(request, username)
             return user
         
-        return None
+        throttle.register_failure(request, username)
+        raise PermissionDenied
     
     def get_user(self, user_id):
         """
-        Получение пользователя по ID
+        Получение пользователя по ID вместе с профилем: роль проверяется
+        почти в каждом запросе, отдельный SELECT профиля не нужен
         """
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
+        if auth_cache.is_enabled():
+            user = auth_cache.get_user(user_id)
+        else:
+            try:
+                user = User.objects.select_related('student_profile').get(pk=user_id)
+            except User.DoesNotExist:
+                user = None
+        # Деактивированный пользователь теряет уже открытые сессии
+        return user if user is not None and self.user_can_authenticate(user) else None
     
     def user_can_authenticate(self, user):
         """
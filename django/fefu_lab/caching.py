@@ -0,0 +1,339 @@
+"""
+Кеш, общий для воркеров gunicorn (настройка CACHE_BACKEND).
+
+SQLiteCache хранит записи в файле SQLite на локальном диске: все процессы
+машины видят одни и те же значения и их удаление, add и incr атомарны
+(блокировки пересчета статистики и счетчики попыток входа работают между
+воркерами). RedisCache - для нескольких машин, LocMemCache - свой кеш в
+каждом процессе, только для разработки.
+
+Все три бэкенда считают попадания и промахи чтений по пространствам имен
+ключей ('fefu_lab:page', 'fefu_lab:login', ...); статистика отдается в
+/metrics/. CacheNamespace - ключи с общей версией пространства: смена
+версии (invalidate) сразу делает недействительными записи во всех воркерах.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache as DjangoLocMemCache
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+
+
+def namespace_of(key):
+    """Пространство имен ключа: два первых сегмента через ':' или все до последней точки"""
+    if ':' in key:
+        return ':'.join(key.split(':', 2)[:2])
+    return key.rsplit('.', 1)[0]
+
+
+class CacheStats:
+    """Попадания и промахи чтений кеша текущего процесса по пространствам имен"""
+    # Ограничение числа меток: ключи без пространства имен попадают в 'other'
+    MAX_NAMESPACES = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, key, hits=0, misses=0, stale=0):
+        namespace = namespace_of(key)
+        with self._lock:
+            counts = self._counts.get(namespace)
+            if counts is None:
+                if len(self._counts) >= self.MAX_NAMESPACES:
+                    namespace = 'other'
+                counts = self._counts.setdefault(namespace, {'hits': 0, 'misses': 0, 'stale': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+            counts['stale'] += stale
+
+    def snapshot(self):
+        with self._lock:
+            return {namespace: dict(counts) for namespace, counts in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+os.register_at_fork(after_in_child=stats.reset)
+
+_missing = object()
+
+
+@contextmanager
+def _immediate(db):
+    """Транзакция SQLite с блокировкой записи с самого начала (BEGIN IMMEDIATE)"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+class CacheStatsMixin:
+    """Учет попаданий и промахов get/get_many (get_or_set и кеш шаблонов работают через get)"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            stats.record(key, misses=1)
+            return default
+        stats.record(key, hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            if key in found:
+                stats.record(key, hits=1)
+            else:
+                stats.record(key, misses=1)
+        return found
+
+
+class LocMemCache(CacheStatsMixin, DjangoLocMemCache):
+    pass
+
+
+class RedisCache(CacheStatsMixin, DjangoRedisCache):
+    """Redis (нужен пакет redis); клиент создается при первом обращении"""
+
+
+class _SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        # Очистка выполняется в среднем раз в cull_every записей процесса
+        self._cull_every = int(options.get('CULL_EVERY', 500))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+
+    # -- соединение ---------------------------------------------------------
+
+    def _db(self):
+        pid = os.getpid()
+        db = getattr(self._local, 'db', None)
+        if db is not None and self._local.pid == pid:
+            return db
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None, check_same_thread=False)
+        # WAL: читатели не ждут писателя; NORMAL - без fsync на каждую запись
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)')
+        self._local.db, self._local.pid = db, pid
+        return db
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    # -- чтение -------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db().execute(
+            f'SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time()),
+        ).fetchall()
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    # -- запись -------------------------------------------------------------
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._db().execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout)),
+        )
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self.make_and_validate_key(key, version=version), self._dumps(value), expires)
+                for key, value in data.items()]
+        db = self._db()
+        with _immediate(db):
+            db.executemany('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)', rows)
+        self._maybe_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        db = self._db()
+        with _immediate(db):
+            db.execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, time.time()))
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, self._dumps(value), self.get_backend_timeout(timeout)),
+            ).rowcount == 1
+        if added:
+            self._maybe_cull()
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        db = self._db()
+        with _immediate(db):
+            row = db.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute('UPDATE cache_entries SET value = ? WHERE key = ?', (self._dumps(value), key))
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db().execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        db = self._db()
+        with _immediate(db):
+            db.executemany('DELETE FROM cache_entries WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._db().execute('DELETE FROM cache_entries')
+
+    # -- служебное ----------------------------------------------------------
+
+    def _maybe_cull(self):
+        if self._cull_every > 1 and random.randrange(self._cull_every):
+            return
+        self.cull()
+
+    def cull(self):
+        """Удаление истекших записей и 1/CULL_FREQUENCY самых старых сверх MAX_ENTRIES"""
+        db = self._db()
+        with _immediate(db):
+            db.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+            count = db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+            if count > self._max_entries:
+                limit = count // self._cull_frequency if self._cull_frequency else count
+                # Записи без срока - последними
+                db.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    'SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (limit,),
+                )
+
+
+class SQLiteCache(CacheStatsMixin, _SQLiteCache):
+    """
+    Кеш в файле SQLite (LOCATION - путь). У каждого потока свое соединение,
+    после fork оно открывается заново. Истекшие записи не отдаются и
+    удаляются периодической очисткой вместе с самыми старыми сверх MAX_ENTRIES
+    """
+
+
+# Пространства имен CacheNamespace по имени (команда invalidate_cache)
+namespaces = {}
+
+
+class CacheNamespace:
+    """
+    Ключи '<name>:<key>' с общей версией пространства. Запись хранится
+    вместе с версией, действовавшей до вычисления значения; при чтении
+    версия сверяется за то же обращение к кешу. Отсутствующая версия
+    (вытеснена, кеш очищен) создается заново - старые записи недействительны
+    """
+
+    def __init__(self, name, alias='default'):
+        self.name = name
+        self.alias = alias
+        # Отдельное пространство в статистике: чтение версии - не чтение записи
+        self.version_key = f'{name}.version'
+        namespaces[name] = self
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.name}:{key}'
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def lookup(self, key):
+        """(значение или None, текущая версия для последующего set) за одно обращение к кешу"""
+        full_key = self.make_key(key)
+        found = self.cache.get_many([full_key, self.version_key])
+        version = found.get(self.version_key) or self.version()
+        entry = found.get(full_key)
+        if entry is None:
+            return None, version
+        if entry[0] != version:
+            # Бэкенд учел чтение как попадание
+            stats.record(full_key, hits=-1, stale=1)
+            return None, version
+        return entry[1], version
+
+    def get(self, key, default=None):
+        value, _ = self.lookup(key)
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """version - из lookup() или version(), полученная до вычисления value"""
+        self.cache.set(self.make_key(key), (version or self.version(), value), timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def invalidate(self):
+        """Новая версия: записи пространства недействительны во всех воркерах"""
+        self.cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,159 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для страниц каталога.
+
+Валидатор страницы вычисляется одним дешевым запросом (updated_at и
+счетчики) до основных запросов и отрисовки шаблона; при совпадении с
+If-None-Match / If-Modified-Since представление не вызывается и
+отдается 304. updated_at курса меняется и вместе со счетчиком записей,
+профиля - при изменении имени и email пользователя (см. models).
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from .decorators import get_role
+from .models import Student, Course
+
+
+def is_enabled():
+    return getattr(settings, 'CONDITIONAL_GET', True)
+
+
+# -- валидаторы -------------------------------------------------------------
+# Возвращают кортеж значений, от которых зависит страница, или None, если
+# объекта нет (ответ 404 формирует само представление)
+
+def course_list_state(request):
+    # Все курсы, а не только активные: снятый с публикации курс тоже меняет список
+    state = Course.objects.order_by().aggregate(
+        count=Count('pk'), updated=Max('updated_at'), instructors=Max('instructor__updated_at')
+    )
+    return tuple(state.values())
+
+
+def course_detail_state(request, course_slug):
+    rows = list(
+        Course.objects.filter(slug=course_slug, is_active=True)
+        .order_by()
+        .values_list('pk', 'updated_at', 'instructor_id', 'instructor__updated_at')[:1]
+    )
+    return rows[0] if rows else None
+
+
+def student_list_state(request):
+    state = Student.objects.order_by().aggregate(count=Count('pk'), updated=Max('updated_at'))
+    return tuple(state.values())
+
+
+def student_detail_state(request, student_id):
+    # Смена статуса записи меняет счетчик курса, а с ним и updated_at курса
+    rows = list(
+        Student.objects.filter(pk=student_id, is_active=True)
+        .order_by()
+        .values_list('pk', 'updated_at')
+        .annotate(
+            enrollment_count=Count('enrollments'),
+            courses_updated=Max('enrollments__course__updated_at'),
+            instructors_updated=Max('enrollments__course__instructor__updated_at'),
+        )[:1]
+    )
+    return rows[0] if rows else None
+
+
+# -- заголовки --------------------------------------------------------------
+
+def _user_state(user):
+    # Шапка страницы зависит от пользователя: имя, роль, доступ в админку
+    if not user.is_authenticated:
+        return None
+    return user.pk, user.first_name, user.is_staff, get_role(user)
+
+
+def make_etag(request, view_name, state):
+    raw = repr((settings.CONDITIONAL_GET_VERSION, view_name, state, _user_state(request.user)))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def last_modified(request, state):
+    """
+    Время последнего изменения данных страницы. Только для анонимных
+    посетителей: у остальных страница зависит еще и от пользователя
+    """
+    if request.user.is_authenticated:
+        return None
+    moments = [value for value in state if hasattr(value, 'utctimetuple')]
+    return timegm(max(moments).utctimetuple()) if moments else None
+
+
+def _check(request, state_func, view_name, args, kwargs):
+    """(ответ 304 или None, валидаторы для ответа представления или None)"""
+    # Flash-сообщения показываются один раз - такую страницу нужно отрисовать
+    if not is_enabled() or request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+        return None, None
+
+    state = state_func(request, *args, **kwargs)
+    if state is None:
+        return None, None
+
+    validators = make_etag(request, view_name, state), last_modified(request, state)
+    response = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+    if response is not None:
+        _set_headers(request, response, validators)
+    return response, validators
+
+
+def _set_headers(request, response, validators):
+    etag, modified = validators
+    if response.status_code not in (200, 304):
+        return
+    response.headers.setdefault('ETag', etag)
+    if modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(modified))
+    # Браузер не использует копию без проверки (эвристика по Last-Modified)
+    patch_cache_control(response, no_cache=True)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True)
+
+
+def conditional_page(state_func):
+    """
+    Ответ 304 на повторный запрос неизменившейся страницы; state_func
+    получает аргументы представления и возвращает состояние ее данных.
+    Поддерживает и асинхронные представления
+    """
+    def decorator(view_func):
+        view_name = view_func.__name__
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # Запрос валидатора и загрузка пользователя - синхронный API
+                not_modified, validators = await sync_to_async(_check)(
+                    request, state_func, view_name, args, kwargs
+                )
+                if not_modified is not None:
+                    return not_modified
+                response = await view_func(request, *args, **kwargs)
+                if validators is not None:
+                    _set_headers(request, response, validators)
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            not_modified, validators = _check(request, state_func, view_name, args, kwargs)
+            if not_modified is not None:
+                return not_modified
+            response = view_func(request, *args, **kwargs)
+            if validators is not None:
+                _set_headers(request, response, validators)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,12 @@
+from .decorators import get_role
+
+
+def user_role(request):
+    """Роль текущего пользователя для навигации в шаблонах"""
+    user = getattr(request, 'user', None)
+    role = get_role(user) if user is not None else None
+    return {
+        'user_role': role,
+        'is_teacher': role in ('TEACHER', 'ADMIN'),
+        'is_admin': role == 'ADMIN',
+    }
@@ -0,0 +1,146 @@
+"""
+Чтение с реплик БД (настройки DB_REPLICA_*).
+
+На реплику идут только чтения моделей DB_REPLICA_APPS в GET/HEAD-запросах
+к представлениям DB_REPLICA_VIEWS; остальное, а также все вне HTTP-запросов
+(команды, shell) - на основную БД. После записи чтения до конца запроса
+идут на основную БД, а посетитель закрепляется за ней cookie на
+DB_REPLICA_PIN_SECONDS: он сразу видит свою запись на курс или правку
+профиля, даже если реплика отстает. Реплика, не ответившая на проверку
+или отставшая больше DB_REPLICA_MAX_LAG секунд, пропускается до
+следующей проверки.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger('fefu_lab.db_router')
+
+current_routing = ContextVar('current_routing', default=None)
+
+# Реплика не отстала, если применила все полученные WAL; иначе - возраст
+# последней примененной транзакции (сравнение только с now() завышало бы
+# отставание реплики, пока на основной БД нет записей)
+POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class RoutingState:
+    """Маршрутизация чтений одного HTTP-запроса"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+def reads_from_replica():
+    """Читает ли текущий запрос с реплики (данные могут отставать)"""
+    state = current_routing.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+def is_replica_view(view_name):
+    return any(fnmatchcase(view_name, pattern) for pattern in settings.DB_REPLICA_VIEWS)
+
+
+class ReplicaHealth:
+    """Результаты проверки реплик, общие для потоков процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        healthy, checked_at = self._status.get(alias, (True, None))
+        if checked_at is not None and now - checked_at < settings.DB_REPLICA_HEALTH_INTERVAL:
+            return healthy
+        healthy = self.check(alias)
+        with self._lock:
+            self._status[alias] = (healthy, now)
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(POSTGRES_LAG_SQL)
+                    lag = float(cursor.fetchone()[0])
+                else:
+                    cursor.execute('SELECT 1')
+                    lag = 0.0
+        except DatabaseError as exc:
+            logger.warning('Реплика %s недоступна: %s', alias, exc)
+            connection.close()
+            return False
+        if lag > settings.DB_REPLICA_MAX_LAG:
+            logger.warning('Реплика %s отстает на %.1f с', alias, lag)
+            return False
+        return True
+
+    def mark_unhealthy(self, alias):
+        with self._lock:
+            self._status[alias] = (False, time.monotonic())
+
+    def reset(self):
+        with self._lock:
+            self._status.clear()
+
+
+health = ReplicaHealth()
+_next_replica = itertools.count()
+
+
+def pick_replica():
+    """Исправная реплика по кругу или None (чтение с основной БД)"""
+    replicas = list(settings.DB_REPLICAS)
+    if not replicas:
+        return None
+    start = next(_next_replica)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if health.is_healthy(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """Роутер БД: чтения запроса - на выбранную реплику, запись - на основную БД"""
+
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if model._meta.app_label not in settings.DB_REPLICA_APPS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.wrote = True
+        # Явно: объект, прочитанный с реплики, сохраняется в основную БД
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DB_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит с основной БД
+        if db in settings.DB_REPLICAS:
+            return False
+        return None
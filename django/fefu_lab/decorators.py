@@ -2,6 +2,27 @@ from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import redirect
 from functools import wraps
 
+from .models import Student
+
+
+def get_profile(user):
+    """
+    Профиль пользователя или None. EmailBackend загружает профиль вместе
+    с пользователем, поэтому повторные обращения не делают запросов
+    """
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.student_profile
+    except Student.DoesNotExist:
+        return None
+
+
+def get_role(user):
+    """Роль пользователя или None"""
+    profile = get_profile(user)
+    return profile.role if profile else None
+
 
 def role_required(*roles):
     """
@@ -14,10 +35,7 @@ def role_required(*roles):
             if not request.user.is_authenticated:
                 return redirect('fefu_lab:login')
             
-            if not hasattr(request.user, 'student_profile'):
-                return redirect('fefu_lab:index')
-            
-            if request.user.student_profile.role in roles:
+            if get_role(request.user) in roles:
                 return view_func(request, *args, **kwargs)
             
             return redirect('fefu_lab:index')
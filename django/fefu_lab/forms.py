@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.exceptions import ValidationError
+from . import throttle
 from .models import Student, Enrollment, Course
 
 
@@ -100,20 +101,25 @@ class UserRegistrationForm(forms.ModelForm):
         user = super().save(commit=False)
         user.username = self.cleaned_data['email']  # используем email как username
         user.set_password(self.cleaned_data['password'])  # хешируем пароль
+        # Профиль создается сигналом сразу с факультетом и ролью
+        user.profile_defaults = {
+            'faculty': self.cleaned_data['faculty'],
+            'role': self.cleaned_data['role'],
+        }
         
         if commit:
             user.save()
-            # Обновляем профиль студента
-            profile = user.student_profile
-            profile.faculty = self.cleaned_data['faculty']
-            profile.role = self.cleaned_data['role']
-            profile.save()
         
         return user
 
 
 class EmailAuthenticationForm(AuthenticationForm):
     """Форма входа по email"""
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'throttled': 'Слишком много попыток входа. Попробуйте позже.',
+    }
+    
     username = forms.EmailField(
         label='Email',
         widget=forms.EmailInput(attrs={'class': 'form-control', 'autofocus': True})
@@ -122,6 +128,12 @@ class EmailAuthenticationForm(AuthenticationForm):
         label='Пароль',
         widget=forms.PasswordInput(attrs={'class': 'form-control'})
     )
+    
+    def clean(self):
+        username = self.cleaned_data.get('username')
+        if username and throttle.is_blocked(self.request, username):
+            raise ValidationError(self.error_messages['throttled'], code='throttled')
+        return super().clean()
 
 
 class ProfileEditForm(forms.ModelForm):
@@ -170,8 +182,11 @@ class ProfileEditForm(forms.ModelForm):
         user.email = self.cleaned_data['email']
         
         if commit:
-            user.save()
-            profile.save()
+            # Пишем только то, что действительно изменилось
+            user_fields = [name for name in ('first_name', 'last_name', 'email') if name in self.changed_data]
+            if user_fields:
+                user.save(update_fields=user_fields)
+            profile.save_changes()
         
         return profile
 
@@ -192,7 +207,7 @@ class EnrollmentForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['student'].queryset = Student.objects.filter(is_active=True)
+        self.fields['student'].queryset = Student.objects.filter(is_active=True).select_related('user')
         self.fields['course'].queryset = Course.objects.filter(is_active=True)
     
     def clean(self):
@@ -208,3 +223,15 @@ class EnrollmentForm(forms.ModelForm):
                 raise ValidationError('На этом курсе больше нет свободных мест.')
         
         return cleaned_data
+
+
+class StudentImportForm(forms.Form):
+    """Загрузка CSV со студентами в админке"""
+    csv_file = forms.FileField(label='CSV-файл', help_text='UTF-8, первая строка - заголовки колонок')
+    dry_run = forms.BooleanField(label='Только проверить', required=False)
+
+    def clean_csv_file(self):
+        csv_file = self.cleaned_data['csv_file']
+        if not csv_file.name.lower().endswith('.csv'):
+            raise ValidationError('Нужен файл с расширением .csv')
+        return csv_file
@@ -0,0 +1,277 @@
+"""
+Массовый импорт студентов и записей на курсы из CSV.
+
+Весь файл проверяется в памяти: существующие email и курсы загружаются
+одним запросом на весь файл, пароли хешируются в пуле процессов (или
+выдаются непригодные пароли со ссылками сброса), строки создаются через
+bulk_create без сигналов post_save на каждого пользователя.
+"""
+import csv
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import search
+from .models import Student, Course, Enrollment
+
+
+REQUIRED_COLUMNS = ('email', 'first_name', 'last_name')
+OPTIONAL_COLUMNS = ('faculty', 'role', 'birth_date', 'phone', 'password', 'courses')
+COURSE_SEPARATOR = ';'
+
+
+@dataclass
+class ImportRow:
+    line: int
+    email: str
+    first_name: str
+    last_name: str
+    faculty: str = 'CS'
+    role: str = 'STUDENT'
+    birth_date: date = None
+    phone: str = ''
+    password: str = ''
+    courses: list = field(default_factory=list)
+
+
+@dataclass
+class ImportReport:
+    """Итог импорта: ошибки по строкам и скорость"""
+    rows: int = 0
+    created_users: int = 0
+    created_enrollments: int = 0
+    errors: dict = field(default_factory=dict)
+    reset_links: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def add_error(self, line, message):
+        self.errors.setdefault(line, []).append(message)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _hash_passwords(passwords, workers):
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _init_worker():
+    # Процессы, запущенные через spawn, должны заново инициализировать Django
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+class StudentImporter:
+    """
+    Импорт CSV с колонками email, first_name, last_name и необязательными
+    faculty, role, birth_date (ГГГГ-ММ-ДД), phone, password, courses
+    (slug курсов через ';').
+    """
+
+    def __init__(self, hash_workers=4, batch_size=1000, max_passwords=None, require_password=False):
+        self.hash_workers = hash_workers
+        self.batch_size = batch_size
+        # Без ссылок сброса (их выдает только import_students) пароль обязателен
+        self.require_password = require_password
+        # Больше паролей - файл не импортируется (хеширование дорогое)
+        self.max_passwords = max_passwords
+        self.faculties = {code for code, _ in Student.FACULTY_CHOICES}
+        self.roles = {code for code, _ in Student.ROLE_CHOICES}
+
+    def run(self, fh, dry_run=False):
+        started = time.perf_counter()
+        report = ImportReport()
+        rows = self.parse(fh, report)
+        report.rows = len(rows) + len(report.errors)
+
+        passwords = sum(1 for row in rows if row.password)
+        if self.max_passwords is not None and passwords > self.max_passwords:
+            report.add_error(
+                1, f'Паролей в файле: {passwords}, допустимо не больше {self.max_passwords}; '
+                   f'загрузите файл командой manage.py import_students'
+            )
+            rows = []
+
+        rows = self.validate(rows, report)
+        if rows and not dry_run:
+            self.create(rows, report)
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    # -- разбор и проверка ------------------------------------------------
+
+    def parse(self, fh, report):
+        if isinstance(fh, (bytes, bytearray)):
+            fh = io.StringIO(fh.decode('utf-8-sig'))
+        reader = csv.DictReader(fh)
+        header = [name.strip().lstrip('\ufeff') for name in reader.fieldnames or []]
+        reader.fieldnames = header
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            report.add_error(1, f'Нет обязательных колонок: {", ".join(missing)}')
+            return []
+
+        rows = []
+        for line, raw in enumerate(reader, start=2):
+            values = {key: (value or '').strip() for key, value in raw.items() if key}
+            errors = []
+            row = ImportRow(
+                line=line,
+                email=values['email'].lower(),
+                first_name=values['first_name'],
+                last_name=values['last_name'],
+                phone=values.get('phone', ''),
+                password=values.get('password', ''),
+            )
+            try:
+                validate_email(row.email)
+            except ValidationError:
+                errors.append(f'Некорректный email: {values["email"]!r}')
+            if not row.first_name or not row.last_name:
+                errors.append('Имя и фамилия обязательны')
+            if self.require_password and not row.password:
+                errors.append('Пароль обязателен')
+
+            row.faculty = values.get('faculty') or 'CS'
+            if row.faculty not in self.faculties:
+                errors.append(f'Неизвестный факультет: {row.faculty}')
+            row.role = (values.get('role') or 'STUDENT').upper()
+            if row.role not in self.roles:
+                errors.append(f'Неизвестная роль: {row.role}')
+            if values.get('birth_date'):
+                try:
+                    row.birth_date = date.fromisoformat(values['birth_date'])
+                except ValueError:
+                    errors.append(f'Некорректная дата рождения: {values["birth_date"]}')
+            row.courses = [slug.strip() for slug in values.get('courses', '').split(COURSE_SEPARATOR) if slug.strip()]
+
+            for message in errors:
+                report.add_error(line, message)
+            if not errors:
+                rows.append(row)
+        return rows
+
+    def validate(self, rows, report):
+        """Проверки против БД: по одному запросу на весь файл"""
+        seen = {}
+        for row in rows:
+            if row.email in seen:
+                report.add_error(row.line, f'Email повторяется в строке {seen[row.email]}')
+            else:
+                seen[row.email] = row.line
+
+        # Логин нового пользователя - его email: занятыми считаются и email, и логины
+        taken = (
+            User.objects.annotate(email_lower=Lower('email'), username_lower=Lower('username'))
+            .filter(Q(email_lower__in=list(seen)) | Q(username_lower__in=list(seen)))
+            .values_list('email_lower', 'username_lower')
+        )
+        existing = {value for pair in taken for value in pair}
+
+        valid = []
+        for row in rows:
+            if row.line in report.errors:
+                continue
+            if row.email in existing:
+                report.add_error(row.line, f'Пользователь с email или логином {row.email} уже существует')
+                continue
+            valid.append(row)
+        return self.check_courses(valid, self.load_courses(valid), report)
+
+    def load_courses(self, rows, lock=False):
+        slugs = {slug for row in rows for slug in row.courses}
+        courses = Course.objects.filter(slug__in=slugs, is_active=True)
+        if lock:
+            courses = courses.select_for_update()
+        return {
+            course.slug: course
+            for course in courses.only('pk', 'slug', 'max_students', 'enrolled_count')
+        }
+
+    def check_courses(self, rows, courses, report):
+        """Строки, курсы которых существуют и вмещают их (места занимаются по порядку строк)"""
+        seats = {slug: course.available_seats for slug, course in courses.items()}
+        valid = []
+        for row in rows:
+            unknown = [slug for slug in row.courses if slug not in courses]
+            if unknown:
+                report.add_error(row.line, f'Курсы не найдены: {", ".join(unknown)}')
+                continue
+            full = [slug for slug in row.courses if seats[slug] <= 0]
+            if full:
+                report.add_error(row.line, f'Нет свободных мест: {", ".join(full)}')
+                continue
+            for slug in row.courses:
+                seats[slug] -= 1
+            valid.append(row)
+        return valid
+
+    # -- создание ---------------------------------------------------------
+
+    def create(self, rows, report):
+        with_password = [row for row in rows if row.password]
+        hashes = dict(zip(
+            (row.line for row in with_password),
+            _hash_passwords([row.password for row in with_password], self.hash_workers)
+        ))
+
+        with transaction.atomic():
+            # Места перепроверяются под блокировкой курсов: пока хешировались
+            # пароли, их могли занять другие записи
+            courses = self.load_courses(rows, lock=True)
+            rows = self.check_courses(rows, courses, report)
+            users = User.objects.bulk_create([
+                User(
+                    username=row.email,
+                    email=row.email,
+                    first_name=row.first_name,
+                    last_name=row.last_name,
+                    password=hashes.get(row.line) or make_password(None),
+                )
+                for row in rows
+            ], batch_size=self.batch_size)
+
+            students = []
+            for row, user in zip(rows, users):
+                student = Student(
+                    user=user,
+                    faculty=row.faculty,
+                    role=row.role,
+                    birth_date=row.birth_date,
+                    phone=row.phone,
+                )
+                student.search_document = search.student_document(student)
+                students.append(student)
+            students = Student.objects.bulk_create(students, batch_size=self.batch_size)
+            search.index_objects(Student, ((s.pk, s.search_document) for s in students))
+
+            enrollments = Enrollment.objects.bulk_create([
+                Enrollment(student=student, course=courses[slug])
+                for row, student in zip(rows, students) for slug in row.courses
+            ], batch_size=self.batch_size)
+
+        report.created_users = len(users)
+        report.created_enrollments = len(enrollments)
+        report.reset_links = [
+            (user.email, urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user))
+            for row, user in zip(rows, users) if not row.password
+        ]
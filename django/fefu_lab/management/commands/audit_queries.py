@@ -0,0 +1,188 @@
+import logging
+import re
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from fefu_lab.models import Student, Course
+
+
+ROLES = (None, 'STUDENT', 'TEACHER', 'ADMIN')
+
+# Дополнительные GET-параметры, которые меняют запросы списков
+VARIANTS = {
+    'fefu_lab:student_list': [{'faculty': 'CS'}, {'search': 'ан'}, {'page': '2'}],
+    'fefu_lab:course_list': [{'level': 'BEGINNER'}, {'search': 'python'}, {'page': '2'}],
+    'fefu_lab:export_students': [{'faculty': 'CS'}],
+    'fefu_lab:export_enrollments': [{'status': 'ACTIVE'}],
+}
+
+# Выход завершает сессию клиента для следующих маршрутов
+SKIP_ROUTES = {'fefu_lab:logout'}
+
+# Выгрузки читают таблицы целиком намеренно
+EXPECTED_SCANS = {
+    'fefu_lab:export_students': {'students', 'auth_user'},
+    'fefu_lab:export_courses': {'courses', 'instructors'},
+    'fefu_lab:export_enrollments': {'enrollments', 'students', 'auth_user', 'courses'},
+}
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?:$| AS )')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет GET-запросы ко всем маршрутам fefu_lab от имени каждой роли, '
+        'запускает EXPLAIN для каждого SELECT и отмечает полные просмотры таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Не отмечать просмотр таблиц меньше этого размера (планировщик их сканирует намеренно)'
+        )
+        parser.add_argument('--ignore-table', action='append', default=[], help='Не проверять таблицу')
+        parser.add_argument('--fail', action='store_true', help='Завершиться с ошибкой при находках (для CI)')
+        parser.add_argument('--plans', action='store_true', help='Печатать планы всех запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'EXPLAIN для {connection.vendor} не поддерживается')
+
+        self.options = options
+        self.table_sizes = {}
+
+        # Превышения бюджетов запросов здесь ожидаемы и в лог не пишутся
+        metrics_logger = logging.getLogger('fefu_lab.metrics')
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.CRITICAL)
+        try:
+            findings, checked = self.run_audit()
+        finally:
+            metrics_logger.setLevel(level)
+
+        for name, role, sql, detail in findings:
+            self.stdout.write(self.style.WARNING(f'{name} [{role or "аноним"}]: {detail}'))
+            self.stdout.write(f'    {sql[:300]}')
+
+        summary = f'Проверено запросов: {checked}, полных просмотров: {len(findings)}'
+        if findings and self.options['fail']:
+            raise CommandError(summary)
+        self.stdout.write((self.style.WARNING if findings else self.style.SUCCESS)(summary))
+
+    def run_audit(self):
+        seen, findings = set(), []
+        # Временные пользователи и любые записи представлений откатываются
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+            clients = self.make_clients()
+            for name, url in self.iter_routes():
+                for params in [{}] + VARIANTS.get(name, []):
+                    for role, client in clients.items():
+                        for sql in self.capture(client, url, params):
+                            key = (name, re.sub(r'\d+', '?', sql))
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                            findings.extend((name, role, sql, detail) for detail in self.audit(name, sql))
+            transaction.set_rollback(True)
+        return findings, len(seen)
+
+    # -- маршруты ----------------------------------------------------------
+
+    def make_clients(self):
+        clients = {}
+        for role in ROLES:
+            client = Client()
+            if role:
+                email = f'audit-{role.lower()}-{uuid.uuid4().hex[:8]}@audit.local'
+                user = User(username=email, email=email, first_name='Аудит', last_name=role)
+                user.profile_defaults = {'role': role}
+                user.save()
+                client.force_login(user, backend='fefu_lab.backends.EmailBackend')
+            clients[role] = client
+        return clients
+
+    def iter_routes(self):
+        student = Student.objects.filter(is_active=True).order_by('pk').first()
+        course = Course.objects.filter(is_active=True).order_by('pk').first()
+        samples = {
+            'student_id': student.pk if student else None,
+            'course_slug': course.slug if course else None,
+        }
+
+        resolver = get_resolver()
+        for pattern, prefix, namespace in self.walk(resolver.url_patterns, '', ''):
+            if namespace != 'fefu_lab' or not pattern.name or f'{namespace}:{pattern.name}' in SKIP_ROUTES:
+                continue
+            route = prefix + str(pattern.pattern)
+            converters = re.findall(r'<(?:\w+:)?(\w+)>', route)
+            if any(samples.get(arg) is None for arg in converters):
+                self.stderr.write(f'Пропущен {namespace}:{pattern.name}: нет данных для {route}')
+                continue
+            url = '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda m: str(samples[m.group(1)]), route)
+            yield f'{namespace}:{pattern.name}', url
+
+    def walk(self, patterns, prefix, namespace):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from self.walk(
+                    pattern.url_patterns,
+                    prefix + str(pattern.pattern),
+                    pattern.namespace or namespace,
+                )
+            elif isinstance(pattern, URLPattern):
+                yield pattern, prefix, namespace
+
+    def capture(self, client, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, params)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        return [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].lstrip().upper().startswith(('SELECT', 'WITH'))
+        ]
+
+    # -- планы -------------------------------------------------------------
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+
+    def audit(self, name, sql):
+        pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+        plan = self.explain(sql)
+        if self.options['plans']:
+            self.stdout.write(sql[:300])
+            for line in plan:
+                self.stdout.write(f'    {line}')
+        for line in plan:
+            match = pattern.search(line.strip())
+            if not match:
+                continue
+            table = match.group(1)
+            if table in self.options['ignore_table'] or table in EXPECTED_SCANS.get(name, ()):
+                continue
+            if self.table_size(table) < self.options['min_rows']:
+                continue
+            yield line.strip()
+
+    def table_size(self, table):
+        if table not in self.table_sizes:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                self.table_sizes[table] = cursor.fetchone()[0]
+        return self.table_sizes[table]
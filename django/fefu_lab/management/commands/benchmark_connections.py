@@ -0,0 +1,132 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from .benchmark_stacks import _percentile
+
+
+def _pool_available():
+    if connection.vendor != 'postgresql':
+        return False
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+class Command(BaseCommand):
+    help = (
+        'Задержка запроса при новом соединении с БД на каждый запрос, постоянных '
+        'соединениях с проверкой и пуле psycopg. На SQLite стоимость установки '
+        'соединения PostgreSQL имитируется задержкой --connect-latency-ms'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Запросов на режим')
+        parser.add_argument('--path', help='Путь (по умолчанию список курсов)')
+        parser.add_argument(
+            '--connect-latency-ms', type=float,
+            help='Имитация установки соединения (TCP + аутентификация), мс; '
+                 'по умолчанию 3 на SQLite и 0 на PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('fefu_lab:course_list')
+        latency = options['connect_latency_ms']
+        if latency is None:
+            latency = 3.0 if connection.vendor == 'sqlite' else 0.0
+
+        modes = {
+            'per-request': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+            'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+        }
+        if _pool_available():
+            modes['pool'] = {
+                'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+                'OPTIONS': {**connection.settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': 4}},
+            }
+        else:
+            self.stdout.write('Пул psycopg недоступен (нужны PostgreSQL и psycopg[pool]) - режим pool пропущен')
+
+        self.stdout.write(
+            f'База данных: {connection.vendor}, путь: {path}, запросов: {options["requests"]}, '
+            f'имитация соединения: {latency:.1f} мс'
+        )
+        results = {name: self.run_mode(settings_dict, path, options['requests'], latency)
+                   for name, settings_dict in modes.items()}
+
+        self.stdout.write('')
+        self.stdout.write(f'{"режим":<12} {"среднее, мс":>12} {"p50, мс":>9} {"p95, мс":>9} {"соединений":>11}')
+        for name, (latencies, opened) in results.items():
+            self.stdout.write(
+                f'{name:<12} {statistics.mean(latencies):>12.2f} {_percentile(latencies, 0.5):>9.2f} '
+                f'{_percentile(latencies, 0.95):>9.2f} {opened:>11}'
+            )
+        baseline = statistics.mean(results['per-request'][0])
+        for name, (latencies, _) in results.items():
+            if name != 'per-request':
+                self.stdout.write(f'{name}: экономия {baseline - statistics.mean(latencies):.2f} мс на запрос')
+
+    @contextmanager
+    def connection_mode(self, overrides, latency):
+        saved = {key: connection.settings_dict[key] for key in overrides}
+        connection.close()
+        connection.settings_dict.update(overrides)
+        get_new_connection = connection.get_new_connection
+
+        def slow_connect(conn_params):
+            time.sleep(latency / 1000)
+            return get_new_connection(conn_params)
+
+        if latency:
+            connection.get_new_connection = slow_connect
+        try:
+            yield
+        finally:
+            connection.close()
+            if connection.vendor == 'postgresql':
+                connection.close_pool()
+            connection.__dict__.pop('get_new_connection', None)
+            connection.settings_dict.update(saved)
+
+    def run_mode(self, overrides, path, total, latency):
+        # Настоящий WSGI-обработчик: тестовый клиент Django отключает
+        # закрытие соединений по сигналам начала и конца запроса
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        opened = 0
+
+        def count_connection(sender, **kwargs):
+            nonlocal opened
+            opened += 1
+
+        def start_response(status, headers):
+            if not status.startswith('200'):
+                raise CommandError(f'{path}: ответ {status} вместо 200')
+
+        latencies = []
+        connection_created.connect(count_connection)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver'], PAGE_CACHE=False), \
+                    self.connection_mode(overrides, latency):
+                for _ in range(total):
+                    environ = factory.get(path).environ
+                    started = time.perf_counter()
+                    response = handler(environ, start_response)
+                    b''.join(response)
+                    # close() отправляет request_finished: соединение закрывается
+                    # или остается открытым по CONN_MAX_AGE
+                    response.close()
+                    latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(count_connection)
+        return latencies, opened
@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+# Вариант -> SESSION_ENGINE
+ENGINES = {
+    'django-db': 'django.contrib.sessions.backends.db',
+    'db': 'fefu_lab.sessions.db',
+    'cached_db': 'fefu_lab.sessions.cached_db',
+    'cache': 'fefu_lab.sessions.cache',
+}
+
+
+def read_view(request):
+    # Как AuthenticationMiddleware: каждый запрос вошедшего пользователя читает сессию
+    return HttpResponse(request.session.get('_auth_user_id', ''))
+
+
+def rewrite_view(request):
+    # Присваивание того же значения помечает сессию измененной
+    request.session['_auth_user_id'] = '1'
+    return HttpResponse('')
+
+
+class Command(BaseCommand):
+    help = (
+        'SQL-запросы к таблице сессий и время на запрос для хранилищ сессий: '
+        'чтение сессии вошедшего пользователя и повторная запись того же значения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', action='append', choices=list(ENGINES), help='Хранилище (по умолчанию все)')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на сценарий')
+
+    def handle(self, *args, **options):
+        cache_backend = settings.CACHES[settings.SESSION_CACHE_ALIAS]['BACKEND']
+        self.stdout.write(f'База данных: {connection.vendor}, кеш сессий: {cache_backend}')
+        self.stdout.write('')
+        self.stdout.write(f'{"хранилище":<10} {"сценарий":<8} {"SQL сессий/запрос":>18} {"мс/запрос":>10}')
+        for name in options['engine'] or list(ENGINES):
+            for scenario, view in (('read', read_view), ('rewrite', rewrite_view)):
+                queries, latency = self.run(ENGINES[name], view, options['requests'])
+                self.stdout.write(f'{name:<10} {scenario:<8} {queries:>18.2f} {latency:>10.3f}')
+
+    def run(self, engine, view, total):
+        factory = RequestFactory()
+        with override_settings(SESSION_ENGINE=engine):
+            middleware = SessionMiddleware(view)
+            session = middleware.SessionStore()
+            session['_auth_user_id'] = '1'
+            session.create()
+            cookies = {settings.SESSION_COOKIE_NAME: session.session_key}
+
+            session_queries, latencies = 0, []
+            try:
+                for _ in range(total):
+                    request = factory.get('/')
+                    request.COOKIES.update(cookies)
+                    started = time.perf_counter()
+                    with CaptureQueriesContext(connection) as captured:
+                        middleware(request)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    session_queries += sum('django_session' in query['sql'] for query in captured.captured_queries)
+            finally:
+                session.delete()
+        return session_queries / total, statistics.mean(latencies)
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from fefu_lab.models import Student, Course
+
+
+# Стек -> (модуль приложения, дополнительные аргументы gunicorn, ASYNC_VIEWS)
+STACKS = {
+    'wsgi': ('web_2025.wsgi:application', [], 'False'),
+    'asgi': ('web_2025.asgi:application', ['--worker-class', 'uvicorn_worker.UvicornWorker'], 'True'),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class HTTPClient:
+    """Минимальный HTTP/1.1-клиент с keep-alive для генерации нагрузки"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n'.encode()
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('соединение закрыто сервером')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+
+        # Синхронные воркеры gunicorn не держат keep-alive
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность страниц каталога на синхронном (gunicorn, WSGI) '
+        'и асинхронном (gunicorn + uvicorn-воркеры, ASGI) стеках при высокой конкурентности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stack', action='append', choices=sorted(STACKS), help='Стек (по умолчанию оба)')
+        parser.add_argument('--workers', type=int, default=3, help='Воркеров gunicorn')
+        parser.add_argument('--concurrency', type=int, default=200, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на стек')
+        parser.add_argument('--path', action='append', help='Путь для нагрузки (по умолчанию страницы каталога)')
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Не отключать кеш страниц (иначе измеряются запросы к БД и рендеринг)'
+        )
+        parser.add_argument('--startup-timeout', type=float, default=30.0, help='Ожидание запуска сервера, с')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or self.default_paths()
+        self.stdout.write(f'База данных: {settings.DATABASES["default"]["ENGINE"]}')
+        self.stdout.write(f'Пути: {", ".join(paths)}')
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, клиентов: {options["concurrency"]}, запросов: {options["requests"]}'
+        )
+
+        results = {}
+        for stack in options['stack'] or list(STACKS):
+            results[stack] = self.run_stack(stack, paths, options)
+
+        self.stdout.write('')
+        self.stdout.write(f'{"стек":<6} {"RPS":>8} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} {"ошибок":>7}')
+        for stack, (rps, latencies, errors) in results.items():
+            self.stdout.write(
+                f'{stack:<6} {rps:>8.1f} {_percentile(latencies, 0.5):>9.1f} '
+                f'{_percentile(latencies, 0.95):>9.1f} {_percentile(latencies, 0.99):>9.1f} {errors:>7}'
+            )
+
+    def default_paths(self):
+        paths = [reverse('fefu_lab:index'), reverse('fefu_lab:course_list'), reverse('fefu_lab:student_list')]
+        course = Course.objects.filter(is_active=True).order_by('pk').first()
+        student = Student.objects.filter(is_active=True).order_by('pk').first()
+        if course:
+            paths.append(reverse('fefu_lab:course_detail', args=[course.slug]))
+        if student:
+            paths.append(reverse('fefu_lab:student_detail', args=[student.pk]))
+        return paths
+
+    # -- сервер ------------------------------------------------------------
+
+    def run_stack(self, stack, paths, options):
+        app, extra_args, async_views = STACKS[stack]
+        port = _free_port()
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'web_2025.settings'),
+            'DJANGO_ALLOWED_HOSTS': '127.0.0.1',
+            'ASYNC_VIEWS': async_views,
+            'METRICS_DIR': '',
+            # В очереди при высокой конкурентности бюджет времени превышает каждый запрос
+            'METRICS_TIME_BUDGET_MS': '1e9',
+        }
+        if not options['page_cache']:
+            env['PAGE_CACHE'] = 'False'
+
+        command = [
+            sys.executable, '-m', 'gunicorn', app,
+            '--workers', str(options['workers']),
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+            *extra_args,
+        ]
+        self.stdout.write(f'\n[{stack}] {" ".join(command[2:])}')
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self.wait_ready(port, paths[0], server, options['startup_timeout'])
+            return asyncio.run(self.load(port, paths, options))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    def wait_ready(self, port, path, server, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер завершился с кодом {server.returncode}')
+            try:
+                status = asyncio.run(self.probe(port, path))
+            except OSError:
+                time.sleep(0.2)
+                continue
+            if status != 200:
+                raise CommandError(f'{path}: ответ {status} вместо 200')
+            return
+        raise CommandError(f'Сервер не запустился за {timeout:.0f} с')
+
+    async def probe(self, port, path):
+        client = HTTPClient('127.0.0.1', port)
+        try:
+            return await client.get(path)
+        finally:
+            await client.close()
+
+    # -- нагрузка ----------------------------------------------------------
+
+    async def load(self, port, paths, options):
+        total = options['requests']
+        latencies, errors = [], 0
+        issued = 0
+
+        async def client_loop():
+            nonlocal issued, errors
+            client = HTTPClient('127.0.0.1', port)
+            try:
+                while issued < total:
+                    path = paths[issued % len(paths)]
+                    issued += 1
+                    started = time.perf_counter()
+                    try:
+                        status = await client.get(path)
+                    except (OSError, ValueError, asyncio.IncompleteReadError):
+                        errors += 1
+                        await client.close()
+                        continue
+                    if status != 200:
+                        errors += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                await client.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        return len(latencies) / elapsed, latencies, errors
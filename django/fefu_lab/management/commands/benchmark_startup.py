@@ -0,0 +1,138 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from .benchmark_stacks import HTTPClient, _free_port
+
+
+# Вариант -> переменные окружения для web_2025.gunicorn_conf
+VARIANTS = {
+    'cold': {'GUNICORN_PRELOAD': 'False', 'GUNICORN_WARMUP': 'False'},
+    'preload': {'GUNICORN_PRELOAD': 'True', 'GUNICORN_WARMUP': 'True'},
+}
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            return [int(child) for child in fh.read().split()]
+    except OSError:
+        return []
+
+
+def _pss_bytes(pid):
+    """Пропорциональная память процесса: общие страницы делятся между процессами"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            for line in fh:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Время запуска gunicorn до первого ответа, задержка первых запросов '
+        'воркеров и память (PSS) мастера и воркеров: без preload и с preload и прогревом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variant', action='append', choices=sorted(VARIANTS), help='Вариант (по умолчанию все)')
+        parser.add_argument('--workers', type=int, default=3, help='Воркеров gunicorn')
+        parser.add_argument('--runs', type=int, default=3, help='Запусков на вариант')
+        parser.add_argument('--path', help='Путь первого запроса (по умолчанию список курсов)')
+        parser.add_argument('--startup-timeout', type=float, default=60.0, help='Ожидание запуска сервера, с')
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('fefu_lab:course_list')
+        self.stdout.write(f'Путь: {path}, воркеров: {options["workers"]}, запусков: {options["runs"]}')
+
+        results = {}
+        for variant in options['variant'] or list(VARIANTS):
+            runs = [self.run_variant(variant, path, options) for _ in range(options['runs'])]
+            results[variant] = [sum(values) / len(values) for values in zip(*runs)]
+
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"вариант":<8} {"до 1-го ответа, мс":>19} {"1-е запросы, мс":>16} {"PSS, МБ":>9}'
+        )
+        for variant, (ready_ms, first_ms, pss) in results.items():
+            self.stdout.write(f'{variant:<8} {ready_ms:>19.0f} {first_ms:>16.1f} {pss / 2 ** 20:>9.1f}')
+
+    def run_variant(self, variant, path, options):
+        port = _free_port()
+        env = {
+            **os.environ,
+            **VARIANTS[variant],
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'web_2025.settings'),
+            'DJANGO_ALLOWED_HOSTS': '127.0.0.1',
+            'METRICS_DIR': '',
+            'PAGE_CACHE': 'False',
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_WORKERS': str(options['workers']),
+            'GUNICORN_LOG_LEVEL': 'warning',
+            'GUNICORN_ACCESS_LOG': '',
+        }
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'python:web_2025.gunicorn_conf']
+        started = time.perf_counter()
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            ready_ms = self.wait_first_response(port, path, server, started, options['startup_timeout'])
+            # Ждем запуска всех воркеров: первый ответ мог дать самый быстрый
+            deadline = time.monotonic() + options['startup_timeout']
+            while len(_children(server.pid)) < options['workers'] and time.monotonic() < deadline:
+                time.sleep(0.1)
+            first_ms = asyncio.run(self.first_requests(port, path, options['workers']))
+            pss = _pss_bytes(server.pid) + sum(_pss_bytes(child) for child in _children(server.pid))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        self.stdout.write(f'[{variant}] до первого ответа {ready_ms:.0f} мс, первые запросы {first_ms:.1f} мс')
+        return ready_ms, first_ms, pss
+
+    def wait_first_response(self, port, path, server, started, timeout):
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер завершился с кодом {server.returncode}')
+            try:
+                status = asyncio.run(self.get_once(port, path))
+            except OSError:
+                time.sleep(0.05)
+                continue
+            if status != 200:
+                raise CommandError(f'{path}: ответ {status} вместо 200')
+            return (time.perf_counter() - started) * 1000
+        raise CommandError(f'Сервер не запустился за {timeout:.0f} с')
+
+    async def get_once(self, port, path):
+        client = HTTPClient('127.0.0.1', port)
+        try:
+            return await client.get(path)
+        finally:
+            await client.close()
+
+    async def first_requests(self, port, path, workers):
+        """
+        Средняя задержка одновременных запросов (по два на воркер): без
+        прогрева каждый воркер строит URL, шаблоны и метаданные моделей сам
+        """
+        async def timed():
+            started = time.perf_counter()
+            status = await self.get_once(port, path)
+            if status != 200:
+                raise CommandError(f'{path}: ответ {status} вместо 200')
+            return (time.perf_counter() - started) * 1000
+
+        latencies = await asyncio.gather(*(timed() for _ in range(workers * 2)))
+        return sum(latencies) / len(latencies)
@@ -0,0 +1,51 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истекшие сессии из БД пакетами (в отличие от clearsessions - '
+        'без одного долгого DELETE по всей таблице). Запускается по таймеру '
+        '(deploy/systemd/fefu-clearsessions.timer)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SESSION_SWEEP_BATCH_SIZE,
+            help='Сессий за один DELETE'
+        )
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пакетами, с')
+        parser.add_argument('--max-batches', type=int, default=0, help='Не больше пакетов за запуск (0 - все)')
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not issubclass(store, DBStore):
+            self.stdout.write(f'{settings.SESSION_ENGINE}: сессии не в БД, истекшие удаляет кеш')
+            return
+
+        model = store.get_model_class()
+        # Граница фиксируется заранее: сессии, истекающие во время очистки, ждут следующего запуска
+        now = timezone.now()
+        total = batches = 0
+        started = time.perf_counter()
+        while True:
+            pks = list(
+                model.objects.filter(expire_date__lt=now).order_by().values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            deleted, _ = model.objects.filter(pk__in=pks).delete()
+            total += deleted
+            batches += 1
+            if options['max_batches'] and batches >= options['max_batches']:
+                break
+            time.sleep(options['pause'])
+
+        self.stdout.write(
+            f'Удалено истекших сессий: {total} ({batches} пакетов, {time.perf_counter() - started:.1f} с)'
+        )
@@ -0,0 +1,84 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from fefu_lab.models import Course, Enrollment, Student
+from fefu_lab.services import EnrollmentResult, enroll_student
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест записи на курс: N параллельных студентов на курс с ограниченным числом мест'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=20, help='Количество параллельных потоков')
+        parser.add_argument('--students', type=int, default=100, help='Количество студентов, пытающихся записаться')
+        parser.add_argument('--seats', type=int, default=10, help='Максимум студентов на курсе')
+        parser.add_argument('--duplicates', type=int, default=2, help='Сколько раз каждый студент пытается записаться')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные данные после теста')
+    
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        self.stdout.write(f'База данных: {connection.vendor}')
+        
+        course = Course.objects.create(
+            title=f'Load test {tag}',
+            slug=f'load-test-{tag}',
+            description='Курс для нагрузочного теста записи',
+            duration=1,
+            max_students=options['seats'],
+        )
+        users = User.objects.bulk_create([
+            User(username=f'load-{tag}-{i}', email=f'load-{tag}-{i}@example.com')
+            for i in range(options['students'])
+        ])
+        students = Student.objects.bulk_create([Student(user=user) for user in users])
+        
+        attempts = [s for s in students for _ in range(options['duplicates'])]
+        results = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['workers'])
+        
+        def worker(index):
+            barrier.wait()
+            try:
+                for student in attempts[index::options['workers']]:
+                    try:
+                        status = enroll_student(student, course).status
+                    except OperationalError:
+                        status = 'DB_ERROR'
+                    with lock:
+                        results[status] += 1
+            finally:
+                connections.close_all()
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        course.refresh_from_db()
+        actual = Enrollment.objects.filter(course=course, status='ACTIVE').count()
+        
+        self.stdout.write(f'Попыток записи: {len(attempts)} за {elapsed:.2f} с ({len(attempts) / elapsed:.0f}/с)')
+        for status, count in sorted(results.items()):
+            self.stdout.write(f'  • {status}: {count}')
+        self.stdout.write(f'Счетчик курса: {course.enrolled_count}, записей в БД: {actual}, мест: {course.max_students}')
+        
+        if not options['keep']:
+            course.delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+        
+        expected = min(options['seats'], options['students'])
+        if actual > course.max_students or course.enrolled_count != actual:
+            raise CommandError('Нарушен лимит мест или рассинхронизирован счетчик!')
+        if results[EnrollmentResult.ENROLLED] != actual or (not results['DB_ERROR'] and actual != expected):
+            raise CommandError('Количество успешных записей не совпадает с ожидаемым')
+        self.stdout.write(self.style.SUCCESS('Лимит мест соблюден.'))
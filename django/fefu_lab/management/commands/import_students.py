@@ -0,0 +1,53 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fefu_lab.importers import StudentImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовый импорт студентов и записей на курсы из CSV '
+        '(email, first_name, last_name, faculty, role, birth_date, phone, password, courses)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Путь к CSV-файлу в UTF-8')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не записывать')
+        parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов для хеширования паролей')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+        parser.add_argument(
+            '--reset-links',
+            help='CSV-файл для email, uid и токена сброса пароля студентов без пароля в файле'
+        )
+
+    def handle(self, *args, **options):
+        path = options['csv_file']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+
+        importer = StudentImporter(hash_workers=options['hash_workers'], batch_size=options['batch_size'])
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            report = importer.run(fh, dry_run=options['dry_run'])
+
+        for line, messages in sorted(report.errors.items()):
+            for message in messages:
+                self.stderr.write(f'  строка {line}: {message}')
+
+        if options['reset_links'] and report.reset_links:
+            with open(options['reset_links'], 'w', encoding='utf-8', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(['email', 'uid', 'token'])
+                writer.writerows(report.reset_links)
+
+        summary = (
+            f'Строк: {report.rows}, с ошибками: {len(report.errors)}, '
+            f'создано студентов: {report.created_users}, записей на курсы: {report.created_enrollments}. '
+            f'{report.elapsed:.2f} с ({report.rows_per_second:.0f} строк/с)'
+        )
+        if options['dry_run']:
+            summary = 'Пробный прогон. ' + summary
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fefu_lab import caching
+
+
+class Command(BaseCommand):
+    help = (
+        'Сбрасывает пространства имен кеша сменой их версии: записи становятся '
+        'недействительными во всех воркерах. Запускается при выкладке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*', help='Пространства имен (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        names = options['namespaces'] or sorted(caching.namespaces)
+        unknown = [name for name in names if name not in caching.namespaces]
+        if unknown:
+            raise CommandError(
+                f'Неизвестные пространства имен: {", ".join(unknown)} '
+                f'(доступны: {", ".join(sorted(caching.namespaces))})'
+            )
+        for name in names:
+            caching.namespaces[name].invalidate()
+            self.stdout.write(f'Сброшено: {name}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from fefu_lab import avatars
+from fefu_lab.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает аватары, еще не переведенные на варианты с хешем в имени: '
+        'загрузки, обработка которых прервалась перезапуском воркера, и исходные '
+        'файлы, загруженные до появления обработки'
+    )
+
+    def handle(self, *args, **options):
+        students = Student.objects.exclude(Q(avatar__isnull=True) | Q(avatar='')).values_list('pk', 'avatar')
+        processed = failed = 0
+        for pk, name in students.iterator():
+            if avatars.is_processed(name):
+                continue
+            # Исходный файл удаляется только после переключения на варианты;
+            # старый исходник, который не удалось обработать, остается аватаром
+            try:
+                result = avatars.process(pk, name)
+            except OSError as exc:
+                result = None
+                self.stderr.write(f'Студент {pk}: {name} - ошибка хранилища: {exc}')
+            if result:
+                processed += 1
+            else:
+                failed += 1
+                self.stderr.write(f'Студент {pk}: {name} не обработан')
+        self.stdout.write(f'Обработано аватаров: {processed}, ошибок: {failed}')
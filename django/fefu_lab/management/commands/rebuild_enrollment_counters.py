@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+
+from fefu_lab.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Проверяет и пересчитывает счетчики активных записей на курсах'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счетчики, не исправляя их (код возврата 1 при расхождении)'
+        )
+    
+    def handle(self, *args, **options):
+        courses = Course.objects.annotate(
+            actual=Count('enrollments', filter=Q(enrollments__status='ACTIVE'))
+        ).values_list('pk', 'title', 'enrolled_count', 'actual')
+        
+        mismatched = []
+        for pk, title, stored, actual in courses.iterator():
+            if stored != actual:
+                mismatched.append(pk)
+                self.stdout.write(f'  • {title}: сохранено {stored}, фактически {actual}')
+        
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Все счетчики записей корректны.'))
+            return
+        
+        if options['check']:
+            raise CommandError(f'Найдено расхождений: {len(mismatched)}')
+        
+        with transaction.atomic():
+            updated = Course.recount_enrollments(mismatched)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счетчиков: {updated}'))
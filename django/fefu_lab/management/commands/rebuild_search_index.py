@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from fefu_lab import search
+from fefu_lab.models import Student, Course
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые документы студентов и курсов (например, после bulk_create)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пачки обновления')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Алиас базы данных')
+    
+    def handle(self, *args, **options):
+        for model in (Student, Course):
+            started = time.perf_counter()
+            with transaction.atomic(using=options['database']):
+                total = search.rebuild_index(model, using=options['database'], batch_size=options['batch_size'])
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {total} документов '
+                f'за {time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен.'))
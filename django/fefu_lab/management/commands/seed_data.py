@@ -1,181 +1,248 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from array import array
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from django.utils import timezone
+
+from fefu_lab import search
 from fefu_lab.models import Student, Instructor, Course, Enrollment
-from datetime import date, timedelta
+
+
+# Домен email сгенерированных студентов - по нему удаляются старые данные
+STUDENT_EMAIL_DOMAIN = 'students.dvfu.ru'
+
+FIRST_NAMES = [
+    'Анна', 'Дмитрий', 'Екатерина', 'Михаил', 'Ольга', 'Сергей', 'Иван', 'Мария',
+    'Алексей', 'Наталья', 'Андрей', 'Елена', 'Павел', 'Татьяна', 'Артём', 'Юлия',
+    'Никита', 'Дарья', 'Кирилл', 'Полина', 'Максим', 'Алёна', 'Егор', 'Ксения',
+]
+LAST_NAMES = [
+    'Иванов', 'Смирнов', 'Попов', 'Васильев', 'Новиков', 'Петров', 'Сидоров', 'Козлов',
+    'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов',
+    'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин', 'Захаров', 'Зайцев',
+]
+TOPICS = [
+    ('Основы Python', 'python-basics'),
+    ('Веб-безопасность', 'web-security'),
+    ('Современный JavaScript', 'modern-javascript'),
+    ('Защита сетей', 'network-defense'),
+    ('Django для начинающих', 'django-beginners'),
+    ('Базы данных', 'databases'),
+    ('Алгоритмы и структуры данных', 'algorithms'),
+    ('Машинное обучение', 'machine-learning'),
+    ('Криптография', 'cryptography'),
+    ('Операционные системы', 'operating-systems'),
+]
+SPECIALIZATIONS = ['Кибербезопасность', 'Веб-разработка', 'Сетевые технологии', 'Наука о данных']
+
+
+def female_form(last_name, first_name):
+    """Женская форма фамилии для женских имен"""
+    if first_name[-1] in 'аяы' and last_name[-2:] in ('ов', 'ев', 'ин'):
+        return last_name + 'а'
+    return last_name
 
 
 class Command(BaseCommand):
-    help = 'Заполняет базу данных тестовыми данными'
-    
+    help = 'Заполняет базу данных синтетическими тестовыми данными (детерминированно, пачками)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instructors', type=int, default=20, help='Количество преподавателей')
+        parser.add_argument('--students', type=int, default=1000, help='Количество студентов')
+        parser.add_argument('--courses', type=int, default=100, help='Количество курсов')
+        parser.add_argument('--enrollments', type=int, default=5000, help='Количество записей на курсы')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument(
+            '--password',
+            help='Общий пароль студентов (хешируется один раз); по умолчанию - без пароля'
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write('Создание тестовых данных...')
-        
-        self.stdout.write('Удаление старых данных...')
-        Enrollment.objects.all().delete()
-        Course.objects.all().delete()
-        Student.objects.all().delete()
-        Instructor.objects.all().delete()
-        
-        self.stdout.write('Создание преподавателей...')
-        instructors = [
-            Instructor(
-                first_name='Иван',
-                last_name='Петров',
-                email='i.petrov@dvfu.ru',
-                specialization='Кибербезопасность',
-                degree='PHD',
-                bio='Кандидат технических наук, специалист по защите информации'
-            ),
-            Instructor(
-                first_name='Мария',
-                last_name='Сидорова',
-                email='m.sidorova@dvfu.ru',
-                specialization='Веб-разработка',
-                degree='DSC',
-                bio='Доктор технических наук, эксперт в области веб-технологий'
-            ),
-            Instructor(
-                first_name='Алексей',
-                last_name='Козлов',
-                email='a.kozlov@dvfu.ru',
-                specialization='Сетевые технологии',
-                degree='PHD',
-                bio='Кандидат наук, специалист по компьютерным сетям'
-            ),
-        ]
-        
-        for instructor in instructors:
-            instructor.save()
-        
-        self.stdout.write('Создание студентов...')
-        students = [
-            Student(
-                first_name='Анна',
-                last_name='Иванова',
-                email='anna.ivanova@students.dvfu.ru',
-                birth_date=date(2003, 5, 15),
-                faculty='CS'
-            ),
-            Student(
-                first_name='Дмитрий',
-                last_name='Смирнов',
-                email='dmitry.smirnov@students.dvfu.ru',
-                birth_date=date(2002, 8, 22),
-                faculty='SE'
-            ),
-            Student(
-                first_name='Екатерина',
-                last_name='Попова',
-                email='ekaterina.popova@students.dvfu.ru',
-                birth_date=date(2003, 3, 10),
-                faculty='IT'
-            ),
-            Student(
-                first_name='Михаил',
-                last_name='Васильев',
-                email='mikhail.vasilyev@students.dvfu.ru',
-                birth_date=date(2003, 11, 5),
-                faculty='DS'
-            ),
-            Student(
-                first_name='Ольга',
-                last_name='Новикова',
-                email='olga.novikova@students.dvfu.ru',
-                birth_date=date(2002, 12, 30),
-                faculty='WEB'
-            ),
-            Student(
-                first_name='Сергей',
-                last_name='Петров',
-                email='sergey.petrov@students.dvfu.ru',
-                birth_date=date(2003, 7, 18),
-                faculty='CS'
-            ),
-        ]
-        
-        for student in students:
-            student.save()
-        
-        self.stdout.write('Создание курсов...')
-        courses = [
-            Course(
-                title='Основы Python',
-                slug='python-basics',
-                description='Базовый курс по программированию на языке Python. Изучение синтаксиса, структур данных и основ объектно-ориентированного программирования.',
-                duration=36,
-                instructor=instructors[0],
-                level='BEGINNER',
-                max_students=25,
-                price=0
-            ),
-            Course(
-                title='Веб-безопасность',
-                slug='web-security',
-                description='Продвинутый курс по защите веб-приложений. SQL-инъекции, XSS, CSRF и другие уязвимости. Практические методы защиты.',
-                duration=48,
-                instructor=instructors[0],
-                level='ADVANCED',
-                max_students=20,
-                price=15000
-            ),
-            Course(
-                title='Современный JavaScript',
-                slug='modern-javascript',
-                description='Изучение современных возможностей JavaScript: ES6+, асинхронное программирование, работа с фреймворками React и Vue.',
-                duration=42,
-                instructor=instructors[1],
-                level='INTERMEDIATE',
-                max_students=30,
-                price=12000
-            ),
-            Course(
-                title='Защита сетей',
-                slug='network-defense',
-                description='Курс по защите компьютерных сетей. Firewalls, IDS/IPS, VPN и методы атак на сети. Практика на реальных примерах.',
-                duration=40,
-                instructor=instructors[2],
-                level='ADVANCED',
-                max_students=15,
-                price=18000
-            ),
-            Course(
-                title='Django для начинающих',
-                slug='django-beginners',
-                description='Введение в веб-разработку на Python с использованием фреймворка Django. Создание полноценных веб-приложений.',
-                duration=50,
-                instructor=instructors[1],
-                level='BEGINNER',
-                max_students=20,
-                price=10000
-            ),
-        ]
-        
-        for course in courses:
-            course.save()
-        
-        self.stdout.write('Создание записей на курсы...')
-        enrollments = [
-            Enrollment(student=students[0], course=courses[0], status='ACTIVE'),
-            Enrollment(student=students[0], course=courses[1], status='ACTIVE'),
-            Enrollment(student=students[1], course=courses[0], status='ACTIVE'),
-            Enrollment(student=students[1], course=courses[2], status='ACTIVE'),
-            Enrollment(student=students[2], course=courses[0], status='COMPLETED'),
-            Enrollment(student=students[2], course=courses[4], status='ACTIVE'),
-            Enrollment(student=students[3], course=courses[3], status='ACTIVE'),
-            Enrollment(student=students[4], course=courses[2], status='ACTIVE'),
-            Enrollment(student=students[4], course=courses[4], status='ACTIVE'),
-            Enrollment(student=students[5], course=courses[1], status='ACTIVE'),
-        ]
-        
-        for enrollment in enrollments:
-            enrollment.save()
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\nУспешно создано:\n'
-                f'  • {len(instructors)} преподавателей\n'
-                f'  • {len(students)} студентов\n'
-                f'  • {len(courses)} курсов\n'
-                f'  • {len(enrollments)} записей на курсы'
+        if options['courses'] < 1 and options['enrollments']:
+            raise CommandError('Для записей на курсы нужен хотя бы один курс')
+        if options['instructors'] < 1 and options['courses']:
+            raise CommandError('Для курсов нужен хотя бы один преподаватель')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            self.stdout.write('Удаление старых данных...')
+            self.flush()
+
+            instructors = self.timed('Преподаватели', self.create_instructors, options['instructors'])
+            plan, active_counts = self.plan_enrollments(
+                options['students'], options['courses'], options['enrollments']
             )
-        )
+            courses = self.timed('Курсы', self.create_courses, options['courses'], instructors, active_counts)
+            students = self.timed('Студенты', self.create_students, options['students'], options['password'])
+            self.timed('Записи на курсы', self.create_enrollments, plan, students, courses)
+
+        total = len(instructors) + len(courses) + 2 * len(students) + len(plan[0])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\nУспешно создано:\n'
+            f'  • {len(instructors)} преподавателей\n'
+            f'  • {len(students)} студентов\n'
+            f'  • {len(courses)} курсов\n'
+            f'  • {len(plan[0])} записей на курсы\n'
+            f'Всего {total} строк за {elapsed:.2f} с ({total / elapsed:.0f} строк/с)'
+        ))
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        rows = len(result[0]) if isinstance(result, tuple) else len(result)
+        self.stdout.write(f'  {label}: {rows} за {elapsed:.2f} с ({rows / max(elapsed, 1e-9):.0f} строк/с)')
+        return result
+
+    def flush(self):
+        # Прямое удаление без загрузки объектов и сигналов на каждую строку
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in (Enrollment, Course, Student, Instructor):
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+            tables = set(connection.introspection.table_names(cursor))
+            for fts_table in search.FTS_TABLES.values():
+                if fts_table in tables:
+                    cursor.execute(f'DELETE FROM {fts_table}')
+        User.objects.filter(email__endswith=f'@{STUDENT_EMAIL_DOMAIN}', is_staff=False).delete()
+
+    def create_instructors(self, count):
+        rng = self.rng
+        instructors = []
+        for i in range(count):
+            first_name = rng.choice(FIRST_NAMES)
+            instructors.append(Instructor(
+                first_name=first_name,
+                last_name=female_form(rng.choice(LAST_NAMES), first_name),
+                email=f'instructor{i + 1}@dvfu.ru',
+                specialization=rng.choice(SPECIALIZATIONS),
+                degree=rng.choice(Instructor.DEGREE_CHOICES)[0],
+            ))
+        return Instructor.objects.bulk_create(instructors, batch_size=self.batch_size)
+
+    def plan_enrollments(self, students, courses, enrollments):
+        """
+        Пары (студент, курс) и статусы записей в компактных массивах.
+        Активных записей на курсе не больше max_students, поэтому
+        счетчики курсов известны заранее.
+        """
+        rng = self.rng
+        enrollments = min(enrollments, students * courses)
+        self.max_students = [rng.randint(20, 100) for _ in range(courses)]
+        active_counts = [0] * courses
+        student_idx, course_idx, statuses = array('l'), array('l'), array('b')
+
+        per_student, extra = divmod(enrollments, students) if students else (0, 0)
+        for s in range(students):
+            quota = per_student + (1 if s < extra else 0)
+            for c in rng.sample(range(courses), quota):
+                if active_counts[c] < self.max_students[c] and rng.random() < 0.8:
+                    active_counts[c] += 1
+                    status = 0
+                else:
+                    status = rng.choice((1, 2))
+                student_idx.append(s)
+                course_idx.append(c)
+                statuses.append(status)
+        return (student_idx, course_idx, statuses), active_counts
+
+    def create_courses(self, count, instructors, active_counts):
+        rng = self.rng
+        courses = []
+        for i in range(count):
+            title, slug = TOPICS[i % len(TOPICS)]
+            course = Course(
+                title=f'{title} — поток {i // len(TOPICS) + 1}',
+                slug=f'{slug}-{i // len(TOPICS) + 1}',
+                description=f'{title}: теория и практические задания. Поток {i // len(TOPICS) + 1}.',
+                duration=rng.randint(16, 72),
+                instructor=rng.choice(instructors),
+                level=rng.choice(Course.LEVEL_CHOICES)[0],
+                max_students=self.max_students[i],
+                price=rng.choice((0, 5000, 10000, 15000)),
+                enrolled_count=active_counts[i],
+            )
+            course.search_document = search.course_document(course)
+            courses.append(course)
+        courses = Course.objects.bulk_create(courses, batch_size=self.batch_size)
+        search.index_objects(Course, ((c.pk, c.search_document) for c in courses))
+        return courses
+
+    def create_students(self, count, password):
+        rng = self.rng
+        # Один хеш на всех вместо PBKDF2 для каждого пользователя
+        password_hash = make_password(password)
+        faculties = [code for code, _ in Student.FACULTY_CHOICES]
+        students = []
+        for start in range(0, count, self.batch_size):
+            users = []
+            for i in range(start, min(start + self.batch_size, count)):
+                first_name = rng.choice(FIRST_NAMES)
+                email = f'student{i + 1}@{STUDENT_EMAIL_DOMAIN}'
+                users.append(User(
+                    username=email,
+                    email=email,
+                    first_name=first_name,
+                    last_name=female_form(rng.choice(LAST_NAMES), first_name),
+                    password=password_hash,
+                ))
+            users = User.objects.bulk_create(users)
+
+            batch = []
+            for user in users:
+                student = Student(
+                    user=user,
+                    faculty=rng.choice(faculties),
+                    birth_date=date(rng.randint(1998, 2006), rng.randint(1, 12), rng.randint(1, 28)),
+                )
+                student.search_document = search.student_document(student)
+                batch.append(student)
+            batch = Student.objects.bulk_create(batch)
+            search.index_objects(Student, ((s.pk, s.search_document) for s in batch))
+            students.extend(batch)
+        return students
+
+    def create_enrollments(self, plan, students, courses):
+        student_idx, course_idx, statuses = plan
+        status_codes = [code for code, _ in Enrollment.STATUS_CHOICES]
+        student_pks = [s.pk for s in students]
+        course_pks = [c.pk for c in courses]
+
+        if connection.vendor == 'sqlite':
+            # Django ограничивает пачку bulk_create в SQLite 999 параметрами
+            # (~250 строк на INSERT); один подготовленный INSERT через
+            # executemany быстрее на порядок и тоже не вызывает сигналы
+            quote = connection.ops.quote_name
+            columns = ', '.join(quote(name) for name in ('student_id', 'course_id', 'status', 'enrolled_at'))
+            sql = f'INSERT INTO {quote(Enrollment._meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)'
+            now = connection.ops.adapt_datetimefield_value(timezone.now())
+            with connection.cursor() as cursor:
+                for start in range(0, len(student_idx), self.batch_size):
+                    stop = start + self.batch_size
+                    cursor.executemany(sql, [
+                        (student_pks[s], course_pks[c], status_codes[st], now)
+                        for s, c, st in zip(student_idx[start:stop], course_idx[start:stop], statuses[start:stop])
+                    ])
+            return student_idx
+
+        for start in range(0, len(student_idx), self.batch_size):
+            stop = start + self.batch_size
+            Enrollment.objects.bulk_create(
+                [
+                    Enrollment(student_id=student_pks[s], course_id=course_pks[c], status=status_codes[st])
+                    for s, c, st in zip(student_idx[start:stop], course_idx[start:stop], statuses[start:stop])
+                ],
+                batch_size=self.batch_size,
+                update_counters=False,
+            )
+        return student_idx
@@ -0,0 +1,290 @@
+import json
+import os
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from fefu_lab import search
+from fefu_lab.models import Student, Course
+
+
+def iter_json_array(fh, chunk_size=1 << 16):
+    """
+    Потоковый разбор JSON-массива верхнего уровня: объекты выдаются
+    по одному, в памяти хранится только текущий фрагмент файла.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Пропуск пробелов и разделителей между элементами массива
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise CommandError('Фикстура должна быть JSON-массивом')
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == ']':
+            return
+
+        if position < len(buffer):
+            try:
+                obj, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError(f'Некорректный JSON рядом с позицией {position}')
+            else:
+                position = end
+                yield obj
+                continue
+        elif eof:
+            raise CommandError('Неожиданный конец файла фикстуры')
+
+        chunk = fh.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def dependency_order(models):
+    """Топологическая сортировка моделей по внешним ключам"""
+    models = list(models)
+    present = set(models)
+    deps = {
+        model: {
+            field.related_model for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model in present and field.related_model is not model
+        }
+        for model in models
+    }
+    ordered = []
+    while deps:
+        ready = sorted((m for m, d in deps.items() if not d), key=lambda m: m._meta.label)
+        if not ready:
+            # Циклическая зависимость - берем оставшиеся в исходном порядке
+            ready = [m for m in models if m in deps]
+        for model in ready:
+            ordered.append(model)
+            del deps[model]
+        for pending in deps.values():
+            pending.difference_update(ready)
+    return ordered
+
+
+@contextmanager
+def raw_timestamps(models):
+    """Сохранение дат из фикстуры: bulk_create иначе перезапишет auto_now/auto_now_add"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка фикстуры в формате dumpdata/data.json: объекты '
+        'группируются по моделям, загружаются пачками в порядке зависимостей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='Путь к JSON-фикстуре')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пачки')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Алиас базы данных')
+        parser.add_argument('--dry-run', action='store_true', help='Только разобрать фикстуру и оценить скорость')
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванную загрузку с последней сохраненной пачки'
+        )
+        parser.add_argument('--state-file', help='Файл прогресса (по умолчанию <fixture>.progress.json)')
+
+    def handle(self, *args, **options):
+        path = options['fixture']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+
+        self.using = options['database']
+        self.batch_size = options['batch_size']
+        self.state_path = options['state_file'] or f'{path}.progress.json'
+        self.state = self.load_state(path) if options['resume'] else self.new_state(path)
+
+        with tempfile.TemporaryDirectory(prefix='stream_loaddata_') as workdir:
+            started = time.perf_counter()
+            parts, counts = self.split_by_model(path, workdir)
+            parse_time = time.perf_counter() - started
+            total = sum(counts.values())
+            self.stdout.write(
+                f'Разобрано {total} объектов за {parse_time:.2f} с '
+                f'({total / max(parse_time, 1e-9):.0f} объектов/с)'
+            )
+
+            models = dependency_order(parts)
+            self.stdout.write('Порядок загрузки: ' + ', '.join(m._meta.label_lower for m in models))
+
+            with raw_timestamps(models):
+                for model in models:
+                    self.load_model(model, parts[model], counts[model], options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Пробный прогон завершен, данные не записаны.'))
+            return
+
+        self.finalize(models)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {total} объектов за {time.perf_counter() - started:.2f} с'
+        ))
+
+    # -- прогресс ----------------------------------------------------------
+
+    def new_state(self, path):
+        stat = os.stat(path)
+        return {'fixture': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'done': {}}
+
+    def load_state(self, path):
+        expected = self.new_state(path)
+        try:
+            with open(self.state_path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            return expected
+        if (state.get('fixture'), state.get('size'), state.get('mtime')) != (
+            expected['fixture'], expected['size'], expected['mtime']
+        ):
+            raise CommandError('Файл прогресса относится к другой версии фикстуры')
+        return state
+
+    def save_state(self):
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self.state, fh)
+        os.replace(tmp_path, self.state_path)
+
+    # -- разбор ------------------------------------------------------------
+
+    def split_by_model(self, path, workdir):
+        """Первый проход: объекты раскладываются по временным JSONL-файлам моделей"""
+        files, parts, counts = {}, {}, Counter()
+        try:
+            with open(path, encoding='utf-8') as fh:
+                for obj in iter_json_array(fh):
+                    label = obj.get('model')
+                    try:
+                        model = apps.get_model(label)
+                    except (LookupError, ValueError, TypeError):
+                        raise CommandError(f'Неизвестная модель в фикстуре: {label!r}')
+                    if model not in files:
+                        parts[model] = os.path.join(workdir, f'{model._meta.label_lower}.jsonl')
+                        files[model] = open(parts[model], 'w', encoding='utf-8')
+                    files[model].write(json.dumps(obj, ensure_ascii=False) + '\n')
+                    counts[model] += 1
+        finally:
+            for part in files.values():
+                part.close()
+        return parts, counts
+
+    def iter_batches(self, part_path, skip):
+        batch = []
+        with open(part_path, encoding='utf-8') as fh:
+            for index, line in enumerate(fh):
+                if index < skip:
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    # -- загрузка ----------------------------------------------------------
+
+    def load_model(self, model, part_path, count, dry_run):
+        label = model._meta.label_lower
+        done = 0 if dry_run else self.state['done'].get(label, 0)
+        if done >= count:
+            self.stdout.write(f'  {label}: уже загружено ({count})')
+            return
+
+        pk_name = model._meta.pk.name
+        update_fields = [
+            f.name for f in model._meta.concrete_fields
+            if not f.primary_key
+        ]
+
+        started = time.perf_counter()
+        for batch in self.iter_batches(part_path, done):
+            objs, m2m = [], defaultdict(list)
+            for deserialized in Deserializer(batch, using=self.using, ignorenonexistent=True):
+                objs.append(deserialized.object)
+                for field_name, values in (deserialized.m2m_data or {}).items():
+                    m2m[field_name].append((deserialized.object.pk, values))
+
+            if not dry_run:
+                with transaction.atomic(using=self.using):
+                    model._base_manager.using(self.using).bulk_create(
+                        objs,
+                        update_conflicts=bool(update_fields),
+                        update_fields=update_fields or None,
+                        unique_fields=[pk_name] if update_fields else None,
+                    )
+                    self.insert_m2m(model, m2m)
+                self.state['done'][label] = done + len(objs)
+                self.save_state()
+            done += len(objs)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'  {label}: {count} объектов за {elapsed:.2f} с ({count / max(elapsed, 1e-9):.0f} объектов/с)'
+        )
+
+    def insert_m2m(self, model, m2m):
+        for field_name, rows in m2m.items():
+            field = model._meta.get_field(field_name)
+            through = field.remote_field.through
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            through.objects.using(self.using).bulk_create(
+                [
+                    through(**{f'{source}_id': pk, f'{target}_id': value})
+                    for pk, values in rows for value in values
+                ],
+                ignore_conflicts=True,
+            )
+
+    def finalize(self, models):
+        """Пересчет производных данных, которые bulk_create не поддерживает сигналами"""
+        connection = connections[self.using]
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for line in sequence_sql:
+                    cursor.execute(line)
+
+        labels = {m._meta.label_lower for m in models}
+        with transaction.atomic(using=self.using):
+            if labels & {'fefu_lab.course', 'fefu_lab.enrollment'}:
+                Course.recount_enrollments()
+            if labels & {'fefu_lab.student', 'auth.user'}:
+                search.rebuild_index(Student, using=self.using)
+            if 'fefu_lab.course' in labels:
+                search.rebuild_index(Course, using=self.using)
@@ -0,0 +1,371 @@
+"""
+Метрики запросов: количество SQL-запросов, время БД, шаблонов и ответа
+для каждого URL name.
+
+Каждый воркер gunicorn накапливает метрики в памяти и периодически
+сбрасывает снимок в METRICS_DIR, откуда их собирает эндпоинт /metrics/.
+Вместе с ними - попадания и промахи кеша воркера (fefu_lab.caching).
+"""
+import json
+import os
+import resource
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+from . import caching
+
+
+# Границы корзин гистограмм (мс и количество запросов к БД)
+TIME_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+class RequestStats:
+    """Статистика одного HTTP-запроса"""
+    
+    def __init__(self, capture_sql=True):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.capture_sql = capture_sql
+        self.sql = []
+    
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.capture_sql and len(self.sql) < 200:
+            self.sql.append((duration, sql))
+    
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_query(sql, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка каждого соединения: запрос учитывается в статистике текущего
+    HTTP-запроса. Статистика берется из контекста, поэтому учитываются и
+    запросы асинхронных представлений, выполняемые в потоках sync_to_async
+    """
+    stats = current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+# Открытых процессом соединений с БД: при переиспользовании растет медленнее запросов
+db_connections_opened = 0
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    global db_connections_opened
+    db_connections_opened += 1
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class _ViewMetrics:
+    def __init__(self, window):
+        self.count = 0
+        self.wall_sum = 0.0
+        self.db_sum = 0.0
+        self.template_sum = 0.0
+        self.queries_sum = 0
+        self.time_buckets = [0] * (len(TIME_BUCKETS) + 1)
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.recent = deque(maxlen=window)
+    
+    def observe(self, wall_ms, db_ms, template_ms, queries):
+        self.count += 1
+        self.wall_sum += wall_ms
+        self.db_sum += db_ms
+        self.template_sum += template_ms
+        self.queries_sum += queries
+        self.time_buckets[_bucket(TIME_BUCKETS, wall_ms)] += 1
+        self.query_buckets[_bucket(QUERY_BUCKETS, queries)] += 1
+        self.recent.append(round(wall_ms, 3))
+    
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'wall_sum': self.wall_sum,
+            'db_sum': self.db_sum,
+            'template_sum': self.template_sum,
+            'queries_sum': self.queries_sum,
+            'time_buckets': self.time_buckets,
+            'query_buckets': self.query_buckets,
+            'recent': list(self.recent),
+        }
+
+
+def _bucket(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+class MetricsRegistry:
+    """Метрики текущего процесса с периодическим сбросом в общий каталог"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._last_flush = 0.0
+    
+    def observe(self, view_name, wall_ms, db_ms, template_ms, queries):
+        window = getattr(settings, 'METRICS_WINDOW', 500)
+        with self._lock:
+            metrics = self._views.get(view_name)
+            if metrics is None:
+                metrics = self._views[view_name] = _ViewMetrics(window)
+            metrics.observe(wall_ms, db_ms, template_ms, queries)
+        self._maybe_flush()
+    
+    def snapshot(self):
+        with self._lock:
+            return {name: metrics.to_dict() for name, metrics in self._views.items()}
+    
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+    
+    def _maybe_flush(self):
+        directory = getattr(settings, 'METRICS_DIR', '')
+        now = time.monotonic()
+        if not directory or now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self._last_flush = now
+        self.flush(directory)
+    
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'worker-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({
+                'pid': os.getpid(),
+                'updated': time.time(),
+                'views': self.snapshot(),
+                'worker': worker_info(),
+                'cache': caching.stats.snapshot(),
+            }, fh)
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+# Время запуска процесса; воркеры gunicorn получают свое при fork
+_process_started = time.time()
+
+
+def _reset_process_started():
+    global _process_started, db_connections_opened
+    _process_started = time.time()
+    db_connections_opened = 0
+
+
+os.register_at_fork(after_in_child=_reset_process_started)
+
+
+def rss_bytes():
+    """Резидентная память процесса (из /proc; иначе пиковая по getrusage)"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss в Linux - в килобайтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def worker_info():
+    """Состояние текущего воркера: pid, время работы, запросы, память"""
+    return {
+        'pid': os.getpid(),
+        'started': _process_started,
+        'requests': sum(data['count'] for data in registry.snapshot().values()),
+        'rss_bytes': rss_bytes(),
+        'db_connections': db_connections_opened,
+    }
+
+
+def collect_worker_files():
+    """
+    Данные всех живых воркеров из METRICS_DIR (или только текущего процесса).
+    Файлы читаются один раз на запрос /metrics/: collect_* принимают результат
+    """
+    directory = getattr(settings, 'METRICS_DIR', '')
+    if not directory:
+        return [{'views': registry.snapshot(), 'worker': worker_info(), 'cache': caching.stats.snapshot()}]
+    
+    registry.flush(directory)
+    max_age = getattr(settings, 'METRICS_WORKER_TTL', 3600)
+    workers = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding='utf-8') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if time.time() - data.get('updated', 0) > max_age:
+            # Воркер давно не обновлял метрики - скорее всего он перезапущен
+            continue
+        workers.append(data)
+    return workers
+
+
+def collect_snapshots(files=None):
+    """Снимки метрик представлений всех воркеров"""
+    files = collect_worker_files() if files is None else files
+    return [data['views'] for data in files]
+
+
+def collect_workers(files=None):
+    """
+    Состояние воркеров по последним снимкам; у завершенных после
+    max_requests воркеров файл остается до METRICS_WORKER_TTL
+    """
+    files = collect_worker_files() if files is None else files
+    now = time.time()
+    workers = [
+        {**data['worker'], 'uptime': now - data['worker']['started']}
+        for data in files if 'worker' in data
+    ]
+    return sorted(workers, key=lambda worker: worker['pid'])
+
+
+def collect_cache_stats(files=None):
+    """Попадания, промахи и устаревшие записи кеша по пространствам имен, сумма по воркерам"""
+    files = collect_worker_files() if files is None else files
+    merged = {}
+    for data in files:
+        for namespace, counts in data.get('cache', {}).items():
+            target = merged.setdefault(namespace, {'hits': 0, 'misses': 0, 'stale': 0})
+            for key, value in counts.items():
+                target[key] = target.get(key, 0) + value
+    return merged
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = {**data, 'recent': list(data['recent'])}
+                continue
+            for key in ('count', 'wall_sum', 'db_sum', 'template_sum', 'queries_sum'):
+                target[key] += data[key]
+            for key in ('time_buckets', 'query_buckets'):
+                target[key] = [a + b for a, b in zip(target[key], data[key])]
+            target['recent'].extend(data['recent'])
+    return merged
+
+
+def _quantile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def render_prometheus(merged, workers=(), cache_stats=None):
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    
+    def histogram(metric, help_text, bounds, key, sum_key):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for name, data in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(bounds + ('+Inf',), data[key]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{name}"}} {data[sum_key]:.3f}')
+            lines.append(f'{metric}_count{{view="{name}"}} {data["count"]}')
+    
+    histogram('fefu_request_duration_ms', 'Время обработки запроса, мс', TIME_BUCKETS, 'time_buckets', 'wall_sum')
+    histogram('fefu_request_db_queries', 'Количество SQL-запросов на запрос', QUERY_BUCKETS, 'query_buckets', 'queries_sum')
+    
+    for metric, key, help_text in (
+        ('fefu_request_db_time_ms_total', 'db_sum', 'Суммарное время БД, мс'),
+        ('fefu_request_template_time_ms_total', 'template_sum', 'Суммарное время рендеринга шаблонов, мс'),
+    ):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for name, data in sorted(merged.items()):
+            lines.append(f'{metric}{{view="{name}"}} {data[key]:.3f}')
+    
+    lines.append('# HELP fefu_request_recent_duration_ms Время ответа по последним запросам, мс')
+    lines.append('# TYPE fefu_request_recent_duration_ms summary')
+    for name, data in sorted(merged.items()):
+        for q in (0.5, 0.95, 0.99):
+            lines.append(
+                f'fefu_request_recent_duration_ms{{view="{name}",quantile="{q}"}} '
+                f'{_quantile(data["recent"], q):.3f}'
+            )
+    
+    for metric, key, help_text in (
+        ('fefu_worker_requests', 'requests', 'Запросов, обработанных воркером'),
+        ('fefu_worker_rss_bytes', 'rss_bytes', 'Резидентная память воркера, байт'),
+        ('fefu_worker_uptime_seconds', 'uptime', 'Время работы воркера, с'),
+        ('fefu_worker_db_connections_opened', 'db_connections', 'Открыто соединений с БД'),
+    ):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for worker in workers:
+            lines.append(f'{metric}{{pid="{worker["pid"]}"}} {worker.get(key, 0):.0f}')
+    
+    lines.append('# HELP fefu_cache_requests_total Чтения кеша по пространствам имен ключей')
+    lines.append('# TYPE fefu_cache_requests_total counter')
+    for namespace, counts in sorted((cache_stats or {}).items()):
+        for result, key in (('hit', 'hits'), ('miss', 'misses'), ('stale', 'stale')):
+            lines.append(f'fefu_cache_requests_total{{namespace="{namespace}",result="{result}"}} {counts.get(key, 0)}')
+    return '\n'.join(lines) + '\n'
+
+
+class _InstrumentedTemplate:
+    """Шаблон, добавляющий время рендеринга в статистику текущего запроса"""
+    
+    def __init__(self, template):
+        self._template = template
+    
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+    
+    def render(self, context=None, request=None):
+        stats = current_request_stats.get()
+        if stats is None:
+            return self._template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django с замером времени рендеринга"""
+    
+    def from_string(self, template_code):
+        return _InstrumentedTemplate(super().from_string(template_code))
+    
+    def get_template(self, template_name):
+        return _InstrumentedTemplate(super().get_template(template_name))
@@ -0,0 +1,154 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import db_router
+from .metrics import RequestStats, current_request_stats, registry
+
+
+logger = logging.getLogger('fefu_lab.metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    Замер количества SQL-запросов, времени БД, рендеринга шаблонов
+    и общего времени ответа для каждого URL name.
+    
+    Работает и в синхронном (WSGI), и в асинхронном (ASGI) стеке: запросы
+    к БД учитывает обертка соединений metrics.record_query.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self._finish(request, response, stats, started)
+    
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self._finish(request, response, stats, started)
+    
+    def _start(self):
+        stats = RequestStats(capture_sql=bool(getattr(settings, 'METRICS_LOG_SLOW_SQL', True)))
+        return stats, current_request_stats.set(stats), time.perf_counter()
+    
+    def _finish(self, request, response, stats, started):
+        wall_ms = (time.perf_counter() - started) * 1000
+        
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        if view_name in getattr(settings, 'METRICS_EXCLUDE_VIEWS', ()):
+            return response
+        
+        db_ms = stats.db_time * 1000
+        template_ms = stats.template_time * 1000
+        registry.observe(view_name, wall_ms, db_ms, template_ms, stats.queries)
+        
+        if getattr(settings, 'METRICS_RESPONSE_HEADERS', True):
+            response['X-DB-Queries'] = str(stats.queries)
+            response['Server-Timing'] = (
+                f'db;dur={db_ms:.1f}, tpl;dur={template_ms:.1f}, total;dur={wall_ms:.1f}'
+            )
+        
+        self._check_budget(request, view_name, stats, wall_ms)
+        return response
+    
+    def _check_budget(self, request, view_name, stats, wall_ms):
+        query_budget = getattr(settings, 'METRICS_QUERY_BUDGET', None)
+        time_budget = getattr(settings, 'METRICS_TIME_BUDGET_MS', None)
+        over_queries = query_budget is not None and stats.queries > query_budget
+        over_time = time_budget is not None and wall_ms > time_budget
+        if not (over_queries or over_time):
+            return
+        
+        sql = '\n'.join(f'  [{duration * 1000:.1f} мс] {query}' for duration, query in stats.sql)
+        logger.warning(
+            'Превышен бюджет запроса %s %s (%s): %d SQL-запросов, %.1f мс\n%s',
+            request.method, request.path, view_name, stats.queries, wall_ms, sql,
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Выбор реплики БД для чтений запроса (fefu_lab.db_router) и закрепление
+    посетителя за основной БД после записи.
+    
+    Должен стоять до SessionMiddleware: сохранение сессии - тоже запись.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start(request)
+        token = db_router.current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.current_routing.reset(token)
+        return self._finish(request, response, state)
+    
+    async def __acall__(self, request):
+        state = self._start(request)
+        token = db_router.current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.current_routing.reset(token)
+        return self._finish(request, response, state)
+    
+    def _start(self, request):
+        return db_router.RoutingState(pinned=settings.DB_REPLICA_PIN_COOKIE in request.COOKIES)
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Объект состояния общий: изменения видны и из потоков sync_to_async
+        state = db_router.current_routing.get()
+        if (
+            state is None or state.pinned or not settings.DB_REPLICAS
+            or request.method not in ('GET', 'HEAD')
+            or not db_router.is_replica_view(request.resolver_match.view_name)
+        ):
+            return None
+        state.replica = db_router.pick_replica()
+        return None
+    
+    def process_exception(self, request, exception):
+        state = db_router.current_routing.get()
+        if state is not None and state.replica is not None and isinstance(exception, DatabaseError):
+            db_router.health.mark_unhealthy(state.replica)
+        return None
+    
+    def _finish(self, request, response, state):
+        if settings.DB_REPLICAS and (state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            response.set_cookie(
+                settings.DB_REPLICA_PIN_COOKIE, '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:23
+
+import re
+
+from django.db import migrations, models
+
+
+def make_document(*parts):
+    text = ' '.join(part or '' for part in parts).casefold().replace('ё', 'е')
+    tokens = re.findall(r'\w+', text)
+    return f' {" ".join(tokens)} ' if tokens else ''
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for table in ('students', 'courses'):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_document_gin '
+                f"ON {table} USING GIN (to_tsvector('simple', search_document))"
+            )
+    elif connection.vendor == 'sqlite':
+        for table in ('students_fts', 'courses_fts'):
+            try:
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(document, tokenize='unicode61')"
+                )
+            except Exception:
+                # SQLite собран без FTS5 - поиск будет работать по подстрокам
+                return
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for table in ('students', 'courses'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_document_gin')
+    elif connection.vendor == 'sqlite':
+        for table in ('students_fts', 'courses_fts'):
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def fill_search_documents(apps, schema_editor):
+    connection = schema_editor.connection
+    tables = set(connection.introspection.table_names())
+    Student = apps.get_model('fefu_lab', 'Student')
+    Course = apps.get_model('fefu_lab', 'Course')
+    
+    for model, fts_table, build in (
+        (Student.objects.select_related('user'), 'students_fts',
+         lambda s: make_document(s.user.first_name, s.user.last_name, s.user.email)),
+        (Course.objects.all(), 'courses_fts',
+         lambda c: make_document(c.title, c.description)),
+    ):
+        objs = list(model)
+        for obj in objs:
+            obj.search_document = build(obj)
+        model.model.objects.bulk_update(objs, ['search_document'], batch_size=1000)
+        if fts_table in tables:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {fts_table}(rowid, document) VALUES (%s, %s)',
+                    [(obj.pk, obj.search_document) for obj in objs]
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0002_course_enrolled_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
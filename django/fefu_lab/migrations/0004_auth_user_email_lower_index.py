@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс по LOWER(email) для входа по email без учета регистра.
+    Таблица auth_user принадлежит django.contrib.auth, поэтому индекс
+    создается SQL-выражением, одинаковым для SQLite и PostgreSQL.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('fefu_lab', '0003_search_document'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_lower_idx ON auth_user (LOWER(email))',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_lower_idx',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0004_auth_user_email_lower_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', 'id'], name='courses_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['level', '-created_at', 'id'], name='courses_active_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'status'], name='enrollments_course_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'status'], name='enrollments_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['course'], name='enrollments_active_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['-enrolled_at'], name='enrollments_enrolled_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['faculty', 'user'], name='students_active_faculty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='students_active_user_idx'),
+        ),
+        # Список студентов сортируется по имени из auth_user
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_name_idx ON auth_user (last_name, first_name, id)',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_name_idx',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:31
+
+import fefu_lab.avatars
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0006_conditional_get_validators'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to=fefu_lab.avatars.upload_to, validators=[fefu_lab.avatars.validate_avatar], verbose_name='Аватар'),
+        ),
+    ]
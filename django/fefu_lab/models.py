@@ -1,10 +1,20 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver, Signal
+
+from . import avatars
+
+
+# Массовый пересчет счетчиков записей (bulk-операции не отправляют
+# post_save); аргумент course_ids - затронутые курсы или None для всех
+enrolled_counts_changed = Signal()
 
 
 class Instructor(models.Model):
@@ -24,6 +34,7 @@ class Instructor(models.Model):
     bio = models.TextField(blank=True, verbose_name='Биография')
     is_active = models.BooleanField(default=True, verbose_name='Активен')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
     class Meta:
         verbose_name = 'Преподаватель'
@@ -65,9 +76,13 @@ class Student(models.Model):
     faculty = models.CharField(max_length=3, choices=FACULTY_CHOICES, default='CS', verbose_name='Факультет')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='STUDENT', verbose_name='Роль')
     phone = models.CharField(max_length=20, blank=True, verbose_name='Телефон')
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='Аватар')
+    avatar = models.ImageField(
+        upload_to=avatars.upload_to, validators=[avatars.validate_avatar],
+        blank=True, null=True, verbose_name='Аватар'
+    )
     bio = models.TextField(blank=True, verbose_name='О себе')
     is_active = models.BooleanField(default=True, verbose_name='Активен')
+    search_document = models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -76,6 +91,13 @@ class Student(models.Model):
         verbose_name_plural = 'Студенты'
         ordering = ['user__last_name', 'user__first_name']
         db_table = 'students'
+        indexes = [
+            # Список и счетчики активных студентов с фильтром по факультету
+            models.Index(fields=['faculty', 'user'], condition=Q(is_active=True), name='students_active_faculty_idx'),
+            models.Index(fields=['user'], condition=Q(is_active=True), name='students_active_user_idx'),
+            # Валидатор условного GET списка студентов (MAX(updated_at))
+            models.Index(fields=['updated_at'], name='students_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.last_name} {self.user.first_name}"
@@ -99,8 +121,59 @@ class Student(models.Model):
     def email(self):
         return self.user.email
     
+    @property
+    def avatar_thumbnail(self):
+        """Миниатюра аватара (JPEG и WebP) или None, если его нет или он еще обрабатывается"""
+        return avatars.thumbnail(self.avatar.name)
+    
     def get_faculty_display_name(self):
         return dict(self.FACULTY_CHOICES).get(self.faculty, 'Неизвестно')
+    
+    # Поля, которые не считаются изменением профиля
+    UNTRACKED_FIELDS = ('id', 'search_document', 'created_at', 'updated_at')
+    # Поля пользователя, которые показываются в профиле: их изменение обновляет updated_at
+    USER_FIELDS = ('first_name', 'last_name', 'email')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_state()
+        return instance
+    
+    def _remember_loaded_state(self):
+        self._loaded_values = {
+            field.attname: self.__dict__.get(field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in self.UNTRACKED_FIELDS and field.attname in self.__dict__
+        }
+    
+    def changed_fields(self):
+        """Имена полей, измененных с момента загрузки (None - профиль еще не загружался)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]
+        ]
+    
+    def save_changes(self, touch=False, **kwargs):
+        """
+        Сохранить только измененные поля; без изменений запрос не выполняется,
+        если не указан touch (обновить updated_at в любом случае)
+        """
+        changed = self.changed_fields()
+        if changed is None:
+            self.save(**kwargs)
+            return True
+        if not changed and not touch:
+            return False
+        self.save(update_fields=changed + ['updated_at'], **kwargs)
+        return True
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_loaded_state()
 
 
 class Course(models.Model):
@@ -120,6 +193,8 @@ class Course(models.Model):
     max_students = models.PositiveIntegerField(default=30, validators=[MinValueValidator(1), MaxValueValidator(100)], verbose_name='Максимум студентов')
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)], verbose_name='Цена')
     is_active = models.BooleanField(default=True, verbose_name='Активен')
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Записано студентов')
+    search_document = models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -128,6 +203,13 @@ class Course(models.Model):
         verbose_name_plural = 'Курсы'
         ordering = ['-created_at']
         db_table = 'courses'
+        indexes = [
+            # Каталог: активные курсы, новые первыми, с фильтром по уровню
+            models.Index(fields=['-created_at', 'id'], condition=Q(is_active=True), name='courses_active_created_idx'),
+            models.Index(
+                fields=['level', '-created_at', 'id'], condition=Q(is_active=True), name='courses_active_level_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.title
@@ -135,18 +217,104 @@ class Course(models.Model):
     def get_absolute_url(self):
         return reverse('fefu_lab:course_detail', kwargs={'course_slug': self.slug})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_from_db = True
+        return instance
+    
     def save(self, *args, **kwargs):
+        """
+        Счетчик записей обновляется только через adjust_enrolled_count и
+        recount_enrollments: у загруженного из БД курса save() без update_fields
+        сохраняет все загруженные поля, кроме enrolled_count, - иначе устаревший
+        экземпляр затер бы актуальное значение. Поэтому, как и при явных
+        update_fields, курс, удаленный после загрузки, заново не вставляется
+        (DatabaseError). Новые курсы, force_insert и явные update_fields -
+        обычное поведение Model.save().
+        """
         if not self.slug:
             self.slug = slugify(self.title)
+        if (
+            getattr(self, '_loaded_from_db', False)
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'enrolled_count' and f.attname not in deferred
+            ]
         super().save(*args, **kwargs)
     
     @property
-    def enrolled_count(self):
-        return self.enrollments.filter(status='ACTIVE').count()
+    def available_seats(self):
+        return max(self.max_students - self.enrolled_count, 0)
     
     @property
     def has_available_seats(self):
         return self.enrolled_count < self.max_students
+    
+    @classmethod
+    def adjust_enrolled_count(cls, course_id, delta):
+        """Атомарное изменение счетчика активных записей"""
+        if course_id is None or not delta:
+            return
+        # Счетчик виден на странице курса - updated_at служит ее валидатором
+        cls.objects.filter(pk=course_id).update(
+            enrolled_count=F('enrolled_count') + delta, updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def recount_enrollments(cls, course_ids=None):
+        """Пересчет счетчика активных записей по таблице enrollments"""
+        active = Enrollment.objects.filter(course=OuterRef('pk'), status='ACTIVE').order_by()
+        active_count = active.values('course').annotate(c=Count('pk')).values('c')
+        courses = cls.objects.all()
+        if course_ids is not None:
+            course_ids = set(course_ids)
+            courses = courses.filter(pk__in=course_ids)
+        rows = courses.update(
+            enrolled_count=Coalesce(Subquery(active_count), 0),
+            updated_at=timezone.now(),
+        )
+        enrolled_counts_changed.send(sender=cls, course_ids=course_ids)
+        return rows
+
+
+class EnrollmentQuerySet(models.QuerySet):
+    """QuerySet записей, поддерживающий счетчики курсов при массовых операциях"""
+    
+    def update(self, **kwargs):
+        if 'status' not in kwargs and 'course' not in kwargs and 'course_id' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            course_ids = set(self.values_list('course_id', flat=True).order_by())
+            rows = super().update(**kwargs)
+            new_course = kwargs.get('course_id', kwargs.get('course'))
+            if new_course is not None:
+                course_ids.add(getattr(new_course, 'pk', new_course))
+            Course.recount_enrollments(course_ids)
+        return rows
+    
+    def bulk_create(self, objs, *args, update_counters=True, **kwargs):
+        # update_counters=False - вызывающий код сам выставил enrolled_count
+        if not update_counters:
+            return super().bulk_create(objs, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            Course.recount_enrollments({obj.course_id for obj in created})
+        return created
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'status' not in fields and 'course' not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            course_ids = {obj.course_id for obj in objs}
+            course_ids.update(obj._loaded_course_id for obj in objs if obj._loaded_course_id)
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            Course.recount_enrollments(course_ids)
+        return rows
 
 
 class Enrollment(models.Model):
@@ -162,25 +330,101 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата записи')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE', verbose_name='Статус')
     
+    objects = EnrollmentQuerySet.as_manager()
+    
+    _loaded_status = None
+    _loaded_course_id = None
+    # Место уже занято сервисом записи, счетчик курса не увеличивается повторно
+    _seat_reserved = False
+    
     class Meta:
         verbose_name = 'Запись на курс'
         verbose_name_plural = 'Записи на курсы'
         ordering = ['-enrolled_at']
         unique_together = ['student', 'course']
         db_table = 'enrollments'
+        indexes = [
+            models.Index(fields=['course', 'status'], name='enrollments_course_status_idx'),
+            models.Index(fields=['student', 'status'], name='enrollments_student_status_idx'),
+            # Пересчет счетчиков и списки записанных: только активные записи
+            models.Index(fields=['course'], condition=Q(status='ACTIVE'), name='enrollments_active_course_idx'),
+            models.Index(fields=['-enrolled_at'], name='enrollments_enrolled_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.full_name} - {self.course.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_state()
+        return instance
+    
+    def _remember_loaded_state(self):
+        self._loaded_status = self.__dict__.get('status')
+        self._loaded_course_id = self.__dict__.get('course_id')
+    
+    def save(self, *args, **kwargs):
+        # Запись и изменение счетчика курса выполняются в одной транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
+# Поддержка счетчика активных записей на курсе
+@receiver(post_save, sender=Enrollment)
+def update_course_counter_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not {'status', 'course'} & set(update_fields):
+        return
+    if raw or (not created and instance._loaded_status is None):
+        # Исходное состояние неизвестно (loaddata, отложенные поля) - пересчитываем
+        Course.recount_enrollments({instance.course_id, instance._loaded_course_id} - {None})
+        instance._remember_loaded_state()
+        return
+    
+    was_active = not created and instance._loaded_status == 'ACTIVE'
+    old_course_id = None if created else instance._loaded_course_id
+    is_active = instance.status == 'ACTIVE'
+    if created and instance._seat_reserved:
+        was_active, old_course_id = is_active, instance.course_id
+    
+    if old_course_id == instance.course_id:
+        Course.adjust_enrolled_count(instance.course_id, int(is_active) - int(was_active))
+    else:
+        Course.adjust_enrolled_count(old_course_id, -int(was_active))
+        Course.adjust_enrolled_count(instance.course_id, int(is_active))
+    instance._remember_loaded_state()
 
-# Сигнал для автоматического создания профиля при регистрации
+
+@receiver(post_delete, sender=Enrollment)
+def update_course_counter_on_delete(sender, instance, **kwargs):
+    if instance._loaded_status == 'ACTIVE' or (instance._loaded_status is None and instance.status == 'ACTIVE'):
+        Course.adjust_enrolled_count(instance._loaded_course_id or instance.course_id, -1)
+
+
+# Профиль создается вместе с пользователем одним INSERT; значения полей
+# профиля можно передать заранее через user.profile_defaults
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def sync_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
     if created:
-        Student.objects.create(user=instance)
+        Student.objects.create(user=instance, **getattr(instance, 'profile_defaults', {}))
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    # Имя и email показываются в профиле - его updated_at должен измениться
+    touch = update_fields is None or bool(set(update_fields) & set(Student.USER_FIELDS))
+    # Сохраняем только уже загруженный профиль и только если он изменился
+    # В кеше обратной связи может быть None: профиль запрашивался, но его нет
+    if Student.user.field.remote_field.is_cached(instance):
+        profile = Student.user.field.remote_field.get_cached_value(instance)
+        if profile is not None:
+            profile.save_changes(touch=touch)
+    elif touch:
+        Student.objects.filter(user=instance).update(updated_at=timezone.now())
 
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'student_profile'):
-        instance.student_profile.save()
+# SET_NULL при удалении преподавателя меняет курсы без save() - отмечаем их изменение
+@receiver(pre_delete, sender=Instructor)
+def touch_instructor_courses(sender, instance, **kwargs):
+    instance.courses.update(updated_at=timezone.now())
@@ -0,0 +1,267 @@
+"""
+Кеш страниц каталога для анонимных посетителей и фрагментов для остальных.
+
+Каждая закешированная страница хранит версии групп, от которых зависит:
+'catalog' (состав и порядок списка курсов), 'course:<pk>' (данные курса,
+его преподаватель и счетчик записей), 'stats' (счетчики главной).
+Сигналы моделей меняют версии только затронутых групп после фиксации
+транзакции; страница с устаревшей версией любой группы не отдается.
+Версия начинается со времени смены: страница, прочитанная с реплики БД
+вскоре после смены, может не содержать изменения и не кешируется.
+Страницы хранятся в пространстве имен PAGES: manage.py invalidate_cache
+fefu_lab:page сбрасывает их все (например, после выкладки новых шаблонов).
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import db_router
+from .caching import CacheNamespace
+from .models import Student, Instructor, Course, Enrollment, enrolled_counts_changed
+from .search import normalize_text
+
+
+CATALOG = 'catalog'
+STATS = 'stats'
+# Все курсы сразу - для полного пересчета счетчиков без перечисления курсов
+ALL_COURSES = 'course:*'
+
+PAGES = CacheNamespace('fefu_lab:page')
+
+
+def course_group(course_id):
+    return f'course:{course_id}'
+
+
+def course_groups(courses):
+    """Группы страницы, на которой показаны данные курсов"""
+    return [ALL_COURSES, *(course_group(course.pk) for course in courses)]
+
+
+def is_enabled():
+    return getattr(settings, 'PAGE_CACHE', False)
+
+
+# -- версии групп -----------------------------------------------------------
+
+def _version_key(group):
+    return f'fefu_lab:page_version:{group}'
+
+
+def _new_version():
+    return f'{time.time():.3f}-{uuid.uuid4().hex}'
+
+
+def replica_may_lag(versions):
+    """Запрос читает с реплики, а версия группы сменилась позже допустимого отставания"""
+    if not db_router.reads_from_replica():
+        return False
+    horizon = time.time() - settings.DB_REPLICA_MAX_LAG
+    for version in versions.values():
+        changed, sep, _ = (version or '').partition('-')
+        if sep and float(changed) > horizon:
+            return True
+    return False
+
+
+def get_versions(groups):
+    """Текущие версии групп; отсутствующие в кеше создаются"""
+    keys = {group: _version_key(group) for group in groups}
+    found = cache.get_many(keys.values())
+    versions = {group: found.get(key) for group, key in keys.items()}
+    missing = [group for group, version in versions.items() if version is None]
+    for group in missing:
+        cache.add(keys[group], _new_version(), timeout=None)
+    if missing:
+        found = cache.get_many([keys[group] for group in missing])
+        versions.update({group: found.get(keys[group]) for group in missing})
+    return versions
+
+
+def bump(*groups):
+    """Новые версии групп после фиксации транзакции"""
+    groups = set(groups)
+    if not groups or not is_enabled():
+        return
+    transaction.on_commit(lambda: cache.set_many(
+        {_version_key(group): _new_version() for group in groups}, timeout=None
+    ))
+
+
+def attach_versions(courses):
+    """Версия группы каждого курса для ключей кеша фрагментов (одно обращение к кешу)"""
+    courses = list(courses)
+    if not is_enabled():
+        return courses
+    versions = get_versions(course_groups(courses))
+    if replica_may_lag(versions):
+        return courses
+    # Версия PAGES: invalidate_cache fefu_lab:page сбрасывает и фрагменты
+    pages_version = PAGES.version()
+    for course in courses:
+        course.cache_version = pages_version + versions[ALL_COURSES] + versions[course_group(course.pk)]
+    return courses
+
+
+# -- кеш страниц ------------------------------------------------------------
+
+def normalize_params(request, params):
+    """Значимые GET-параметры в каноническом виде; прочие (utm и т.п.) не влияют на ключ"""
+    normalized = []
+    for name in params:
+        # Остальные параметры (level, cursor) представление использует как есть -
+        # и ключ строится по исходному значению
+        value = request.GET.get(name, '')
+        if name == 'search':
+            value = ' '.join(normalize_text(value).split())
+        elif name == 'page':
+            value = value.strip()
+            value = value if value.isdigit() and value != '1' else ''
+        if value:
+            normalized.append((name, value))
+    return urlencode(normalized)
+
+
+def page_key(request, view_name, params):
+    raw = f'{request.path}?{normalize_params(request, params)}'
+    return f'{view_name}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def depends_on(request, *groups):
+    """Объявить группы, от которых зависит отрисованная страница"""
+    request.page_cache_groups = getattr(request, 'page_cache_groups', set()) | set(groups)
+
+
+def _cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # Страница с flash-сообщениями уникальна для посетителя
+    return not len(get_messages(request))
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _conditional(request, response):
+    # Валидаторы сохранены вместе с ответом - 304 без обращения к БД
+    last_modified = response.get('Last-Modified')
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+        response=response,
+    )
+
+
+def _lookup(request, view_name, params):
+    """(закешированный ответ или None, (ключ, версия PAGES) для сохранения или None)"""
+    if not is_enabled() or not _cacheable_request(request):
+        return None, None
+    key = page_key(request, view_name, params)
+    entry, version = PAGES.lookup(key)
+    if entry is not None and get_versions(entry['versions']) == entry['versions']:
+        return _conditional(request, entry['response']), None
+    return None, (key, version)
+
+
+def _store(request, target, response):
+    if _cacheable_response(request, response):
+        versions = get_versions(getattr(request, 'page_cache_groups', set()))
+        if replica_may_lag(versions):
+            return
+        key, version = target
+        PAGES.set(key, {'versions': versions, 'response': response}, settings.PAGE_CACHE_TIMEOUT, version)
+
+
+def cache_anonymous_page(params=()):
+    """
+    Кеширование ответа для анонимных посетителей. Ключ - путь и
+    нормализованные параметры params; представление объявляет
+    зависимости через depends_on(). Поддерживает и асинхронные представления.
+    """
+    def decorator(view_func):
+        view_name = view_func.__name__
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # Сессия, пользователь и кеш - синхронный API
+                cached, key = await sync_to_async(_lookup)(request, view_name, params)
+                if cached is not None:
+                    return cached
+                response = await view_func(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(_store)(request, key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            cached, key = _lookup(request, view_name, params)
+            if cached is not None:
+                return cached
+            response = view_func(request, *args, **kwargs)
+            if key is not None:
+                _store(request, key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+# -- инвалидация ------------------------------------------------------------
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump(course_group(instance.pk), CATALOG, STATS)
+
+
+# pre_delete: после удаления курсы уже отвязаны от преподавателя (SET_NULL)
+@receiver(post_save, sender=Instructor)
+@receiver(pre_delete, sender=Instructor)
+def instructor_changed(sender, instance, **kwargs):
+    if not is_enabled():
+        return
+    course_ids = Course.objects.filter(instructor_id=instance.pk).values_list('pk', flat=True)
+    bump(STATS, *(course_group(pk) for pk in course_ids))
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def student_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # На главной только число активных студентов
+    if created or update_fields is None or 'is_active' in update_fields or kwargs.get('signal') is post_delete:
+        bump(STATS)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    course_ids = {instance.course_id, getattr(instance, '_loaded_course_id', None)} - {None}
+    bump(*(course_group(pk) for pk in course_ids))
+
+
+@receiver(enrolled_counts_changed)
+def enrolled_counts_recounted(sender, course_ids, **kwargs):
+    if course_ids is None:
+        bump(ALL_COURSES)
+    else:
+        bump(*(course_group(pk) for pk in course_ids))
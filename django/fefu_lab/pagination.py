@@ -0,0 +1,164 @@
+"""
+Курсорная (keyset) пагинация.
+
+В отличие от django.core.paginator.Paginator не выполняет COUNT(*) по
+всей выборке и не использует OFFSET: следующая страница выбирается
+условием по значениям сортировки последней строки, поэтому время ответа
+не зависит от номера страницы. Поля сортировки должны быть NOT NULL и
+заканчиваться уникальным полем (обычно pk).
+"""
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.core import signing
+from django.db.models import Q
+
+
+CURSOR_SALT = 'fefu_lab.pagination.cursor'
+
+
+def _field_value(obj, path):
+    for attr in path.split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _encode(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class KeysetPage:
+    """Страница курсорной пагинации (интерфейс, близкий к django Page)"""
+    is_keyset = True
+    
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def __getitem__(self, index):
+        return self.object_list[index]
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинатор по ключу сортировки.
+    
+    ordering - кортеж полей, например ('user__last_name', 'user__first_name', 'pk')
+    или ('-created_at', 'pk'); направления полей могут различаться.
+    """
+    
+    def __init__(self, queryset, ordering, per_page, count_limit=1000):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.count_limit = count_limit
+        self._count = None
+    
+    @property
+    def count(self):
+        """Приблизительное количество: точное до count_limit, иначе count_limit"""
+        if self._count is None:
+            limit = self.count_limit
+            self._count = self.queryset.order_by()[:limit + 1].count() if limit else None
+        return self._count
+    
+    @property
+    def count_is_capped(self):
+        return self.count is not None and self.count > self.count_limit
+    
+    @property
+    def approximate_count(self):
+        return min(self.count, self.count_limit) if self.count is not None else None
+    
+    def encode_cursor(self, obj, direction):
+        values = [_encode(_field_value(obj, field.lstrip('-'))) for field in self.ordering]
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+    
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if direction not in ('next', 'prev') or len(values) != len(self.ordering):
+            return None
+        return direction, values
+    
+    def _seek(self, values, backwards):
+        """
+        Условие "строка после ключа" для составной сортировки:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        clauses = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != backwards
+            q = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+            for prev_field, prev_value in zip(self.ordering[:index], values):
+                q &= Q(**{prev_field.lstrip('-'): prev_value})
+            clauses.append(q)
+        return reduce(or_, clauses)
+    
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+    
+    def _page_query(self, cursor):
+        """Запрос строк страницы (на одну больше размера) и направление обхода"""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+        if decoded is None:
+            return self.queryset.order_by(*self.ordering)[:limit], None
+        direction, values = decoded
+        backwards = direction == 'prev'
+        queryset = self.queryset.filter(self._seek(values, backwards=backwards))
+        ordering = self._reversed_ordering() if backwards else self.ordering
+        return queryset.order_by(*ordering)[:limit], direction
+    
+    def _make_page(self, rows, direction):
+        size = self.per_page
+        if direction is None:
+            has_more, has_before = len(rows) > size, False
+            rows = rows[:size]
+        elif direction == 'next':
+            has_more, has_before = len(rows) > size, True
+            rows = rows[:size]
+        else:
+            has_before, has_more = len(rows) > size, True
+            rows = rows[:size][::-1]
+        
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_more else None
+        previous_cursor = self.encode_cursor(rows[0], 'prev') if rows and has_before else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+    
+    def get_page(self, cursor=None):
+        queryset, direction = self._page_query(cursor)
+        return self._make_page(list(queryset), direction)
+    
+    async def aget_page(self, cursor=None):
+        """get_page для асинхронных представлений (строки читаются через async ORM)"""
+        queryset, direction = self._page_query(cursor)
+        return self._make_page([obj async for obj in queryset], direction)
+    
+    async def acount(self):
+        if self._count is None and self.count_limit:
+            self._count = await self.queryset.order_by()[:self.count_limit + 1].acount()
+        return self.count
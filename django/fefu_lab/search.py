@@ -0,0 +1,216 @@
+"""
+Полнотекстовый поиск студентов и курсов.
+
+Для каждой записи хранится нормализованный поисковый документ
+(search_document): нижний регистр, ё -> е, только словные токены.
+Документ пересчитывается сигналами при сохранении. Поиск выполняется
+по префиксам всех слов запроса:
+
+* PostgreSQL - to_tsvector/to_tsquery по GIN-индексу, ранжирование ts_rank;
+* SQLite с FTS5 - виртуальные таблицы students_fts / courses_fts, ранжирование bm25;
+* иначе - поиск подстрок по search_document без ранжирования.
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Student, Course
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Модель -> имя таблицы FTS5 в SQLite
+FTS_TABLES = {
+    Student: 'students_fts',
+    Course: 'courses_fts',
+}
+
+_fts_available = {}
+
+
+def normalize_text(text):
+    """Приведение к нижнему регистру с учетом кириллицы (ё -> е)"""
+    return (text or '').casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def make_document(*parts):
+    # Пробелы по краям позволяют искать префикс слова как подстроку ' токен'
+    tokens = [token for part in parts for token in tokenize(part)]
+    return f' {" ".join(tokens)} ' if tokens else ''
+
+
+def student_document(student):
+    user = student.user
+    return make_document(user.first_name, user.last_name, user.email)
+
+
+def course_document(course):
+    return make_document(course.title, course.description)
+
+
+DOCUMENT_BUILDERS = {
+    Student: student_document,
+    Course: course_document,
+}
+
+
+# ---------------------------------------------------------------------------
+# Поиск
+# ---------------------------------------------------------------------------
+
+def search(queryset, query):
+    """
+    Фильтрация queryset по поисковому запросу с ранжированием.
+    Возвращает queryset с аннотацией search_rank (чем больше, тем релевантнее).
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk_column = f'{table}.{connection.ops.quote_name(model._meta.pk.column)}'
+    column = f'{table}.{connection.ops.quote_name("search_document")}'
+    
+    if connection.vendor == 'postgresql':
+        ts_query = ' & '.join(f'{token}:*' for token in tokens)
+        vector = f"to_tsvector('simple', {column})"
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT {pk_column} FROM {table} WHERE {vector} @@ to_tsquery('simple', %s)",
+                [ts_query]
+            )
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({vector}, to_tsquery('simple', %s))", [ts_query], output_field=FloatField())
+        )
+    
+    fts_table = FTS_TABLES.get(model)
+    if connection.vendor == 'sqlite' and fts_table and fts_is_available(connection, fts_table):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match])
+        ).annotate(
+            # bm25 отрицателен и меньше для более релевантных строк
+            search_rank=RawSQL(
+                f'SELECT -bm25({fts_table}) FROM {fts_table} '
+                f'WHERE {fts_table} MATCH %s AND rowid = {pk_column}',
+                [match],
+                output_field=FloatField()
+            )
+        )
+    
+    condition = Q()
+    for token in tokens:
+        condition &= Q(search_document__contains=f' {token}')
+    return queryset.filter(condition).annotate(search_rank=RawSQL('0', [], output_field=FloatField()))
+
+
+def fts_is_available(connection, fts_table):
+    key = (connection.alias, connection.settings_dict['NAME'], fts_table)
+    if key not in _fts_available:
+        with connection.cursor() as cursor:
+            _fts_available[key] = fts_table in connection.introspection.table_names(cursor)
+    return _fts_available[key]
+
+
+# ---------------------------------------------------------------------------
+# Индексация
+# ---------------------------------------------------------------------------
+
+def index_objects(model, pairs, using='default'):
+    """Запись пар (pk, документ) в FTS-таблицу SQLite (для PostgreSQL ничего не нужно)"""
+    connection = connections[using]
+    fts_table = FTS_TABLES.get(model)
+    if connection.vendor != 'sqlite' or not fts_table or not fts_is_available(connection, fts_table):
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {fts_table}(rowid, document) VALUES (%s, %s)',
+            list(pairs)
+        )
+
+
+def unindex_objects(model, pks, using='default'):
+    connection = connections[using]
+    fts_table = FTS_TABLES.get(model)
+    if connection.vendor != 'sqlite' or not fts_table or not fts_is_available(connection, fts_table):
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {fts_table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+
+def rebuild_index(model, using='default', batch_size=2000):
+    """Пересчет поисковых документов всех записей модели"""
+    queryset = model.objects.using(using).order_by('pk')
+    if model is Student:
+        queryset = queryset.select_related('user')
+    build = DOCUMENT_BUILDERS[model]
+    
+    total = 0
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        obj.search_document = build(obj)
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            total += _flush(model, batch, using)
+            batch = []
+    if batch:
+        total += _flush(model, batch, using)
+    return total
+
+
+def _flush(model, objs, using):
+    model.objects.using(using).bulk_update(objs, ['search_document'])
+    index_objects(model, ((obj.pk, obj.search_document) for obj in objs), using)
+    return len(objs)
+
+
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Course)
+def update_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'search_document' not in update_fields):
+        return
+    instance.search_document = DOCUMENT_BUILDERS[sender](instance)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Course)
+def index_search_document(sender, instance, raw=False, using='default', update_fields=None, **kwargs):
+    # Частичное сохранение без документа индекс не меняет
+    if update_fields is not None and 'search_document' not in update_fields:
+        return
+    if raw:
+        instance.search_document = DOCUMENT_BUILDERS[sender](instance)
+        sender.objects.using(using).filter(pk=instance.pk).update(search_document=instance.search_document)
+    index_objects(sender, [(instance.pk, instance.search_document)], using)
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Course)
+def unindex_search_document(sender, instance, using='default', **kwargs):
+    unindex_objects(sender, [instance.pk], using)
+
+
+@receiver(post_save, sender=User)
+def update_student_search_document(sender, instance, created, raw=False, using='default', update_fields=None, **kwargs):
+    """Имя и email студента хранятся в User - обновляем документ профиля"""
+    if created or raw:
+        return
+    if update_fields is not None and not {'first_name', 'last_name', 'email'} & set(update_fields):
+        return
+    document = make_document(instance.first_name, instance.last_name, instance.email)
+    changed = Student.objects.using(using).filter(user=instance).exclude(search_document=document)
+    pks = list(changed.values_list('pk', flat=True))
+    if pks:
+        Student.objects.using(using).filter(pk__in=pks).update(search_document=document)
+        index_objects(Student, [(pk, document) for pk in pks], using)
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Course, Enrollment
+
+
+@dataclass
+class EnrollmentResult:
+    """Результат попытки записи на курс"""
+    ENROLLED = 'ENROLLED'
+    FULL = 'FULL'
+    DUPLICATE = 'DUPLICATE'
+    CLOSED = 'CLOSED'
+    
+    status: str
+    enrollment: Optional[Enrollment] = None
+    
+    @property
+    def ok(self):
+        return self.status == self.ENROLLED
+
+
+def enroll_student(student, course):
+    """
+    Запись студента на курс с резервированием места.
+    
+    Место занимается условным UPDATE счетчика курса в той же короткой
+    транзакции, что и вставка записи: строка курса блокируется на время
+    транзакции, поэтому параллельные запросы не могут превысить max_students.
+    Вместе со счетчиком меняется updated_at курса - валидатор условного GET.
+    """
+    try:
+        with transaction.atomic():
+            reserved = Course.objects.filter(
+                pk=course.pk,
+                is_active=True,
+                enrolled_count__lt=F('max_students'),
+            ).update(enrolled_count=F('enrolled_count') + 1, updated_at=timezone.now())
+            
+            if not reserved:
+                if Enrollment.objects.filter(student=student, course=course).exists():
+                    return EnrollmentResult(EnrollmentResult.DUPLICATE)
+                if not Course.objects.filter(pk=course.pk, is_active=True).exists():
+                    return EnrollmentResult(EnrollmentResult.CLOSED)
+                return EnrollmentResult(EnrollmentResult.FULL)
+            
+            enrollment = Enrollment(student=student, course=course, status='ACTIVE')
+            enrollment._seat_reserved = True
+            enrollment.save()
+    except IntegrityError:
+        # Нарушение unique_together: откат транзакции освобождает место
+        return EnrollmentResult(EnrollmentResult.DUPLICATE)
+    
+    return EnrollmentResult(EnrollmentResult.ENROLLED, enrollment)
@@ -0,0 +1,62 @@
+"""
+Хранилища сессий с ленивой записью (SESSION_ENGINE = 'fefu_lab.sessions.<db|cached_db|cache>').
+
+SessionMiddleware сохраняет сессию при любом присваивании, даже того же
+значения; эти хранилища сравнивают данные с загруженными и пропускают
+запись неизменившейся сессии.
+"""
+from django.conf import settings
+from django.core import checks
+
+
+class LazyWriteMixin:
+    """Сохранение сессии только при изменении данных или срока действия"""
+    _loaded_state = None
+
+    def _state(self, data):
+        return self.serializer().dumps(data)
+
+    def _unchanged(self):
+        if settings.SESSION_SAVE_EVERY_REQUEST or self.session_key is None or self._loaded_state is None:
+            return False
+        # Срок действия (set_expiry) хранится в данных сессии
+        return self._state(self._session) == self._loaded_state
+
+    def load(self):
+        data = super().load()
+        self._loaded_state = self._state(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded_state = self._state(data)
+        return data
+
+    def save(self, must_create=False):
+        if not must_create and self._unchanged():
+            return
+        super().save(must_create=must_create)
+        self._loaded_state = self._state(self._session)
+
+    async def asave(self, must_create=False):
+        if not must_create and self._unchanged():
+            return
+        await super().asave(must_create=must_create)
+        self._loaded_state = self._state(self._session)
+
+
+@checks.register(checks.Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """Сессии в локальном кеше процесса: выход в одном воркере не виден другим"""
+    if not settings.SESSION_ENGINE.endswith(('.cache', '.cached_db')):
+        return []
+    alias = settings.SESSION_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache'):
+        return [checks.Warning(
+            f'Сессии ({settings.SESSION_ENGINE}) хранятся в локальном кеше процесса "{alias}"',
+            hint='Выход или смена пароля в одном воркере не завершит сессию в других; '
+                 'используйте общий кеш или SESSION_STORE=db.',
+            id='fefu_lab.W002',
+        )]
+    return []
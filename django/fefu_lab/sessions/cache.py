@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends.cache import SessionStore as BaseSessionStore
+
+from . import LazyWriteMixin
+
+
+class SessionStore(LazyWriteMixin, BaseSessionStore):
+    """Сессии только в кеше с ленивой записью"""
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends.cached_db import SessionStore as BaseSessionStore
+
+from . import LazyWriteMixin
+
+
+class SessionStore(LazyWriteMixin, BaseSessionStore):
+    """Сессии в БД с чтением из кеша и ленивой записью"""
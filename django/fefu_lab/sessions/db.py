@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends.db import SessionStore as BaseSessionStore
+
+from . import LazyWriteMixin
+
+
+class SessionStore(LazyWriteMixin, BaseSessionStore):
+    """Сессии в БД с ленивой записью"""
@@ -0,0 +1,96 @@
+"""
+Сводная статистика сайта для главной страницы и панели администратора.
+
+Все счетчики считаются одним SQL-запросом и кешируются на SITE_STATS_TTL
+секунд. После фиксации изменений моделей меняется версия пространства:
+запись с прежней версией устарела, один воркер пересчитывает ее под
+блокировкой, остальные в это время отдают старое значение. Версия читается
+до подсчета, поэтому пересчет, начатый до фиксации, не выдаст себя за свежий.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import CacheNamespace
+from .models import Student, Course, Instructor, Enrollment
+
+
+STATS = CacheNamespace('fefu_lab:site_stats')
+CACHE_KEY = STATS.make_key('counters')
+LOCK_KEY = 'fefu_lab:site_stats:lock'
+
+# Счетчик -> (модель, только активные)
+COUNTERS = {
+    'active_students': (Student, True),
+    'active_courses': (Course, True),
+    'active_instructors': (Instructor, True),
+    'total_students': (Student, False),
+    'total_courses': (Course, False),
+    'total_enrollments': (Enrollment, False),
+}
+
+
+def compute_site_stats():
+    """Все счетчики одним запросом"""
+    quote = connection.ops.quote_name
+    columns = []
+    for name, (model, active_only) in COUNTERS.items():
+        sql = f'SELECT COUNT(*) FROM {quote(model._meta.db_table)}'
+        if active_only:
+            # Условие без параметра совпадает с условием частичных индексов
+            # (WHERE "is_active"), и планировщик может их использовать
+            sql += f' WHERE {quote("is_active")}'
+        columns.append(f'({sql}) AS {quote(name)}')
+    
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(columns))
+        row = cursor.fetchone()
+    return dict(zip(COUNTERS, row))
+
+
+def get_site_stats():
+    ttl = getattr(settings, 'SITE_STATS_TTL', 60)
+    # Запись (версия, {'data', 'expires'}) и версия - одним обращением к кешу;
+    # устаревшая запись нужна, пока другой воркер ее пересчитывает
+    found = cache.get_many([CACHE_KEY, STATS.version_key])
+    version = found.get(STATS.version_key) or STATS.version()
+    entry = found.get(CACHE_KEY)
+    if entry is not None and entry[0] == version and entry[1]['expires'] > time.time():
+        return entry[1]['data']
+    
+    # Пересчитывает только воркер, захвативший блокировку
+    if cache.add(LOCK_KEY, 1, timeout=getattr(settings, 'SITE_STATS_LOCK_TIMEOUT', 10)):
+        try:
+            data = compute_site_stats()
+            STATS.set('counters', {'data': data, 'expires': time.time() + ttl}, timeout=ttl * 2, version=version)
+            return data
+        finally:
+            cache.delete(LOCK_KEY)
+    
+    if entry is not None:
+        return entry[1]['data']
+    return compute_site_stats()
+
+
+def invalidate_site_stats():
+    """Пометить статистику устаревшей после фиксации транзакции, не удаляя ее из кеша"""
+    transaction.on_commit(STATS.invalidate)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Instructor)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Instructor)
+@receiver(post_delete, sender=Enrollment)
+def site_stats_changed(sender, **kwargs):
+    # Смена статуса записи не влияет на счетчики
+    if sender is Enrollment and not kwargs.get('created', True):
+        return
+    invalidate_site_stats()
@@ -1,3 +1,2006 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, router
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+
+from .models import Student, Instructor, Course, Enrollment
+from .importers import StudentImporter
+from .pagination import KeysetPaginator
+from . import async_views, auth_cache, avatars, caching, db_router, exports, metrics, page_cache, search, services, stats, urls
+
+
+# URLconf для AsyncCatalogTests: каталог на асинхронных представлениях
+urlpatterns = [path('', include((urls.build_urlpatterns(async_views), 'fefu_lab')))]
+
+# Общий кеш на диске переживает запуски тестов: тесты работают с тем же
+# бэкендом, но в своем временном файле
+_cache_dir = tempfile.TemporaryDirectory()
+_test_caches = override_settings(CACHES={
+    'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(_cache_dir.name, 'cache.sqlite3')},
+} if settings.CACHES['default']['BACKEND'].endswith('SQLiteCache') else settings.CACHES)
+
+
+def setUpModule():
+    _test_caches.enable()
+
+
+def tearDownModule():
+    _test_caches.disable()
+    _cache_dir.cleanup()
+
+
+def seed_catalog(courses=300, students=3000, enrollments=20000, instructors=40, seed=2025):
+    """Быстрое заполнение БД реалистичным объемом данных через bulk_create"""
+    rng = random.Random(seed)
+
+    instructor_objs = Instructor.objects.bulk_create([
+        Instructor(
+            first_name=f'Имя{i}',
+            last_name=f'Преподаватель{i}',
+            email=f'instructor{i}@dvfu.ru',
+            specialization='Информатика',
+            degree=rng.choice(Instructor.DEGREE_CHOICES)[0],
+        )
+        for i in range(instructors)
+    ])
+
+    course_objs = Course.objects.bulk_create([
+        Course(
+            title=f'Курс {i}',
+            slug=f'course-{i}',
+            description=f'Описание курса {i} ' * 10,
+            duration=rng.randint(10, 100),
+            instructor=rng.choice(instructor_objs + [None]),
+            level=rng.choice(Course.LEVEL_CHOICES)[0],
+            max_students=100,
+        )
+        for i in range(courses)
+    ])
+
+    users = User.objects.bulk_create([
+        User(
+            username=f'student{i}@students.dvfu.ru',
+            email=f'student{i}@students.dvfu.ru',
+            first_name=f'Студент{i}',
+            last_name=f'Фамилия{i % 997}',
+            password='!',
+        )
+        for i in range(students)
+    ])
+    student_objs = Student.objects.bulk_create([
+        Student(
+            user=user,
+            faculty=rng.choice(Student.FACULTY_CHOICES)[0],
+            birth_date=date(2000 + i % 6, 1 + i % 12, 1 + i % 28),
+        )
+        for i, user in enumerate(users)
+    ])
+
+    pairs = set()
+    while len(pairs) < min(enrollments, courses * 100):
+        pairs.add((rng.randrange(students), rng.randrange(courses)))
+    Enrollment.objects.bulk_create(
+        [
+            Enrollment(
+                student=student_objs[s],
+                course=course_objs[c],
+                status=rng.choice(['ACTIVE', 'ACTIVE', 'ACTIVE', 'COMPLETED', 'CANCELLED']),
+            )
+            for s, c in sorted(pairs)
+        ],
+        batch_size=2000,
+    )
+    # bulk_create не отправляет сигналы - строим поисковый индекс явно
+    search.rebuild_index(Student)
+    search.rebuild_index(Course)
+    return student_objs, course_objs
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    ALLOWED_HOSTS=['testserver'],
+    METRICS_DIR='',
+    METRICS_QUERY_BUDGET=None,
+    METRICS_TIME_BUDGET_MS=None,
+)
+class QueryBudgetTests(TestCase):
+    """
+    Верхняя граница количества SQL-запросов для каждого маршрута fefu_lab.
+
+    Границы не зависят от объема данных и размера страницы: любое
+    превышение означает появление запроса на каждую строку (N+1).
+    """
+
+    # Запросы, которые добавляет аутентифицированная сессия (сессия + пользователь с профилем)
+    AUTH_OVERHEAD = 2
+    # Выгрузки читают данные пачками по exports.CHUNK_SIZE строк
+    STREAMING_VIEWS = {'fefu_lab:export_students', 'fefu_lab:export_courses', 'fefu_lab:export_enrollments'}
+
+    # Страницы с условным GET выполняют еще и запрос валидатора (ETag / Last-Modified)
+    BUDGETS = {
+        'fefu_lab:index': 2,
+        'fefu_lab:about': 0,
+        'fefu_lab:student_list': 3,
+        'fefu_lab:student_detail': 3,
+        'fefu_lab:course_list': 3,
+        'fefu_lab:course_detail': 2,
+        'fefu_lab:enroll_student': 3,
+        'fefu_lab:feedback': 0,
+        'fefu_lab:register': 0,
+        'fefu_lab:login': 0,
+        'fefu_lab:logout': 2,
+        'fefu_lab:profile': 0,
+        'fefu_lab:student_dashboard': 1,
+        'fefu_lab:teacher_dashboard': 1,
+        'fefu_lab:admin_dashboard': 1,
+        'fefu_lab:export_students': 1,
+        'fefu_lab:export_courses': 1,
+        'fefu_lab:export_enrollments': 1,
+        'fefu_lab:metrics': 0,
+        'fefu_lab:health': 1,
+    }
+
+    ROLES = [None, 'STUDENT', 'TEACHER', 'ADMIN']
+
+    @classmethod
+    def setUpTestData(cls):
+        students, courses = seed_catalog()
+        cls.student = students[0]
+        cls.course = max(courses, key=lambda c: c.pk)
+        cls.users = {}
+        for role in cls.ROLES[1:]:
+            user = User.objects.create_user(
+                username=f'{role.lower()}@dvfu.ru',
+                email=f'{role.lower()}@dvfu.ru',
+                password='password123',
+                first_name=role.title(),
+                last_name='Тестовый',
+            )
+            Student.objects.filter(user=user).update(role=role)
+            Enrollment.objects.bulk_create([
+                Enrollment(student=user.student_profile, course=course)
+                for course in courses[:20]
+            ])
+            cls.users[role] = user
+
+    def routes(self):
+        """Все маршруты fefu_lab.urls с аргументами"""
+        return [
+            ('fefu_lab:index', {}, {}),
+            ('fefu_lab:about', {}, {}),
+            ('fefu_lab:student_list', {}, {}),
+            ('fefu_lab:student_list', {}, {'page': 150}),
+            ('fefu_lab:student_list', {}, {'search': 'Фамилия1', 'faculty': 'CS'}),
+            ('fefu_lab:student_list', {}, {'cursor': ''}),
+            ('fefu_lab:student_detail', {'student_id': self.student.pk}, {}),
+            ('fefu_lab:course_list', {}, {}),
+            ('fefu_lab:course_list', {}, {'page': 30}),
+            ('fefu_lab:course_list', {}, {'search': 'Курс 1', 'level': 'ADVANCED'}),
+            ('fefu_lab:course_list', {}, {'cursor': ''}),
+            ('fefu_lab:course_detail', {'course_slug': self.course.slug}, {}),
+            ('fefu_lab:enroll_student', {'course_slug': self.course.slug}, {}),
+            ('fefu_lab:feedback', {}, {}),
+            ('fefu_lab:register', {}, {}),
+            ('fefu_lab:login', {}, {}),
+            ('fefu_lab:logout', {}, {}),
+            ('fefu_lab:profile', {}, {}),
+            ('fefu_lab:student_dashboard', {}, {}),
+            ('fefu_lab:teacher_dashboard', {}, {}),
+            ('fefu_lab:admin_dashboard', {}, {}),
+            ('fefu_lab:export_students', {}, {'search': 'Фамилия1'}),
+            ('fefu_lab:export_courses', {}, {'level': 'ADVANCED', 'format': 'jsonl'}),
+            ('fefu_lab:export_enrollments', {}, {'status': 'ACTIVE'}),
+            ('fefu_lab:metrics', {}, {}),
+            ('fefu_lab:health', {}, {}),
+        ]
+
+    def assertQueryBudget(self, name, url, budget, captured):
+        queries = captured.captured_queries
+        if len(queries) > budget:
+            sql = '\n'.join(f'{i}. {q["sql"]}' for i, q in enumerate(queries, start=1))
+            self.fail(f'{name} ({url}): {len(queries)} SQL-запросов при бюджете {budget}\n{sql}')
+
+    def test_every_route_stays_within_query_budget(self):
+        for role in self.ROLES:
+            for name, kwargs, params in self.routes():
+                with self.subTest(role=role or 'anonymous', route=name, params=params):
+                    if role:
+                        self.client.force_login(self.users[role])
+                    else:
+                        self.client.logout()
+
+                    url = reverse(name, kwargs=kwargs)
+                    budget = self.BUDGETS[name] + (self.AUTH_OVERHEAD if role else 0)
+                    if name in self.STREAMING_VIEWS and role == 'ADMIN':
+                        budget += Enrollment.objects.count() // exports.CHUNK_SIZE
+                    with CaptureQueriesContext(connection) as captured:
+                        response = self.client.get(url, params)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+
+                    self.assertLess(response.status_code, 500)
+                    self.assertQueryBudget(name, url, budget, captured)
+
+    def test_every_route_is_covered(self):
+        from . import urls
+        covered = {name for name, _, _ in self.routes()}
+        declared = {f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns}
+        self.assertEqual(declared - covered, set())
+        self.assertEqual(set(self.BUDGETS), declared)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], METRICS_DIR='', PAGE_CACHE=False, CONDITIONAL_GET=False,
+                   METRICS_QUERY_BUDGET=None, METRICS_TIME_BUDGET_MS=None)
+class RequestMetricsTests(TestCase):
+    """Замер запросов к БД и времени ответа, сбор метрик воркеров и доступ к /metrics/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Course.objects.create(title='Python', slug='python', description='Основы', duration=36)
+
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_response_headers_report_queries_and_timing(self):
+        url = reverse('fefu_lab:course_list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response['X-DB-Queries'], str(len(ctx.captured_queries)))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+, tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+        data = metrics.registry.snapshot()['fefu_lab:course_list']
+        self.assertEqual((data['count'], data['queries_sum']), (1, len(ctx.captured_queries)))
+        self.assertGreater(data['template_sum'], 0)
+        with self.settings(METRICS_RESPONSE_HEADERS=False):
+            self.assertNotIn('X-DB-Queries', self.client.get(url))
+
+    def test_budget_overrun_is_logged_with_sql(self):
+        with self.settings(METRICS_QUERY_BUDGET=0), self.assertLogs('fefu_lab.metrics', 'WARNING') as logs:
+            self.client.get(reverse('fefu_lab:course_list'))
+        self.assertIn('fefu_lab:course_list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        with self.settings(METRICS_QUERY_BUDGET=100), self.assertNoLogs('fefu_lab.metrics', 'WARNING'):
+            self.client.get(reverse('fefu_lab:course_list'))
+
+    def test_snapshots_of_live_workers_are_merged(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        metrics.registry.observe('fefu_lab:index', 12.0, 3.0, 4.0, 2)
+        other = metrics._ViewMetrics(10)
+        other.observe(700.0, 5.0, 1.0, 30)
+        for name, updated in (('worker-1.json', time.time()), ('worker-2.json', time.time() - 7200)):
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as fh:
+                json.dump({'pid': 1, 'updated': updated, 'views': {'fefu_lab:index': other.to_dict()}}, fh)
+
+        with self.settings(METRICS_DIR=directory, METRICS_WORKER_TTL=3600):
+            merged = metrics.merge_snapshots(metrics.collect_snapshots())
+        # Файл давно не обновлявшегося воркера не учитывается
+        data = merged['fefu_lab:index']
+        self.assertEqual((data['count'], data['queries_sum'], sorted(data['recent'])), (2, 32, [12.0, 700.0]))
+        output = metrics.render_prometheus(merged)
+        self.assertIn('fefu_request_duration_ms_bucket{view="fefu_lab:index",le="25"} 1', output)
+        self.assertIn('fefu_request_duration_ms_bucket{view="fefu_lab:index",le="+Inf"} 2', output)
+        self.assertIn('fefu_request_db_queries_sum{view="fefu_lab:index"} 32.000', output)
+
+    def test_scrape_reads_worker_files_once(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with self.settings(METRICS_DIR=directory), \
+                mock.patch.object(metrics, 'collect_worker_files', wraps=metrics.collect_worker_files) as collect:
+            response = self.client.get(reverse('fefu_lab:metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        collect.assert_called_once_with()
+
+    def test_metrics_access_control(self):
+        url = reverse('fefu_lab:metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+        response = self.client.get(url, REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '# TYPE fefu_request_duration_ms histogram')
+        # Сам эндпоинт метрик не учитывается
+        self.assertNotIn('fefu_lab:metrics', metrics.registry.snapshot())
+
+        # За nginx все запросы приходят с 127.0.0.1: важен адрес из заголовка прокси
+        with self.settings(LOGIN_THROTTLE_IP_HEADER='HTTP_X_REAL_IP'):
+            self.assertEqual(
+                self.client.get(url, REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='203.0.113.5').status_code, 403
+            )
+            health = self.client.get(reverse('fefu_lab:health'), REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='203.0.113.5')
+            self.assertEqual(health.json(), {'status': 'ok'})
+
+        self.client.force_login(User.objects.create_superuser('root', 'root@dvfu.ru', 'x'))
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+
+class EnrollmentCounterTests(TestCase):
+    """Счетчик активных записей курса при любом способе изменения записей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.python = Course.objects.create(title='Python', slug='python', description='-', duration=36)
+        cls.web = Course.objects.create(title='Web', slug='web', description='-', duration=36)
+        cls.students = [
+            User.objects.create_user(username=f's{i}@dvfu.ru', email=f's{i}@dvfu.ru', password='x').student_profile
+            for i in range(3)
+        ]
+
+    def counts(self):
+        return tuple(Course.objects.filter(pk=course.pk).values_list('enrolled_count', flat=True).get()
+                     for course in (self.python, self.web))
+
+    def test_status_and_course_changes_on_save(self):
+        enrollment = Enrollment.objects.create(student=self.students[0], course=self.python)
+        self.assertEqual(self.counts(), (1, 0))
+        for status, expected in (('CANCELLED', (0, 0)), ('ACTIVE', (1, 0)), ('COMPLETED', (0, 0)), ('ACTIVE', (1, 0))):
+            enrollment.status = status
+            enrollment.save()
+            self.assertEqual(self.counts(), expected, status)
+
+        # Повторная загрузка из БД: исходное состояние берется из from_db
+        enrollment = Enrollment.objects.get(pk=enrollment.pk)
+        enrollment.course = self.web
+        enrollment.save()
+        self.assertEqual(self.counts(), (0, 1))
+        enrollment.save(update_fields=['enrolled_at'])
+        self.assertEqual(self.counts(), (0, 1))
+        enrollment.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+        Enrollment.objects.create(student=self.students[0], course=self.python, status='CANCELLED')
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_queryset_update(self):
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.python)
+        Enrollment.objects.filter(student=self.students[0]).update(status='CANCELLED')
+        self.assertEqual(self.counts(), (2, 0))
+        Enrollment.objects.filter(student=self.students[1]).update(course=self.web)
+        self.assertEqual(self.counts(), (1, 1))
+        Enrollment.objects.filter(student=self.students[0]).update(status='ACTIVE')
+        self.assertEqual(self.counts(), (2, 1))
+        # Обновление прочих полей счетчики не пересчитывает
+        with self.assertNumQueries(1):
+            Enrollment.objects.update(enrolled_at=timezone.now())
+
+    def test_bulk_create_and_bulk_update(self):
+        created = Enrollment.objects.bulk_create([
+            Enrollment(student=self.students[0], course=self.python),
+            Enrollment(student=self.students[1], course=self.python, status='CANCELLED'),
+            Enrollment(student=self.students[2], course=self.web),
+        ])
+        self.assertEqual(self.counts(), (1, 1))
+
+        created = list(Enrollment.objects.filter(pk__in=[e.pk for e in created]).order_by('student_id'))
+        created[0].status = 'CANCELLED'
+        created[1].status = 'ACTIVE'
+        created[2].course = self.python
+        Enrollment.objects.bulk_update(created, ['status', 'course'])
+        self.assertEqual(self.counts(), (2, 0))
+
+        # Счетчики выставляет вызывающий код
+        Enrollment.objects.bulk_create(
+            [Enrollment(student=self.students[0], course=self.web)], update_counters=False
+        )
+        self.assertEqual(self.counts(), (2, 0))
+
+    def test_course_save_keeps_counter_and_save_semantics(self):
+        loaded = Course.objects.get(pk=self.python.pk)
+        Enrollment.objects.create(student=self.students[0], course=self.python)
+        # Устаревший экземпляр из БД не затирает счетчик
+        loaded.title = 'Python 3'
+        loaded.save()
+        self.assertEqual(self.counts(), (1, 0))
+        # Отложенные поля не загружаются и не записываются
+        course = Course.objects.only('pk', 'title', 'slug').get(pk=self.web.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            course.save()
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['UPDATE'])
+
+        # Удаленный курс вставляется заново: новый экземпляр и force_insert
+        course = Course.objects.create(title='Go', slug='go', description='-', duration=10)
+        Course.objects.filter(pk=course.pk).delete()
+        course.save()
+        self.assertTrue(Course.objects.filter(pk=course.pk).exists())
+        loaded = Course.objects.get(pk=course.pk)
+        Course.objects.filter(pk=course.pk).delete()
+        loaded.save(force_insert=True)
+        self.assertTrue(Course.objects.filter(pk=course.pk).exists())
+
+    def test_recount_repairs_counters(self):
+        Enrollment.objects.create(student=self.students[0], course=self.python)
+        Enrollment.objects.create(student=self.students[1], course=self.web, status='COMPLETED')
+        Course.objects.filter(pk__in=[self.python.pk, self.web.pk]).update(enrolled_count=7)
+        self.assertEqual(Course.recount_enrollments([self.python.pk]), 1)
+        self.assertEqual(self.counts(), (1, 7))
+        Course.recount_enrollments()
+        self.assertEqual(self.counts(), (1, 0))
+
+
+class EnrollmentServiceTests(TestCase):
+    """Запись на курс через services.enroll_student"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(title='Python', slug='python', description='-', duration=36, max_students=3)
+        cls.students = [
+            User.objects.create_user(username=f's{i}@dvfu.ru', email=f's{i}@dvfu.ru', password='x').student_profile
+            for i in range(5)
+        ]
+
+    def enroll(self, student):
+        return services.enroll_student(student, self.course).status
+
+    def enrolled_count(self):
+        return Course.objects.filter(pk=self.course.pk).values_list('enrolled_count', flat=True).get()
+
+    def test_full_course_is_not_overbooked(self):
+        results = [self.enroll(student) for student in self.students]
+        Result = services.EnrollmentResult
+        self.assertEqual(results, [Result.ENROLLED] * 3 + [Result.FULL] * 2)
+        self.assertEqual(self.enrolled_count(), 3)
+        self.assertEqual(Enrollment.objects.filter(course=self.course, status='ACTIVE').count(), 3)
+
+    def test_enrolled_result_carries_enrollment(self):
+        result = services.enroll_student(self.students[0], self.course)
+        self.assertTrue(result.ok)
+        self.assertEqual((result.enrollment.student, result.enrollment.status), (self.students[0], 'ACTIVE'))
+
+    def test_duplicate(self):
+        self.enroll(self.students[0])
+        # Место свободно: резервирование проходит, вставка нарушает unique_together и откатывается
+        self.assertEqual(self.enroll(self.students[0]), services.EnrollmentResult.DUPLICATE)
+        self.assertEqual(self.enrolled_count(), 1)
+        # Курс заполнен: дубликат определяется без вставки
+        for student in self.students[1:3]:
+            self.enroll(student)
+        self.assertEqual(self.enroll(self.students[0]), services.EnrollmentResult.DUPLICATE)
+        self.assertEqual(self.enrolled_count(), 3)
+
+    def test_closed(self):
+        Course.objects.filter(pk=self.course.pk).update(is_active=False)
+        self.assertEqual(self.enroll(self.students[0]), services.EnrollmentResult.CLOSED)
+        self.assertEqual(self.enrolled_count(), 0)
+        self.assertFalse(Enrollment.objects.exists())
+
+
+class EnrollmentConcurrencyTests(TransactionTestCase):
+    """Параллельная запись на курс (enrollment_load_test): без превышения лимита мест"""
+
+    def test_parallel_enrollments_respect_seat_limit(self):
+        out = io.StringIO()
+        call_command(
+            'enrollment_load_test', '--workers=8', '--students=30', '--seats=5', '--duplicates=2', '--keep',
+            stdout=out,
+        )
+        course = Course.objects.get(slug__startswith='load-test-')
+        self.assertLessEqual(course.enrolled_count, course.max_students)
+        self.assertEqual(course.enrolled_count, Enrollment.objects.count())
+        self.assertEqual(Enrollment.objects.exclude(status='ACTIVE').count(), 0)
+        self.assertIn('Лимит мест соблюден', out.getvalue())
+
+
+class SiteStatsTests(TestCase):
+    """Кеш сводной статистики"""
+
+    def setUp(self):
+        cache.delete(stats.CACHE_KEY)
+        seed_catalog(courses=5, students=20, enrollments=30, instructors=2)
+
+    def test_counters_computed_in_one_query_and_cached(self):
+        with self.assertNumQueries(1):
+            data = stats.get_site_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.get_site_stats(), data)
+
+        self.assertEqual(data['total_courses'], 5)
+        self.assertEqual(data['active_students'], 20)
+        self.assertEqual(data['active_instructors'], 2)
+        self.assertEqual(data['total_enrollments'], 30)
+
+    def test_model_change_invalidates_counters_after_commit(self):
+        stats.get_site_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Новый курс', description='...', duration=1)
+            self.assertEqual(stats.get_site_stats()['total_courses'], 5)
+        self.assertEqual(stats.get_site_stats()['total_courses'], 6)
+
+    def test_recount_racing_with_invalidation_is_not_cached_as_fresh(self):
+        compute = stats.compute_site_stats
+
+        def racing_compute():
+            # Счетчики прочитаны, затем другой запрос фиксирует изменение
+            data = compute()
+            with self.captureOnCommitCallbacks(execute=True):
+                Course.objects.create(title='Новый курс', description='...', duration=1)
+            return data
+
+        with mock.patch.object(stats, 'compute_site_stats', racing_compute):
+            self.assertEqual(stats.get_site_stats()['total_courses'], 5)
+        self.assertEqual(stats.get_site_stats()['total_courses'], 6)
+
+    def test_stale_value_served_while_another_worker_recomputes(self):
+        stats.get_site_stats()
+        stats.STATS.invalidate()
+        cache.add(stats.LOCK_KEY, 1)
+        try:
+            with self.assertNumQueries(0):
+                self.assertEqual(stats.get_site_stats()['total_courses'], 5)
+        finally:
+            cache.delete(stats.LOCK_KEY)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация списков"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(courses=47, students=95, enrollments=0, instructors=3)
+        # Одинаковые значения сортировки, различающиеся только pk
+        Course.objects.filter(pk__lte=10).update(created_at=Course.objects.first().created_at)
+
+    def walk(self, queryset, ordering, per_page):
+        paginator = KeysetPaginator(queryset, ordering, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_forward_and_backward_match_offset_ordering(self):
+        for queryset, ordering in (
+            (Student.objects.select_related('user'), ('user__last_name', 'user__first_name', 'pk')),
+            (Course.objects.all(), ('-created_at', 'pk')),
+        ):
+            with self.subTest(ordering=ordering):
+                expected = list(queryset.order_by(*ordering).values_list('pk', flat=True))
+                paginator, pages = self.walk(queryset, ordering, 10)
+                self.assertEqual([obj.pk for page in pages for obj in page], expected)
+
+                backwards = [pages[-1]]
+                while backwards[-1].has_previous():
+                    backwards.append(paginator.get_page(backwards[-1].previous_cursor))
+                self.assertEqual(
+                    [[obj.pk for obj in page] for page in reversed(backwards)],
+                    [[obj.pk for obj in page] for page in pages],
+                )
+
+    def test_page_query_count_does_not_depend_on_depth(self):
+        paginator, pages = self.walk(Student.objects.select_related('user'), ('user__last_name', 'user__first_name', 'pk'), 10)
+        with self.assertNumQueries(1):
+            list(paginator.get_page(pages[-1].previous_cursor))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Course.objects.all(), ('-created_at', 'pk'), 5)
+        first = [obj.pk for obj in paginator.get_page()]
+        self.assertEqual([obj.pk for obj in paginator.get_page('garbage')], first)
+
+    def test_list_view_renders_cursor_links(self):
+        response = self.client.get(reverse('fefu_lab:course_list'), {'cursor': '', 'level': 'BEGINNER'})
+        self.assertContains(response, 'cursor=')
+        self.assertContains(response, 'level=BEGINNER')
+        self.assertIsNotNone(response.context['page_obj'].next_cursor)
+
+    @override_settings(KEYSET_PAGINATION=True)
+    def test_search_results_keep_relevance_order(self):
+        # Разная длина документов - разный ранг
+        for course in Course.objects.filter(pk__in=range(5, 40, 3)):
+            course.description += ' курс' * (course.pk % 4)
+            course.save()
+        expected = list(
+            search.search(Course.objects.filter(is_active=True), 'курс')
+            .order_by('-search_rank', '-created_at', 'pk').values_list('pk', flat=True)
+        )
+        pages, params = [], {'search': 'курс'}
+        while True:
+            page_obj = self.client.get(reverse('fefu_lab:course_list'), params).context['page_obj']
+            pages.append([course.pk for course in page_obj])
+            if not page_obj.has_next():
+                break
+            params['cursor'] = page_obj.next_cursor
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertGreater(len(pages), 1)
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск студентов и курсов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.yozh = Course.objects.create(
+            title='Ёжики в тумане',
+            slug='hedgehogs',
+            description='Курс о навигации в условиях ограниченной видимости',
+            duration=10,
+        )
+        cls.python = Course.objects.create(
+            title='Основы Python',
+            slug='python-basics',
+            description='Программирование на Python: синтаксис и структуры данных. Python для начинающих.',
+            duration=36,
+        )
+        cls.django = Course.objects.create(
+            title='Django для начинающих',
+            slug='django-beginners',
+            description='Веб-разработка на Python',
+            duration=50,
+        )
+        cls.user = User.objects.create_user(
+            username='anna@students.dvfu.ru',
+            email='anna@students.dvfu.ru',
+            first_name='Анна',
+            last_name='Фёдорова',
+        )
+
+    def found(self, queryset, query):
+        return list(search.search(queryset, query).order_by('-search_rank', 'pk'))
+
+    def test_normalization_folds_case_and_yo(self):
+        self.assertEqual(search.tokenize('ЁЖИКИ, Фёдорова!'), ['ежики', 'федорова'])
+        self.assertEqual(self.found(Course.objects.all(), 'ежик'), [self.yozh])
+        self.assertEqual(self.found(Course.objects.all(), 'ЁЖИК'), [self.yozh])
+
+    def test_prefix_match_of_every_word(self):
+        self.assertEqual(self.found(Course.objects.all(), 'нач djan'), [self.django])
+        self.assertEqual(self.found(Course.objects.all(), 'нач rust'), [])
+
+    def test_more_relevant_course_ranks_first(self):
+        self.assertEqual(self.found(Course.objects.all(), 'python')[0], self.python)
+
+    def test_student_document_follows_user_changes(self):
+        students = Student.objects.all()
+        self.assertEqual(self.found(students, 'федоров'), [self.user.student_profile])
+
+        self.user.last_name = 'Смирнова'
+        self.user.save()
+        self.assertEqual(self.found(students, 'федоров'), [])
+        self.assertEqual(self.found(students, 'смирн anna'), [self.user.student_profile])
+
+    def test_deleted_course_disappears_from_index(self):
+        self.yozh.delete()
+        self.assertEqual(self.found(Course.objects.all(), 'ежик'), [])
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_list_views_use_index(self):
+        response = self.client.get(reverse('fefu_lab:course_list'), {'search': 'ЁЖИК'})
+        self.assertEqual(list(response.context['page_obj']), [self.yozh])
+        response = self.client.get(reverse('fefu_lab:student_list'), {'search': 'фёдор'})
+        self.assertEqual(list(response.context['page_obj']), [self.user.student_profile])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ExportTests(TestCase):
+    """Потоковая выгрузка данных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(courses=12, students=30, enrollments=100, instructors=2)
+        cls.admin = User.objects.create_user(username='admin@dvfu.ru', email='admin@dvfu.ru', password='x')
+        cls.admin.student_profile.role = 'ADMIN'
+        cls.admin.student_profile.save()
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_exports_require_admin_role(self):
+        self.assertEqual(self.client.get(reverse('fefu_lab:export_students')).status_code, 302)
+        student = Student.objects.exclude(user=self.admin).first().user
+        self.client.force_login(student)
+        self.assertRedirects(self.client.get(reverse('fefu_lab:export_courses')), reverse('fefu_lab:index'))
+
+    def test_csv_export_applies_list_filters(self):
+        self.client.force_login(self.admin)
+        body = self.export('fefu_lab:export_students', faculty='CS')
+        header, *rows = body.lstrip('\ufeff').splitlines()
+        self.assertTrue(header.startswith('id,last_name,first_name,email'))
+        self.assertEqual(len(rows), Student.objects.filter(faculty='CS', is_active=True).count())
+
+    def test_csv_cells_that_look_like_formulas_are_escaped(self):
+        student = Student.objects.exclude(user=self.admin).first()
+        User.objects.filter(pk=student.user_id).update(first_name='=HYPERLINK("http://x")', last_name='@SUM(A1)')
+        Student.objects.filter(pk=student.pk).update(phone='+79140000000')
+        self.client.force_login(self.admin)
+        rows = list(csv.DictReader(io.StringIO(self.export('fefu_lab:export_students').lstrip('\ufeff'))))
+        row = next(row for row in rows if row['id'] == str(student.pk))
+        self.assertEqual(
+            (row['first_name'], row['last_name'], row['phone']),
+            ('\'=HYPERLINK("http://x")', "'@SUM(A1)", "'+79140000000"),
+        )
+        # JSON Lines не открывается в Excel - значения без изменений
+        body = self.export('fefu_lab:export_students', format='jsonl')
+        self.assertIn('"first_name": "=HYPERLINK(\\"http://x\\")"', body)
+
+    def test_jsonl_export_of_enrollments(self):
+        self.client.force_login(self.admin)
+        body = self.export('fefu_lab:export_enrollments', format='jsonl', status='ACTIVE')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), Enrollment.objects.filter(status='ACTIVE').count())
+        self.assertEqual({row['status'] for row in rows}, {'ACTIVE'})
+        self.assertIn('@', rows[0]['student_email'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StudentImportTests(TestCase):
+    """Массовый импорт студентов из CSV"""
+
+    HEADER = 'email,first_name,last_name,faculty,role,birth_date,password,courses\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.python = Course.objects.create(
+            title='Python', slug='python', description='...', duration=10, max_students=2
+        )
+        cls.web = Course.objects.create(
+            title='Web', slug='web', description='...', duration=10, max_students=30
+        )
+        User.objects.create_user(username='taken@dvfu.ru', email='Taken@dvfu.ru', password='x')
+        # Логин совпадает с email из файла, email другой
+        User.objects.create_user(username='login@dvfu.ru', email='someone@dvfu.ru', password='x')
+
+    def run_import(self, body, **kwargs):
+        return StudentImporter(hash_workers=1).run(io.StringIO(self.HEADER + body), **kwargs)
+
+    def test_valid_rows_are_imported_and_errors_reported_per_row(self):
+        report = self.run_import(
+            'anna@dvfu.ru,Анна,Иванова,CS,,2003-05-01,secret,python;web\n'
+            'ivan@dvfu.ru,Иван,Петров,SE,teacher,,,web\n'
+            'ANNA@dvfu.ru,Анна,Дубль,CS,,,,\n'
+            'taken@dvfu.ru,Занят,Занятый,CS,,,,\n'
+            'bad-email,Нет,Почты,CS,,,,\n'
+            'oleg@dvfu.ru,Олег,Сидоров,XX,,31.12.2000,,\n'
+            'petr@dvfu.ru,Петр,Орлов,CS,,,,missing\n'
+            'olga@dvfu.ru,Ольга,Козлова,CS,,,,python\n'
+            'maria@dvfu.ru,Мария,Новикова,CS,,,,python\n'
+            'login@dvfu.ru,Логин,Занят,CS,,,,\n'
+        )
+        self.assertEqual(report.rows, 10)
+        self.assertEqual(sorted(report.errors), [4, 5, 6, 7, 8, 10, 11])
+        self.assertEqual(len(report.errors[7]), 2)
+        self.assertEqual(report.created_users, 3)
+        self.assertEqual(report.created_enrollments, 4)
+
+        anna = Student.objects.get(user__email='anna@dvfu.ru')
+        self.assertTrue(anna.user.check_password('secret'))
+        self.assertEqual(anna.birth_date, date(2003, 5, 1))
+        ivan = Student.objects.get(user__email='ivan@dvfu.ru')
+        self.assertEqual((ivan.faculty, ivan.role), ('SE', 'TEACHER'))
+        self.assertFalse(ivan.user.has_usable_password())
+        self.assertEqual([email for email, _, _ in report.reset_links], ['ivan@dvfu.ru', 'olga@dvfu.ru'])
+
+        self.python.refresh_from_db()
+        self.web.refresh_from_db()
+        self.assertEqual((self.python.enrolled_count, self.web.enrolled_count), (2, 2))
+        self.assertEqual(list(search.search(Student.objects.all(), 'козлова')), [Student.objects.get(user__email='olga@dvfu.ru')])
+
+    def test_validation_queries_do_not_depend_on_row_count(self):
+        def queries(rows):
+            body = ''.join(f'user{i}@dvfu.ru,Имя,Фамилия,CS,,,,web\n' for i in range(rows))
+            with CaptureQueriesContext(connection) as ctx:
+                report = self.run_import(body, dry_run=True)
+            self.assertEqual(report.errors, {})
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(5), queries(25))
+        self.assertFalse(User.objects.filter(email='user0@dvfu.ru').exists())
+
+    def test_seats_taken_during_import_are_not_overbooked(self):
+        from . import importers
+
+        other = User.objects.create_user(username='other@dvfu.ru', email='other@dvfu.ru').student_profile
+        hash_passwords = importers._hash_passwords
+
+        def enroll_meanwhile(*args):
+            # Пока хешируются пароли, место на курсе занимает другой студент
+            services.enroll_student(other, self.python)
+            return hash_passwords(*args)
+
+        with mock.patch.object(importers, '_hash_passwords', enroll_meanwhile):
+            report = self.run_import(
+                'anna@dvfu.ru,Анна,Иванова,CS,,,secret,python\n'
+                'ivan@dvfu.ru,Иван,Петров,CS,,,secret,python;web\n'
+            )
+        self.assertEqual(list(report.errors), [3])
+        self.assertEqual((report.created_users, report.created_enrollments), (1, 1))
+        self.assertFalse(User.objects.filter(email='ivan@dvfu.ru').exists())
+        self.python.refresh_from_db()
+        self.assertEqual(self.python.enrolled_count, 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.python, status='ACTIVE').count(), 2)
+
+    def test_admin_upload_in_other_encoding_is_form_error(self):
+        admin_user = User.objects.create_superuser('root', 'root@dvfu.ru', 'x')
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile(
+            'students.csv', (self.HEADER + 'new@dvfu.ru,Новый,Студент,CS,,,,web\n').encode('cp1251')
+        )
+        response = self.client.post(reverse('admin:fefu_lab_student_import_csv'), {'csv_file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('UTF-8', response.context['form'].errors['csv_file'][0])
+        self.assertFalse(User.objects.filter(email='new@dvfu.ru').exists())
+
+    @override_settings(STUDENT_IMPORT_ADMIN_MAX_PASSWORDS=2)
+    def test_admin_upload_limits_passwords_hashed_in_request(self):
+        admin_user = User.objects.create_superuser('root', 'root@dvfu.ru', 'x')
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile('students.csv', (self.HEADER + ''.join(
+            f'new{i}@dvfu.ru,Новый,Студент,CS,,,secret,web\n' for i in range(3)
+        )).encode('utf-8'))
+        with mock.patch('fefu_lab.importers.make_password') as make_password:
+            response = self.client.post(reverse('admin:fefu_lab_student_import_csv'), {'csv_file': upload})
+        make_password.assert_not_called()
+        self.assertEqual(list(response.context['report'].errors), [1])
+        self.assertContains(response, 'import_students')
+        self.assertFalse(User.objects.filter(email='new0@dvfu.ru').exists())
+
+    def test_admin_upload_requires_passwords(self):
+        admin_user = User.objects.create_superuser('root', 'root@dvfu.ru', 'x')
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile('students.csv', (
+            self.HEADER + 'new@dvfu.ru,Новый,Студент,CS,,,secret,web\nnopass@dvfu.ru,Без,Пароля,CS,,,,web\n'
+        ).encode('utf-8'))
+        response = self.client.post(reverse('admin:fefu_lab_student_import_csv'), {'csv_file': upload})
+        self.assertEqual(response.context['report'].errors, {3: ['Пароль обязателен']})
+        self.assertFalse(User.objects.filter(email='nopass@dvfu.ru').exists())
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser('root', 'root@dvfu.ru', 'x')
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile(
+            'students.csv', (self.HEADER + ''.join(
+                f'new{i}@dvfu.ru,Новый,Студент,CS,,,secret,web\n' for i in range(3)
+            )).encode('utf-8-sig')
+        )
+        # Пароли хешируются в процессе воркера, без пула процессов
+        with mock.patch('fefu_lab.importers.ProcessPoolExecutor') as pool:
+            response = self.client.post(reverse('admin:fefu_lab_student_import_csv'), {'csv_file': upload})
+        pool.assert_not_called()
+        self.assertRedirects(response, reverse('admin:fefu_lab_student_changelist'))
+        self.assertTrue(Enrollment.objects.filter(student__user__email='new0@dvfu.ru', course=self.web).exists())
+        self.assertTrue(User.objects.get(email='new2@dvfu.ru').check_password('secret'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedDataTests(TestCase):
+    """Генерация тестовых данных командой seed_data"""
+
+    def seed(self, *args):
+        call_command('seed_data', '--instructors=3', '--courses=12', *args, stdout=io.StringIO())
+
+    def snapshot(self):
+        return (
+            list(User.objects.filter(student_profile__isnull=False).order_by('username')
+                 .values_list('username', 'first_name', 'last_name')),
+            list(Course.objects.order_by('slug').values_list('slug', 'max_students', 'enrolled_count')),
+            sorted(Enrollment.objects.values_list('student__user__username', 'course__slug', 'status')),
+        )
+
+    def test_same_seed_gives_same_data(self):
+        self.seed('--students=30', '--enrollments=90', '--seed=7')
+        first = self.snapshot()
+        self.assertEqual([len(part) for part in first], [30, 12, 90])
+        self.seed('--students=30', '--enrollments=90', '--seed=7')
+        self.assertEqual(self.snapshot(), first)
+        self.seed('--students=30', '--enrollments=90', '--seed=8')
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_counters_and_search_index_are_consistent(self):
+        self.seed('--students=40', '--enrollments=300', '--batch-size=50')
+        counters = dict(Course.objects.values_list('pk', 'enrolled_count'))
+        Course.recount_enrollments()
+        self.assertEqual(dict(Course.objects.values_list('pk', 'enrolled_count')), counters)
+        self.assertFalse(Course.objects.filter(enrolled_count__gt=F('max_students')).exists())
+
+        student = Student.objects.select_related('user').first()
+        self.assertIn(student, search.search(Student.objects.all(), student.user.last_name))
+        self.assertIn(Course.objects.get(slug='python-basics-1'), search.search(Course.objects.all(), 'python'))
+
+    def test_password_is_hashed_once(self):
+        from .management.commands import seed_data
+
+        with mock.patch.object(seed_data, 'make_password', wraps=seed_data.make_password) as make_password:
+            self.seed('--students=20', '--enrollments=40', '--password=secret')
+        make_password.assert_called_once_with('secret')
+        user = User.objects.get(username=f'student7@{seed_data.STUDENT_EMAIL_DOMAIN}')
+        self.assertTrue(user.check_password('secret'))
+
+    def test_queries_do_not_depend_on_row_count(self):
+        def queries(students):
+            with CaptureQueriesContext(connection) as ctx:
+                self.seed(f'--students={students}', f'--enrollments={students * 3}')
+            return len(ctx.captured_queries)
+
+        queries(10)
+        self.assertEqual(queries(10), queries(60))
+
+
+class StreamLoaddataTests(TestCase):
+    """Потоковая загрузка фикстуры командой stream_loaddata"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(courses=5, students=12, enrollments=30, instructors=2)
+        # Даты из фикстуры сохраняются (dumpdata округляет до миллисекунд)
+        created = timezone.now().replace(microsecond=0) - timedelta(days=30)
+        User.objects.update(date_joined=created)
+        Student.objects.update(created_at=created)
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.fixture = os.path.join(directory, 'data.json')
+        call_command('dumpdata', 'auth.user', 'fefu_lab', output=self.fixture, verbosity=0)
+        self.expected = self.snapshot()
+        with open(self.fixture, encoding='utf-8') as fh:
+            data = json.load(fh)
+        self.total = len(data)
+        # Счетчикам из фикстуры не доверяем: после загрузки они пересчитываются
+        for obj in data:
+            if obj['model'] == 'fefu_lab.course':
+                obj['fields']['enrolled_count'] = 99
+        with open(self.fixture, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh)
+        Enrollment.objects.all().delete()
+        Course.objects.all().delete()
+        Instructor.objects.all().delete()
+        User.objects.all().delete()
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('pk').values_list('pk', 'username', 'date_joined')),
+            list(Student.objects.order_by('pk').values_list('pk', 'user_id', 'faculty', 'created_at')),
+            list(Course.objects.order_by('pk').values_list('pk', 'slug', 'instructor_id', 'enrolled_count')),
+            list(Enrollment.objects.order_by('pk').values_list('pk', 'student_id', 'course_id', 'status')),
+        )
+
+    def load(self, *args):
+        call_command('stream_loaddata', self.fixture, '--batch-size=4', *args, stdout=io.StringIO())
+
+    def found(self, model, query):
+        return list(search.search(model.objects.all(), query))
+
+    def test_fixture_is_loaded_with_derived_data(self):
+        self.load()
+        self.assertEqual(self.snapshot(), self.expected)
+        self.assertEqual(self.found(Student, 'фамилия3'), [Student.objects.get(user__last_name='Фамилия3')])
+        self.assertEqual(len(self.found(Course, 'курс')), 5)
+        self.assertFalse(os.path.exists(f'{self.fixture}.progress.json'))
+
+        # Последовательности первичных ключей продолжаются после загруженных
+        course = Course.objects.create(title='Новый', slug='new', description='-', duration=1)
+        self.assertGreater(course.pk, max(pk for pk, *_ in self.expected[2]))
+
+    def test_dry_run_writes_nothing(self):
+        self.load('--dry-run')
+        self.assertEqual(self.snapshot(), ([], [], [], []))
+        self.assertFalse(os.path.exists(f'{self.fixture}.progress.json'))
+
+    def test_interrupted_load_is_resumed(self):
+        from .management.commands import stream_loaddata
+
+        real = stream_loaddata.Deserializer
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 6:
+                raise KeyboardInterrupt
+            return real(*args, **kwargs)
+
+        with mock.patch.object(stream_loaddata, 'Deserializer', interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.load()
+        with open(f'{self.fixture}.progress.json', encoding='utf-8') as fh:
+            done = json.load(fh)['done']
+        self.assertTrue(0 < sum(done.values()) < self.total)
+
+        with mock.patch.object(stream_loaddata, 'Deserializer', wraps=real) as deserializer:
+            self.load('--resume')
+        # Загруженные пачки не разбираются повторно
+        loaded = sum(len(call.args[0]) for call in deserializer.call_args_list)
+        self.assertEqual(loaded, self.total - sum(done.values()))
+        self.assertEqual(self.snapshot(), self.expected)
+
+    def test_progress_of_other_fixture_is_rejected(self):
+        with open(f'{self.fixture}.progress.json', 'w', encoding='utf-8') as fh:
+            json.dump({'fixture': self.fixture, 'size': 1, 'mtime': 0, 'done': {}}, fh)
+        with self.assertRaises(CommandError):
+            self.load('--resume')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProfileWriteTests(TestCase):
+    """Число записей в БД при регистрации, входе и редактировании профиля"""
+
+    # executemany записывается в журнал как "N times: <sql>"
+    WRITE_SQL = re.compile(r'^(?:\d+ times: )?(?:INSERT(?: OR REPLACE)? INTO|UPDATE|DELETE FROM)\s+"?(\w+)"?')
+
+    def writes(self, ctx):
+        """Запросы на запись по таблицам (сессии не учитываются)"""
+        tables = {}
+        for query in ctx.captured_queries:
+            match = self.WRITE_SQL.match(query['sql'])
+            if match and match.group(1) != 'django_session':
+                tables[match.group(1)] = tables.get(match.group(1), 0) + 1
+        return tables
+
+    def register(self):
+        return self.client.post(reverse('fefu_lab:register'), {
+            'first_name': 'Анна',
+            'last_name': 'Иванова',
+            'email': 'anna@dvfu.ru',
+            'password': 'long-password',
+            'password_confirm': 'long-password',
+            'faculty': 'SE',
+            'role': 'TEACHER',
+        })
+
+    def edit_profile(self, **changes):
+        profile = Student.objects.get(user__email='anna@dvfu.ru')
+        data = {
+            'first_name': profile.user.first_name,
+            'last_name': profile.user.last_name,
+            'email': profile.user.email,
+            'phone': profile.phone,
+            'bio': profile.bio,
+            'faculty': profile.faculty,
+            **changes,
+        }
+        return self.client.post(reverse('fefu_lab:profile'), data)
+
+    def test_registration_creates_profile_with_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.register()
+        self.assertRedirects(response, reverse('fefu_lab:profile'), fetch_redirect_response=False)
+        profile = Student.objects.get(user__email='anna@dvfu.ru')
+        self.assertEqual((profile.faculty, profile.role), ('SE', 'TEACHER'))
+
+        writes = self.writes(ctx)
+        fts = {search.FTS_TABLES[Student]: 1} if search.fts_is_available(connection, search.FTS_TABLES[Student]) else {}
+        # INSERT пользователя + UPDATE last_login при входе, один INSERT профиля
+        self.assertEqual(writes, {'auth_user': 2, 'students': 1, **fts})
+        self.assertFalse(any(
+            q['sql'].startswith('UPDATE "students"') for q in ctx.captured_queries
+        ))
+
+    def test_login_does_not_touch_profile(self):
+        self.register()
+        self.client.logout()
+        updated_at = Student.objects.get(user__email='anna@dvfu.ru').updated_at
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('fefu_lab:login'), {
+                'username': 'anna@dvfu.ru', 'password': 'long-password'
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.writes(ctx), {'auth_user': 1})
+        self.assertEqual(Student.objects.get(user__email='anna@dvfu.ru').updated_at, updated_at)
+
+    def test_profile_edit_writes_only_changed_rows(self):
+        self.register()
+        with CaptureQueriesContext(connection) as ctx:
+            self.edit_profile()
+        self.assertEqual(self.writes(ctx), {})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.edit_profile(phone='+79990000000')
+        self.assertEqual(self.writes(ctx), {'students': 1})
+        self.assertEqual(Student.objects.get(user__email='anna@dvfu.ru').phone, '+79990000000')
+
+    def test_user_without_profile_can_be_saved(self):
+        self.register()
+        Student.objects.filter(user__email='anna@dvfu.ru').delete()
+        user = User.objects.select_related('student_profile').get(email='anna@dvfu.ru')
+        user.first_name = 'Мария'
+        user.save()
+        user = User.objects.get(email='anna@dvfu.ru')
+        with self.assertRaises(Student.DoesNotExist):
+            user.student_profile
+        user.save(update_fields=['first_name'])
+        self.assertEqual(User.objects.get(email='anna@dvfu.ru').first_name, 'Мария')
+
+    def test_role_change_survives_login(self):
+        self.register()
+        self.client.logout()
+        Student.objects.filter(user__email='anna@dvfu.ru').update(role='ADMIN')
+        self.client.post(reverse('fefu_lab:login'), {'username': 'anna@dvfu.ru', 'password': 'long-password'})
+        self.assertEqual(Student.objects.get(user__email='anna@dvfu.ru').role, 'ADMIN')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class RoleResolutionTests(TestCase):
+    """Роль загружается вместе с пользователем один раз за запрос"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='t@dvfu.ru', email='t@dvfu.ru', password='x')
+        Student.objects.filter(user=cls.teacher).update(role='TEACHER')
+
+    def test_dashboard_loads_user_and_profile_in_one_query(self):
+        self.client.force_login(self.teacher)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('fefu_lab:teacher_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user_role'], 'TEACHER')
+        self.assertTrue(response.context['is_teacher'])
+        self.assertFalse(any('FROM "students"' in q['sql'] and 'auth_user' not in q['sql'] for q in ctx.captured_queries))
+
+    def test_role_change_applies_on_next_request(self):
+        self.client.force_login(self.teacher)
+        Student.objects.filter(user=self.teacher).update(role='STUDENT')
+        self.assertRedirects(self.client.get(reverse('fefu_lab:teacher_dashboard')), reverse('fefu_lab:index'))
+        self.assertEqual(self.client.get(reverse('fefu_lab:student_dashboard')).status_code, 200)
+
+    def test_user_without_profile(self):
+        Student.objects.filter(user=self.teacher).delete()
+        self.client.force_login(self.teacher)
+        self.assertRedirects(self.client.get(reverse('fefu_lab:profile')), reverse('fefu_lab:index'))
+        self.assertRedirects(self.client.get(reverse('fefu_lab:teacher_dashboard')), reverse('fefu_lab:index'))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], AUTH_USER_CACHE=True,
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthUserCacheTests(TestCase):
+    """Снимок пользователя сессии в кеше"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='t@dvfu.ru', email='t@dvfu.ru', password='x')
+        Student.objects.filter(user=cls.user).update(role='TEACHER')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def dashboard(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('fefu_lab:teacher_dashboard'))
+        return response, len(ctx.captured_queries)
+
+    def test_cached_user_saves_one_query_per_page_view(self):
+        response, cold = self.dashboard()
+        self.assertEqual(response.status_code, 200)
+        response, warm = self.dashboard()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cold - warm, 1)
+        self.assertEqual(response.context['user_role'], 'TEACHER')
+        with override_settings(AUTH_USER_CACHE=False):
+            self.assertEqual(self.dashboard()[1], cold)
+
+    def test_profile_save_invalidates_snapshot(self):
+        self.dashboard()
+        profile = Student.objects.get(user=self.user)
+        profile.role = 'STUDENT'
+        profile.save()
+        self.assertRedirects(self.dashboard()[0], reverse('fefu_lab:index'))
+
+    def test_password_change_ends_session(self):
+        self.dashboard()
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        response, _ = self.dashboard()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login/'))
+
+    def test_deactivation_ends_session(self):
+        self.dashboard()
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertTrue(self.dashboard()[0].url.startswith('/login/'))
+
+    def test_password_hash_is_not_cached(self):
+        self.dashboard()
+        snapshot = cache.get(auth_cache.cache_key(self.user.pk))
+        self.assertNotIn('password', snapshot['user'][0])
+        self.assertNotIn(self.user.password, repr(snapshot))
+
+        expected = User.objects.get(pk=self.user.pk).get_session_auth_hash()
+        user = auth_cache.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_session_auth_hash(), expected)
+        # Хеш пароля загружается при первом обращении
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('x'))
+        user.set_password('new-password')
+        self.assertNotEqual(user.get_session_auth_hash(), expected)
+
+    def test_local_memory_cache_is_reported(self):
+        from django.core import checks
+        with self.settings(CACHES={'default': {'BACKEND': 'fefu_lab.caching.LocMemCache'}}):
+            messages = [m.id for m in checks.run_checks(tags=[checks.Tags.caches])]
+        self.assertIn('fefu_lab.W001', messages)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   LOGIN_THROTTLE_ACCOUNT_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=5)
+class LoginThrottleTests(TestCase):
+    """Ограничение попыток входа и стоимость хеширования"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='anna@dvfu.ru', email='Anna@dvfu.ru', password='right-password')
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, email, password, ip='10.0.0.1', **headers):
+        with mock.patch.object(MD5PasswordHasher, 'verify', autospec=True, side_effect=MD5PasswordHasher.verify) as verify:
+            response = self.client.post(
+                reverse('fefu_lab:login'), {'username': email, 'password': password}, REMOTE_ADDR=ip, **headers
+            )
+        return response, verify.call_count
+
+    def test_successful_login_hashes_once(self):
+        response, hashes = self.login('ANNA@dvfu.ru', 'right-password')
+        self.assertRedirects(response, reverse('fefu_lab:profile'), fetch_redirect_response=False)
+        self.assertEqual(hashes, 1)
+
+    def test_failures_hash_once_including_unknown_email(self):
+        self.assertEqual(self.login('anna@dvfu.ru', 'wrong')[1], 1)
+        self.assertEqual(self.login('nobody@dvfu.ru', 'wrong')[1], 1)
+
+    def test_account_is_locked_before_hashing(self):
+        for _ in range(3):
+            self.login('anna@dvfu.ru', 'wrong')
+        response, hashes = self.login('anna@dvfu.ru', 'right-password', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashes, 0)
+        self.assertContains(response, 'Слишком много попыток')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_ip_limit_spans_accounts(self):
+        for i in range(5):
+            self.login(f'user{i}@dvfu.ru', 'wrong')
+        self.assertEqual(self.login('anna@dvfu.ru', 'right-password')[1], 0)
+        response, hashes = self.login('anna@dvfu.ru', 'right-password', ip='10.0.0.9')
+        self.assertEqual((response.status_code, hashes), (302, 1))
+
+    @override_settings(LOGIN_THROTTLE_IP_HEADER='HTTP_X_REAL_IP')
+    def test_client_ip_is_taken_from_proxy_header(self):
+        # За прокси у всех запросов один REMOTE_ADDR
+        for i in range(5):
+            self.login(f'user{i}@dvfu.ru', 'wrong', ip='172.18.0.5', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(self.login('anna@dvfu.ru', 'right-password', ip='172.18.0.5',
+                                    HTTP_X_REAL_IP='203.0.113.7')[1], 0)
+        response, hashes = self.login('anna@dvfu.ru', 'right-password', ip='172.18.0.5', HTTP_X_REAL_IP='203.0.113.8')
+        self.assertEqual((response.status_code, hashes), (302, 1))
+
+    def test_email_lookup_uses_expression_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется на SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN SELECT id FROM auth_user WHERE LOWER(email) = %s', ['anna@dvfu.ru'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('auth_user_email_lower_idx', plan)
+
+
+class QueryPlanAuditTests(TestCase):
+    """EXPLAIN всех запросов представлений: без полных просмотров больших таблиц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(courses=200, students=2000, enrollments=8000, instructors=20)
+
+    def test_views_do_not_scan_large_tables(self):
+        out = io.StringIO()
+        call_command('audit_queries', '--fail', '--min-rows=500', stdout=out, stderr=io.StringIO())
+        self.assertIn('полных просмотров: 0', out.getvalue())
+
+    def test_site_stats_use_partial_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется на SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN SELECT COUNT(*) FROM students WHERE "is_active"')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('students_active_', plan)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PAGE_CACHE=True, METRICS_DIR='',
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PageCacheTests(TestCase):
+    """Анонимные страницы каталога отдаются из кеша до изменения их данных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = Instructor.objects.create(
+            first_name='Анна', last_name='Смирнова', email='anna@dvfu.ru', specialization='Python'
+        )
+        cls.course = Course.objects.create(
+            title='Python', slug='python', description='Основы', duration=36,
+            instructor=cls.instructor, max_students=10,
+        )
+        cls.other = Course.objects.create(
+            title='Django', slug='django', description='Веб', duration=48, max_students=10,
+        )
+        user = User.objects.create_user(username='s@dvfu.ru', email='s@dvfu.ru', password='x')
+        cls.student = user.student_profile
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCached(self, url, params=None):
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        return response
+
+    def test_repeated_anonymous_requests_skip_database(self):
+        for name, args in [('fefu_lab:index', []), ('fefu_lab:course_list', []),
+                           ('fefu_lab:course_detail', ['python'])]:
+            self.assertCached(reverse(name, args=args))
+
+    def test_equivalent_parameters_share_entry(self):
+        url = reverse('fefu_lab:course_list')
+        self.client.get(url, {'search': 'Python', 'level': 'BEGINNER'})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, {'search': '  python ', 'level': 'BEGINNER', 'utm_source': 'mail'})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_level_spellings_do_not_share_entry(self):
+        # Фильтр level сравнивается точно: пустая страница для beginner
+        # не должна отдаваться вместо BEGINNER
+        url = reverse('fefu_lab:course_list')
+        self.assertEqual(list(self.client.get(url, {'level': 'beginner'}).context['page_obj']), [])
+        response = self.client.get(url, {'level': 'BEGINNER'})
+        self.assertEqual({course.pk for course in response.context['page_obj']}, {self.course.pk, self.other.pk})
+
+    def test_course_change_invalidates_only_its_pages(self):
+        python_url = reverse('fefu_lab:course_detail', args=['python'])
+        django_url = reverse('fefu_lab:course_detail', args=['django'])
+        self.client.get(python_url)
+        self.client.get(django_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Python 2'
+            self.course.save()
+        self.assertContains(self.client.get(python_url), 'Python 2')
+        self.assertCached(django_url)
+
+    def test_enrollment_and_instructor_changes_invalidate_course(self):
+        url = reverse('fefu_lab:course_detail', args=['python'])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertContains(self.client.get(url), 'Смирнова')
+        self.assertCached(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instructor.last_name = 'Иванова'
+            self.instructor.save()
+        self.assertContains(self.client.get(url), 'Иванова')
+
+    def test_course_card_fragment_refreshes_with_course(self):
+        url = reverse('fefu_lab:course_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.filter(pk=self.course.pk).update(title='Python Pro')
+            Course.recount_enrollments([self.course.pk])
+        self.assertContains(self.client.get(url), 'Python Pro')
+
+    def test_authenticated_users_bypass_page_cache(self):
+        url = reverse('fefu_lab:course_list')
+        self.client.get(url)
+        self.client.force_login(self.student.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+    def test_disabled_cache_renders_without_fragments(self):
+        url = reverse('fefu_lab:course_list')
+        with self.settings(PAGE_CACHE=False):
+            self.client.get(url)
+            Course.objects.filter(pk=self.course.pk).update(title='Без кеша')
+            self.assertContains(self.client.get(url), 'Без кеша')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PAGE_CACHE=False, METRICS_DIR='',
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConditionalGetTests(TestCase):
+    """Повторный запрос неизменившейся страницы получает 304 за один запрос к БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = Instructor.objects.create(
+            first_name='Анна', last_name='Смирнова', email='anna@dvfu.ru', specialization='Python'
+        )
+        cls.course = Course.objects.create(
+            title='Python', slug='python', description='Основы', duration=36,
+            instructor=cls.instructor, max_students=10,
+        )
+        user = User.objects.create_user(
+            username='s@dvfu.ru', email='s@dvfu.ru', password='x', first_name='Петр', last_name='Сидоров'
+        )
+        cls.student = user.student_profile
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return [
+            reverse('fefu_lab:course_list'),
+            reverse('fefu_lab:course_detail', args=['python']),
+            reverse('fefu_lab:student_list'),
+            reverse('fefu_lab:student_detail', args=[self.student.pk]),
+        ]
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_not_modified_costs_one_query(self):
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            with CaptureQueriesContext(connection) as ctx:
+                revalidated = self.revalidate(url, response)
+            self.assertEqual(revalidated.status_code, 304, url)
+            self.assertLessEqual(len(ctx.captured_queries), 1, url)
+
+            revalidated = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(revalidated.status_code, 304, url)
+
+    @override_settings(PAGE_CACHE=True)
+    def test_page_cache_answers_not_modified_without_queries(self):
+        url = reverse('fefu_lab:course_detail', args=['python'])
+        response = self.client.get(url)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_changes_produce_new_validators(self):
+        course_url, student_url = self.urls()[1], self.urls()[3]
+        course_page, student_page = self.client.get(course_url), self.client.get(student_url)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertEqual(self.revalidate(course_url, course_page).status_code, 200)
+        self.assertEqual(self.revalidate(student_url, student_page).status_code, 200)
+
+        list_url = self.urls()[2]
+        list_page = self.client.get(list_url)
+        user = self.student.user
+        user.last_name = 'Петров'
+        user.save(update_fields=['last_name'])
+        self.assertContains(self.revalidate(list_url, list_page), 'Петров')
+
+        course_page = self.client.get(course_url)
+        self.instructor.delete()
+        self.assertContains(self.revalidate(course_url, course_page), 'Не назначен')
+
+    def test_enrollment_service_changes_course_validators(self):
+        course_url, student_url = self.urls()[1], self.urls()[3]
+        course_page, student_page = self.client.get(course_url), self.client.get(student_url)
+        result = services.enroll_student(self.student, self.course)
+        self.assertEqual(result.status, services.EnrollmentResult.ENROLLED)
+        self.assertEqual(self.revalidate(course_url, course_page).status_code, 200)
+        self.assertEqual(self.revalidate(student_url, student_page).status_code, 200)
+
+    def test_authenticated_validators_depend_on_user(self):
+        url = self.urls()[0]
+        anonymous = self.client.get(url)
+        self.client.force_login(self.student.user)
+        response = self.revalidate(url, anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_missing_object_is_not_found(self):
+        response = self.client.get(reverse('fefu_lab:course_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], ROOT_URLCONF='fefu_lab.tests', METRICS_DIR='',
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncCatalogTests(TestCase):
+    """Асинхронные страницы каталога отдают то же, что синхронные, с тем же числом запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students, courses = seed_catalog(courses=30, students=60, enrollments=300, instructors=5)
+        cls.course = courses[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def routes(self):
+        return [
+            ('fefu_lab:index', [], {}),
+            ('fefu_lab:course_list', [], {}),
+            ('fefu_lab:course_list', [], {'search': 'курс', 'page': '2'}),
+            ('fefu_lab:course_list', [], {'cursor': ''}),
+            ('fefu_lab:course_detail', [self.course.slug], {}),
+            ('fefu_lab:student_list', [], {'faculty': 'CS'}),
+            ('fefu_lab:student_detail', [self.students[0].pk], {}),
+        ]
+
+    async def test_catalog_views_are_coroutines(self):
+        for name, args, _ in self.routes():
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse(name, args=args)).func), name)
+
+    async def test_async_pages_match_sync_pages(self):
+        for name, args, params in self.routes():
+            url = reverse(name, args=args)
+            await cache.aclear()
+            response = await self.async_client.get(url, params)
+            with self.settings(ROOT_URLCONF='web_2025.urls'):
+                await cache.aclear()
+                expected = await sync_to_async(self.client.get)(url, params)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertEqual(response['X-DB-Queries'], expected['X-DB-Queries'], name)
+            self.assertEqual(
+                [str(obj.pk) for obj in response.context.get('page_obj', [])],
+                [str(obj.pk) for obj in expected.context.get('page_obj', [])],
+                name,
+            )
+
+    async def test_not_found_and_not_modified(self):
+        missing = await self.async_client.get(reverse('fefu_lab:course_detail', args=['missing']))
+        self.assertEqual(missing.status_code, 404)
+
+        url = reverse('fefu_lab:student_detail', args=[self.students[0].pk])
+        response = await self.async_client.get(url)
+        revalidated = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        # Запросы потоков sync_to_async учитывает и middleware метрик
+        self.assertEqual(revalidated['X-DB-Queries'], '1')
+
+
+class RuntimeProfileTests(TestCase):
+    def test_health_reports_worker_to_trusted_clients(self):
+        response = self.client.get(reverse('fefu_lab:health'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'ok')
+        self.assertEqual(data['worker']['pid'], os.getpid())
+        self.assertGreater(data['worker']['rss_bytes'], 0)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+        response = self.client.get(reverse('fefu_lab:health'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_health_fails_without_database(self):
+        with mock.patch('django.db.backends.utils.CursorWrapper.execute', side_effect=DatabaseError):
+            response = self.client.get(reverse('fefu_lab:health'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'db_unavailable'})
+
+    def test_worker_gauges_in_prometheus_output(self):
+        output = metrics.render_prometheus({}, [{'pid': 42, 'requests': 7, 'rss_bytes': 1024, 'uptime': 3.0}])
+        self.assertIn('fefu_worker_requests{pid="42"} 7', output)
+        self.assertIn('fefu_worker_rss_bytes{pid="42"} 1024', output)
+
+    def test_warm_up_loads_urls_models_and_templates(self):
+        from web_2025.warmup import warm_up
+
+        timings = warm_up()
+        self.assertGreater(timings['urls'][0], 0)
+        self.assertGreaterEqual(timings['models'][0], 5)
+        self.assertGreater(timings['templates'][0], 10)
+
+    def load_gunicorn_conf(self, **env):
+        from web_2025 import gunicorn_conf
+
+        with mock.patch.dict(os.environ, {f'GUNICORN_{key}': value for key, value in env.items()}):
+            return importlib.reload(gunicorn_conf)
+
+    def test_gunicorn_conf_sizes_workers_from_cpus(self):
+        with mock.patch('os.sched_getaffinity', return_value={0, 1, 2, 3}), \
+                mock.patch('builtins.open', side_effect=OSError):
+            conf = self.load_gunicorn_conf()
+        self.assertEqual(conf.CPUS, 4)
+        self.assertEqual((conf.workers, conf.threads, conf.worker_class), (5, 4, 'gthread'))
+        self.assertTrue(conf.preload_app)
+        self.assertEqual((conf.max_requests, conf.max_requests_jitter), (2000, 200))
+
+        conf = self.load_gunicorn_conf(APP='web_2025.asgi:application', WORKERS='2', MAX_REQUESTS='0')
+        self.assertEqual((conf.workers, conf.threads), (2, 1))
+        self.assertEqual(conf.worker_class, 'uvicorn_worker.UvicornWorker')
+        self.assertEqual(conf.max_requests, 0)
+
+
+class ConnectionSettingsTests(TestCase):
+    def load_databases(self, **env):
+        """DATABASES модуля настроек, вычисленные с переменными окружения env"""
+        from web_2025 import settings as settings_module
+
+        try:
+            with mock.patch.dict(os.environ, env):
+                return copy.deepcopy(importlib.reload(settings_module).DATABASES)
+        finally:
+            importlib.reload(settings_module)
+
+    def test_persistent_connections_with_health_checks(self):
+        database = self.load_databases(DB_HOST='db', DB_CONN_MAX_AGE='120')['default']
+        self.assertEqual((database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']), (120, True))
+        self.assertNotIn('pool', database.get('OPTIONS', {}))
+
+    def test_asgi_stack_does_not_keep_connections(self):
+        self.assertEqual(self.load_databases(ASYNC_VIEWS='True')['default']['CONN_MAX_AGE'], 0)
+
+    def test_pool_is_sized_per_worker(self):
+        database = self.load_databases(
+            DB_HOST='db', DB_POOL='True', DB_MAX_CONNECTIONS='40', DB_POOL_WORKERS='4'
+        )['default']
+        # Пул несовместим с постоянными соединениями Django
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {'min_size': 2, 'max_size': 10, 'timeout': 10.0})
+
+    def test_worker_info_counts_opened_connections(self):
+        with mock.patch.object(metrics, 'db_connections_opened', 3):
+            self.assertEqual(metrics.worker_info()['db_connections'], 3)
+
+
+@override_settings(DB_REPLICAS=['replica'], PAGE_CACHE=False)
+class ReplicaRoutingTests(TestCase):
+    """Чтение с реплики на двух базах SQLite: основной (тестовой) и файловой реплике"""
+
+    def setUp(self):
+        db_router.health.reset()
+        self.addCleanup(db_router.health.reset)
+        self.course = Course.objects.create(
+            title='Курс на основной БД', slug='replicated', description='Описание', duration=10
+        )
+        replica_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(replica_dir.cleanup)
+        self.add_database('replica', f'{replica_dir.name}/replica.sqlite3')
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Instructor)
+            editor.create_model(Course)
+        # Реплика еще не получила последнюю правку курса
+        Course.objects.using('replica').bulk_create([Course(
+            pk=self.course.pk, title='Курс на реплике', slug='replicated', description='Описание', duration=10
+        )])
+
+    def add_database(self, alias, name):
+        connections.settings[alias] = {**connections.settings['default'], 'NAME': name}
+        self.addCleanup(self.remove_database, alias)
+        # Реплики вне транзакций теста: разрешаем соединения только на время теста
+        self.enterContext(mock.patch.object(type(self), 'databases', self.databases | {alias}))
+
+    def remove_database(self, alias):
+        connections[alias].close()
+        del connections.settings[alias]
+        if hasattr(connections._connections, alias):
+            delattr(connections._connections, alias)
+
+    def get_course(self):
+        return self.client.get(reverse('fefu_lab:course_detail', args=['replicated']))
+
+    def test_read_only_view_reads_from_replica(self):
+        response = self.get_course()
+        self.assertContains(response, 'Курс на реплике')
+        self.assertNotIn(settings.DB_REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_other_views_and_background_code_read_from_primary(self):
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, 'Курс на основной БД')
+        with self.settings(DB_REPLICA_VIEWS=['fefu_lab:*_list']):
+            self.assertContains(self.get_course(), 'Курс на основной БД')
+
+    def test_write_pins_client_to_primary(self):
+        response = self.client.post(reverse('fefu_lab:login'), {'username': 'x', 'password': 'y'})
+        cookie = response.cookies[settings.DB_REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DB_REPLICA_PIN_SECONDS)
+        self.assertContains(self.get_course(), 'Курс на основной БД')
+
+    def test_objects_read_from_replica_are_saved_to_primary(self):
+        replica_course = Course.objects.using('replica').get(pk=self.course.pk)
+        self.assertEqual(router.db_for_write(Course, instance=replica_course), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'fefu_lab'))
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        self.add_database('broken', '/nonexistent/replica.sqlite3')
+        with self.settings(DB_REPLICAS=['broken']), self.assertLogs('fefu_lab.db_router', 'WARNING'):
+            self.assertContains(self.get_course(), 'Курс на основной БД')
+        self.assertFalse(db_router.health.is_healthy('broken'))
+
+    def test_page_rendered_from_lagging_replica_is_not_cached(self):
+        state = db_router.RoutingState()
+        state.replica = 'replica'
+        token = db_router.current_routing.set(state)
+        self.addCleanup(db_router.current_routing.reset, token)
+        self.assertTrue(page_cache.replica_may_lag({'catalog': page_cache._new_version()}))
+        self.assertFalse(page_cache.replica_may_lag({'catalog': f'{time.time() - 60:.3f}-abc'}))
+
+
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def reopen(self, store_class, session_key):
+        session = store_class(session_key)
+        session.load()
+        return session
+
+    def test_unchanged_session_is_not_written(self):
+        from .sessions.db import SessionStore
+
+        session = SessionStore()
+        session['theme'] = 'dark'
+        session.create()
+
+        session = self.reopen(SessionStore, session.session_key)
+        session['theme'] = 'dark'
+        with self.assertNumQueries(0):
+            session.save()
+
+        session['theme'] = 'light'
+        session.save()
+        self.assertEqual(self.reopen(SessionStore, session.session_key)['theme'], 'light')
+
+    def test_cached_db_reads_without_queries(self):
+        from .sessions.cached_db import SessionStore
+
+        session = SessionStore()
+        session['theme'] = 'dark'
+        session.create()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.reopen(SessionStore, session.session_key)['theme'], 'dark')
+
+    def test_local_memory_cache_sessions_are_reported(self):
+        from django.core import checks
+
+        with self.settings(SESSION_ENGINE='fefu_lab.sessions.cached_db',
+                           CACHES={'default': {'BACKEND': 'fefu_lab.caching.LocMemCache'}}):
+            messages = [m.id for m in checks.run_checks(tags=[checks.Tags.caches])]
+        self.assertIn('fefu_lab.W002', messages)
+
+    def test_sweeper_deletes_expired_sessions_in_batches(self):
+        from django.contrib.sessions.models import Session
+
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key='active', session_data='', expire_date=now + timedelta(days=1))]
+        )
+        out = io.StringIO()
+        with self.settings(SESSION_ENGINE='fefu_lab.sessions.db'):
+            call_command('clear_expired_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertIn('Удалено истекших сессий: 5 (3 пакетов', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+
+class CacheBackendTests(TestCase):
+    """Общий кеш в файле SQLite, пространства имен и статистика"""
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.backend()
+        caching.stats.reset()
+
+    def backend(self, **options):
+        # Второй экземпляр с тем же файлом - как кеш другого воркера
+        return caching.SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_workers_see_each_others_writes_and_deletes(self):
+        other = self.backend()
+        self.cache.set('fefu_lab:test:a', {'x': 1})
+        self.assertEqual(other.get('fefu_lab:test:a'), {'x': 1})
+        other.delete('fefu_lab:test:a')
+        self.assertIsNone(self.cache.get('fefu_lab:test:a'))
+
+    def test_add_and_incr_are_shared(self):
+        other = self.backend()
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(other.add('lock', 2))
+        other.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(other.incr('counter', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_entries_are_not_returned(self):
+        self.cache.set_many({'a': 1, 'b': 2}, timeout=60)
+        self.cache.set('old', 1, timeout=60)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        with mock.patch('time.time', return_value=time.time() + 120):
+            self.assertIsNone(self.cache.get('old'))
+            self.assertFalse(self.cache.has_key('a'))
+            self.assertTrue(self.cache.add('old', 2))
+
+    def test_cull_removes_expired_and_oldest_entries(self):
+        cache = caching.SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 1}})
+        for i in range(10):
+            cache.set(f'k{i}', i, timeout=100 + i)
+        cache.set('k10', 10, timeout=None)
+        self.assertEqual(cache.get_many(['k0', 'k10', 'k9']), {'k10': 10, 'k9': 9})
+        self.assertLessEqual(cache._db().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0], 6)
+
+    def test_namespace_invalidation_reaches_all_workers(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'fefu_lab.caching.SQLiteCache', 'LOCATION': self.location}}):
+            pages = caching.CacheNamespace('fefu_lab:test')
+            self.addCleanup(caching.namespaces.pop, 'fefu_lab:test')
+            value, version = pages.lookup('a')
+            self.assertIsNone(value)
+            pages.set('a', 'page', version=version)
+            self.assertEqual(pages.get('a'), 'page')
+            # Другой воркер сбрасывает пространство в своем экземпляре кеша
+            self.backend().set(pages.version_key, 'v2', timeout=None)
+            self.assertIsNone(pages.get('a'))
+            call_command('invalidate_cache', 'fefu_lab:test', stdout=io.StringIO())
+            self.assertNotEqual(pages.version(), 'v2')
+        self.assertEqual(caching.stats.snapshot()['fefu_lab:test'], {'hits': 1, 'misses': 1, 'stale': 1})
+
+    def test_hits_and_misses_are_reported_in_metrics(self):
+        self.cache.set('fefu_lab:site_stats', 1)
+        self.cache.get('fefu_lab:site_stats')
+        self.cache.get_many(['fefu_lab:login:ip:1', 'fefu_lab:site_stats'])
+        self.assertEqual(caching.stats.snapshot(), {
+            'fefu_lab:site_stats': {'hits': 2, 'misses': 0, 'stale': 0},
+            'fefu_lab:login': {'hits': 0, 'misses': 1, 'stale': 0},
+        })
+        with self.settings(METRICS_DIR=self.directory):
+            output = metrics.render_prometheus({}, cache_stats=metrics.collect_cache_stats())
+        self.assertIn('fefu_cache_requests_total{namespace="fefu_lab:login",result="miss"} 1', output)
+        self.assertIn('fefu_cache_requests_total{namespace="fefu_lab:site_stats",result="hit"} 2', output)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], AVATAR_ASYNC=False, AVATAR_THUMBNAIL_SIZES=[64, 160])
+class AvatarPipelineTests(TestCase):
+    """Загрузка аватара: проверка, уменьшение, миниатюры и WebP без EXIF"""
+
+    def setUp(self):
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.media = media
+        self.user = User.objects.create_user(username='a@dvfu.ru', email='a@dvfu.ru', password='x',
+                                             first_name='Анна', last_name='Иванова')
+        self.client.force_login(self.user)
+
+    def image_file(self, size=(1200, 600), image_format='JPEG', name='photo.jpg', orientation=None):
+        from PIL import Image
+
+        image = Image.new('RGB', size, 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+    def upload(self, avatar):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('fefu_lab:profile'), {
+                'first_name': 'Анна', 'last_name': 'Иванова', 'email': 'a@dvfu.ru', 'faculty': 'CS', 'avatar': avatar,
+            })
+
+    def open_media(self, name):
+        from PIL import Image
+
+        return Image.open(os.path.join(self.media, name))
+
+    def test_upload_is_downscaled_into_hashed_variants_without_exif(self):
+        response = self.upload(self.image_file(orientation=6))
+        self.assertRedirects(response, reverse('fefu_lab:profile'), fetch_redirect_response=False)
+        name = Student.objects.get(user=self.user).avatar.name
+        self.assertTrue(avatars.is_processed(name))
+        self.assertEqual(os.listdir(os.path.join(self.media, avatars.INCOMING_DIR)), [])
+
+        for variant in avatars.variant_names(name):
+            with self.open_media(variant) as image:
+                self.assertNotIn('exif', image.info)
+                self.assertFalse(image.getexif())
+        # Ориентация из EXIF применена до его удаления
+        with self.open_media(name) as image:
+            self.assertEqual(image.size, (256, 512))
+        with self.open_media(avatars.variant_name(name, 64, 'webp')) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+
+        thumbnail = Student.objects.get(user=self.user).avatar_thumbnail
+        self.assertContains(self.client.get(reverse('fefu_lab:profile')), thumbnail.webp_url)
+
+    def test_invalid_uploads_are_rejected(self):
+        cases = [
+            (SimpleUploadedFile('a.jpg', b'not an image'), 'invalid_image', {}),
+            (self.image_file(image_format='BMP', name='a.bmp'), 'invalid_format', {}),
+            (self.image_file(size=(300, 300)), 'too_many_pixels', {'AVATAR_MAX_PIXELS': 300 * 299}),
+            (self.image_file(), 'file_too_large', {'AVATAR_MAX_UPLOAD_SIZE': 1000}),
+        ]
+        for avatar, code, overrides in cases:
+            with self.subTest(code=code), self.settings(**overrides):
+                response = self.upload(avatar)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([e.code for e in response.context['form'].errors.as_data()['avatar']], [code])
+        self.assertFalse(Student.objects.get(user=self.user).avatar)
+
+    def test_processing_runs_in_pool_after_response(self):
+        self.upload(self.image_file(size=(400, 400)))
+        first = Student.objects.get(user=self.user).avatar.name
+
+        submitted = []
+        with self.settings(AVATAR_ASYNC=True), \
+                mock.patch.object(avatars, 'executor', return_value=mock.Mock(submit=lambda *args: submitted.append(args))):
+            self.upload(self.image_file(size=(500, 400), name='new.png', image_format='PNG'))
+        pending = Student.objects.get(user=self.user).avatar.name
+        self.assertTrue(pending.startswith(avatars.INCOMING_DIR))
+        self.assertIsNone(Student.objects.get(user=self.user).avatar_thumbnail)
+
+        job, *args = submitted[0]
+        self.assertEqual(args, [Student.objects.get(user=self.user).pk, pending, first])
+        avatars.process(*args)
+        current = Student.objects.get(user=self.user).avatar.name
+        self.assertTrue(avatars.is_processed(current))
+        self.assertNotEqual(current, first)
+        # Варианты прежнего аватара удалены
+        self.assertFalse(os.path.exists(os.path.join(self.media, first)))
+
+    def pending_upload(self, content):
+        """Загрузка, ожидающая обработки (без запуска обработки)"""
+        from django.core.files.storage import default_storage
+
+        incoming = default_storage.save(f'{avatars.INCOMING_DIR}pending.jpg', io.BytesIO(content))
+        Student.objects.filter(user=self.user).update(avatar=incoming)
+        return incoming
+
+    def test_failed_processing_keeps_previous_avatar(self):
+        self.upload(self.image_file(size=(400, 400)))
+        first = Student.objects.get(user=self.user).avatar.name
+        student_id = Student.objects.get(user=self.user).pk
+
+        incoming = self.pending_upload(b'truncated')
+        with self.assertLogs('fefu_lab.avatars', 'WARNING'):
+            self.assertIsNone(avatars.process(student_id, incoming, first))
+        self.assertEqual(Student.objects.get(pk=student_id).avatar.name, first)
+        self.assertTrue(all(os.path.exists(os.path.join(self.media, name)) for name in avatars.variant_names(first)))
+        self.assertFalse(os.path.exists(os.path.join(self.media, incoming)))
+
+    def test_upload_is_kept_when_variants_cannot_be_written(self):
+        from django.core.files.storage import default_storage
+
+        incoming = self.pending_upload(self.image_file(size=(300, 300)).read())
+        student_id = Student.objects.get(user=self.user).pk
+
+        with mock.patch.object(default_storage, 'save', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                avatars.process(student_id, incoming)
+        self.assertEqual(Student.objects.get(pk=student_id).avatar.name, incoming)
+        self.assertTrue(os.path.exists(os.path.join(self.media, incoming)))
+
+        # Повторная обработка (process_avatars) завершает переключение
+        name = avatars.process(student_id, incoming)
+        self.assertTrue(avatars.is_processed(name))
+        self.assertFalse(os.path.exists(os.path.join(self.media, incoming)))
+
+    def test_process_avatars_keeps_originals_that_fail(self):
+        from django.core.files.storage import default_storage
+
+        other = User.objects.create_user(username='b@dvfu.ru', email='b@dvfu.ru').student_profile
+        broken = default_storage.save('avatars/legacy-broken.jpg', io.BytesIO(b'not an image'))
+        legacy = default_storage.save('avatars/legacy.jpg', self.image_file(size=(300, 300)))
+        Student.objects.filter(user=self.user).update(avatar=broken)
+        Student.objects.filter(pk=other.pk).update(avatar=legacy)
+
+        err = io.StringIO()
+        with self.assertLogs('fefu_lab.avatars', 'WARNING'):
+            call_command('process_avatars', stdout=io.StringIO(), stderr=err)
+        self.assertIn(broken, err.getvalue())
+        self.assertEqual(Student.objects.get(user=self.user).avatar.name, broken)
+        self.assertTrue(os.path.exists(os.path.join(self.media, broken)))
+
+        name = Student.objects.get(pk=other.pk).avatar.name
+        self.assertTrue(avatars.is_processed(name))
+        self.assertFalse(os.path.exists(os.path.join(self.media, legacy)))
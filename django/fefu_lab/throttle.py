@@ -0,0 +1,63 @@
+"""
+Ограничение частоты неудачных попыток входа.
+
+Неудачи считаются в кеше отдельно по IP и по учетной записи за окно
+LOGIN_THROTTLE_WINDOW секунд. Проверка выполняется до хеширования
+пароля, поэтому перебор не занимает воркеры вычислением PBKDF2.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[getattr(settings, 'LOGIN_THROTTLE_CACHE_ALIAS', 'default')]
+
+
+def client_ip(request):
+    if request is None:
+        return None
+    header = getattr(settings, 'LOGIN_THROTTLE_IP_HEADER', '')
+    return (header and request.META.get(header)) or request.META.get('REMOTE_ADDR')
+
+
+def _keys(request, username):
+    keys = []
+    ip = client_ip(request)
+    if ip:
+        keys.append((f'fefu_lab:login:ip:{ip}', settings.LOGIN_THROTTLE_IP_LIMIT))
+    if username:
+        keys.append((f'fefu_lab:login:account:{username.strip().lower()}', settings.LOGIN_THROTTLE_ACCOUNT_LIMIT))
+    return keys
+
+
+def is_enabled():
+    return getattr(settings, 'LOGIN_THROTTLE', True)
+
+
+def is_blocked(request, username):
+    """Превышен ли лимит неудачных попыток для IP или учетной записи"""
+    if not is_enabled():
+        return False
+    keys = _keys(request, username)
+    counts = _cache().get_many([key for key, _ in keys])
+    return any(counts.get(key, 0) >= limit for key, limit in keys)
+
+
+def register_failure(request, username):
+    if not is_enabled():
+        return
+    cache = _cache()
+    window = settings.LOGIN_THROTTLE_WINDOW
+    for key, _ in _keys(request, username):
+        # add не сдвигает окно: счетчик живет window секунд с первой неудачи
+        if not cache.add(key, 1, timeout=window):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=window)
+
+
+def reset(request, username):
+    """Успешный вход сбрасывает счетчик учетной записи (счетчик IP остается)"""
+    if is_enabled() and username:
+        _cache().delete(f'fefu_lab:login:account:{username.strip().lower()}')
@@ -1,57 +1,119 @@
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.contrib.auth import login as auth_login, logout as auth_logout, authenticate
+from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.core.paginator import Paginator
 
 from .forms import (
     FeedbackForm, UserRegistrationForm, EmailAuthenticationForm,
     EnrollmentForm, ProfileEditForm
 )
-from .models import Student, Course, Instructor, Enrollment
-from .decorators import role_required, student_required, teacher_required, admin_required
+from .models import Student, Course, Enrollment
+from .decorators import role_required, student_required, teacher_required, admin_required, get_profile
+from . import metrics as request_metrics
+from . import conditional, exports, page_cache, search, services, throttle
+from .services import EnrollmentResult
+from .pagination import KeysetPaginator
+from .stats import get_site_stats
+
+
+# Порядок сортировки списков; последний элемент делает ключ уникальным
+STUDENT_ORDERING = ('user__last_name', 'user__first_name', 'pk')
+COURSE_ORDERING = ('-created_at', 'pk')
+
+ENROLLMENT_ERRORS = {
+    EnrollmentResult.FULL: 'На этом курсе больше нет свободных мест.',
+    EnrollmentResult.DUPLICATE: 'Этот студент уже записан на данный курс.',
+    EnrollmentResult.CLOSED: 'Запись на этот курс закрыта.',
+}
+
+
+def keyset_ordering(queryset, ordering):
+    """Ключ курсорной пагинации: результаты поиска идут по релевантности, как в filter_*"""
+    if 'search_rank' in queryset.query.annotations:
+        return ('-search_rank', *ordering)
+    return tuple(ordering)
+
+
+def paginate(request, queryset, ordering, per_page):
+    """
+    Постраничный вывод списка: курсорная пагинация, если она включена
+    в настройках или в запросе передан cursor, иначе обычная по номеру страницы.
+    """
+    if settings.KEYSET_PAGINATION or 'cursor' in request.GET:
+        paginator = KeysetPaginator(
+            queryset, keyset_ordering(queryset, ordering), per_page,
+            count_limit=settings.KEYSET_PAGINATION_COUNT_LIMIT
+        )
+        return paginator.get_page(request.GET.get('cursor'))
+    
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
 
 
+@page_cache.cache_anonymous_page()
 def home(request):
-    total_students = Student.objects.filter(is_active=True).count()
-    total_courses = Course.objects.filter(is_active=True).count()
-    total_instructors = Instructor.objects.filter(is_active=True).count()
-    recent_courses = Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')[:3]
+    stats = get_site_stats()
+    recent_courses = list(
+        Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')[:3]
+    )
+    page_cache.depends_on(request, page_cache.CATALOG, page_cache.STATS, *page_cache.course_groups(recent_courses))
     
     ctx = {
         "title": "Главная",
-        "total_students": total_students,
-        "total_courses": total_courses,
-        "total_instructors": total_instructors,
+        "total_students": stats['active_students'],
+        "total_courses": stats['active_courses'],
+        "total_instructors": stats['active_instructors'],
         "recent_courses": recent_courses
     }
     return render(request, "fefu_lab/home.html", ctx)
 
 
+@page_cache.cache_anonymous_page()
 def about(request):
     return render(request, "fefu_lab/about.html", {"title": "О нас"})
 
 
-def student_list(request):
-    """Список студентов с поиском и фильтрацией"""
-    students = Student.objects.filter(is_active=True).select_related('user').order_by('user__last_name', 'user__first_name')
+def filter_students(request):
+    """Активные студенты с фильтрами search/faculty из GET-параметров"""
+    students = Student.objects.filter(is_active=True).select_related('user').order_by(*STUDENT_ORDERING)
     
     search_query = request.GET.get('search', '')
     if search_query:
-        students = students.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(user__email__icontains=search_query)
-        )
+        students = search.search(students, search_query).order_by('-search_rank', *STUDENT_ORDERING)
     
     faculty = request.GET.get('faculty', '')
     if faculty:
         students = students.filter(faculty=faculty)
     
-    paginator = Paginator(students, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    return students, search_query, faculty
+
+
+def filter_courses(request):
+    """Активные курсы с фильтрами search/level из GET-параметров"""
+    courses = Course.objects.filter(is_active=True).select_related('instructor').order_by(*COURSE_ORDERING)
+    
+    search_query = request.GET.get('search', '')
+    if search_query:
+        courses = search.search(courses, search_query).order_by('-search_rank', *COURSE_ORDERING)
+    
+    level = request.GET.get('level', '')
+    if level:
+        courses = courses.filter(level=level)
+    
+    return courses, search_query, level
+
+
+@conditional.conditional_page(conditional.student_list_state)
+def student_list(request):
+    """Список студентов с поиском и фильтрацией"""
+    students, search_query, faculty = filter_students(request)
+    page_obj = paginate(request, students, STUDENT_ORDERING, 10)
     
     context = {
         'title': 'Студенты',
@@ -63,15 +125,16 @@ def student_list(request):
     return render(request, 'fefu_lab/student_list.html', context)
 
 
+@conditional.conditional_page(conditional.student_detail_state)
 def student_detail(request, student_id):
     """Детальная информация о студенте"""
     student = get_object_or_404(
-        Student.objects.prefetch_related('enrollments__course').select_related('user'),
+        Student.objects.select_related('user'),
         pk=student_id,
         is_active=True
     )
     
-    enrollments = student.enrollments.filter(status='ACTIVE').select_related('course')
+    enrollments = student.enrollments.filter(status='ACTIVE').select_related('course__instructor')
     
     context = {
         'title': f'{student.full_name}',
@@ -82,42 +145,37 @@ def student_detail(request, student_id):
     return render(request, 'fefu_lab/student_detail.html', context)
 
 
+@page_cache.cache_anonymous_page(params=('search', 'level', 'page', 'cursor'))
+@conditional.conditional_page(conditional.course_list_state)
 def course_list(request):
     """Список курсов"""
-    courses = Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')
-    
-    search_query = request.GET.get('search', '')
-    if search_query:
-        courses = courses.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-    
-    level = request.GET.get('level', '')
-    if level:
-        courses = courses.filter(level=level)
-    
-    paginator = Paginator(courses, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    courses, search_query, level = filter_courses(request)
+    page_obj = paginate(request, courses, COURSE_ORDERING, 9)
+    # Карточки курсов кешируются как фрагменты с версией курса в ключе
+    page_obj.object_list = page_cache.attach_versions(page_obj.object_list)
+    page_cache.depends_on(request, page_cache.CATALOG, *page_cache.course_groups(page_obj.object_list))
     
     context = {
         'title': 'Курсы',
         'page_obj': page_obj,
         'search_query': search_query,
         'level': level,
-        'level_choices': Course.LEVEL_CHOICES
+        'level_choices': Course.LEVEL_CHOICES,
+        'card_cache_timeout': settings.PAGE_CACHE_FRAGMENT_TIMEOUT,
     }
     return render(request, 'fefu_lab/course_list.html', context)
 
 
+@page_cache.cache_anonymous_page()
+@conditional.conditional_page(conditional.course_detail_state)
 def course_detail(request, course_slug):
     """Детальная информация о курсе"""
     course = get_object_or_404(
-        Course.objects.select_related('instructor').prefetch_related('enrollments'),
+        Course.objects.select_related('instructor'),
         slug=course_slug,
         is_active=True
     )
+    page_cache.depends_on(request, *page_cache.course_groups([course]))
     
     context = {
         'title': course.title,
@@ -130,20 +188,20 @@ def course_detail(request, course_slug):
 @login_required(login_url='/login/')
 def enroll_student(request, course_slug):
     """Запись студента на курс"""
-    course = get_object_or_404(Course, slug=course_slug, is_active=True)
+    course = get_object_or_404(Course.objects.select_related('instructor'), slug=course_slug, is_active=True)
     
     if request.method == 'POST':
         form = EnrollmentForm(request.POST)
         if form.is_valid():
-            try:
-                enrollment = form.save()
+            result = services.enroll_student(form.cleaned_data['student'], form.cleaned_data['course'])
+            if result.ok:
+                enrollment = result.enrollment
                 messages.success(
                     request,
                     f'Студент {enrollment.student.full_name} успешно записан на курс {enrollment.course.title}!'
                 )
                 return redirect('fefu_lab:course_detail', course_slug=course_slug)
-            except Exception as e:
-                messages.error(request, f'Ошибка при записи: {str(e)}')
+            messages.error(request, ENROLLMENT_ERRORS[result.status])
     else:
         form = EnrollmentForm(initial={'course': course})
     
@@ -197,17 +255,14 @@ def login_view(request):
     if request.method == 'POST':
         form = EmailAuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            email = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(request, username=email, password=password)
-            
-            if user is not None:
-                auth_login(request, user)
-                messages.success(request, f'Добро пожаловать, {user.first_name}!')
-                next_url = request.GET.get('next', 'fefu_lab:profile')
-                return redirect(next_url)
-            else:
-                messages.error(request, 'Неверный email или пароль.')
+            # Форма уже проверила пароль - повторный authenticate хешировал бы его еще раз
+            user = form.get_user()
+            auth_login(request, user)
+            messages.success(request, f'Добро пожаловать, {user.first_name}!')
+            next_url = request.GET.get('next', 'fefu_lab:profile')
+            return redirect(next_url)
+        elif form.has_error(NON_FIELD_ERRORS, 'throttled'):
+            messages.error(request, form.error_messages['throttled'])
         else:
             messages.error(request, 'Неверный email или пароль.')
     else:
@@ -230,12 +285,11 @@ def logout_view(request):
 @login_required(login_url='/login/')
 def profile(request):
     """Профиль пользователя"""
-    if not hasattr(request.user, 'student_profile'):
+    profile = get_profile(request.user)
+    if profile is None:
         messages.error(request, 'Профиль не найден.')
         return redirect('fefu_lab:index')
     
-    profile = request.user.student_profile
-    
     if request.method == 'POST':
         form = ProfileEditForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
@@ -257,7 +311,7 @@ def profile(request):
 @student_required
 def student_dashboard(request):
     """Личный кабинет студента"""
-    profile = request.user.student_profile
+    profile = get_profile(request.user)
     enrollments = Enrollment.objects.filter(
         student=profile,
         status='ACTIVE'
@@ -275,7 +329,7 @@ def student_dashboard(request):
 @teacher_required
 def teacher_dashboard(request):
     """Личный кабинет преподавателя"""
-    profile = request.user.student_profile
+    profile = get_profile(request.user)
     # Здесь можно добавить логику для курсов преподавателя
     courses = Course.objects.filter(is_active=True)
     
@@ -291,20 +345,86 @@ def teacher_dashboard(request):
 @admin_required
 def admin_dashboard(request):
     """Панель администратора"""
-    profile = request.user.student_profile
-    total_users = Student.objects.count()
-    total_courses = Course.objects.count()
-    total_enrollments = Enrollment.objects.count()
+    profile = get_profile(request.user)
+    stats = get_site_stats()
     
     context = {
         'title': 'Панель администратора',
         'profile': profile,
-        'total_users': total_users,
-        'total_courses': total_courses,
-        'total_enrollments': total_enrollments
+        'total_users': stats['total_students'],
+        'total_courses': stats['total_courses'],
+        'total_enrollments': stats['total_enrollments']
     }
     return render(request, 'fefu_lab/dashboard/admin_dashboard.html', context)
 
 
+@login_required(login_url='/login/')
+@admin_required
+def export_students(request):
+    """Выгрузка студентов (те же фильтры, что и в списке)"""
+    students, _, _ = filter_students(request)
+    return exports.export_response(request, 'students', students, exports.STUDENT_COLUMNS)
+
+
+@login_required(login_url='/login/')
+@admin_required
+def export_courses(request):
+    """Выгрузка курсов с преподавателями (те же фильтры, что и в списке)"""
+    courses, _, _ = filter_courses(request)
+    return exports.export_response(request, 'courses', courses, exports.COURSE_COLUMNS)
+
+
+@login_required(login_url='/login/')
+@admin_required
+def export_enrollments(request):
+    """Выгрузка записей на курсы с фильтрами по курсу и статусу"""
+    enrollments = Enrollment.objects.order_by('pk')
+    course_slug = request.GET.get('course', '')
+    if course_slug:
+        enrollments = enrollments.filter(course__slug=course_slug)
+    status = request.GET.get('status', '')
+    if status:
+        enrollments = enrollments.filter(status=status)
+    return exports.export_response(request, 'enrollments', enrollments, exports.ENROLLMENT_COLUMNS)
+
+
+def metrics(request):
+    """Метрики запросов всех воркеров в формате Prometheus"""
+    # За прокси REMOTE_ADDR - адрес nginx: клиент определяется как для лимита входа
+    if throttle.client_ip(request) not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    
+    # Все разделы - из одного чтения файлов воркеров
+    files = request_metrics.collect_worker_files()
+    merged = request_metrics.merge_snapshots(request_metrics.collect_snapshots(files))
+    return HttpResponse(
+        request_metrics.render_prometheus(
+            merged, request_metrics.collect_workers(files), request_metrics.collect_cache_stats(files)
+        ),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def health(request):
+    """
+    Проверка живости воркера для балансировщика: 200, если доступна БД,
+    иначе 503. Состояние воркеров - только для доверенных адресов
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        status = 'ok'
+    except DatabaseError:
+        status = 'db_unavailable'
+    
+    data = {'status': status}
+    if throttle.client_ip(request) in settings.METRICS_ALLOWED_IPS or request.user.is_staff:
+        data['worker'] = request_metrics.worker_info()
+        data['workers'] = request_metrics.collect_workers()
+    response = JsonResponse(data, status=200 if status == 'ok' else 503)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 def page_not_found(request, exception):
     return render(request, '404.html', status=404)
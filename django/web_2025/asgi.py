@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web_2025.settings')
+# Под ASGI-сервером страницы каталога обслуживают асинхронные представления
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,119 @@
+"""
+Конфигурация gunicorn для продакшена.
+
+    gunicorn -c python:web_2025.gunicorn_conf
+
+Все параметры задаются переменными окружения GUNICORN_*; по умолчанию
+число воркеров и потоков считается от доступных процессу CPU (с учетом
+affinity и квоты cgroup контейнера). Приложение загружается в мастере
+(preload) и прогревается до fork, воркеры перезапускаются после
+max_requests (+ случайный jitter, чтобы не перезапускаться одновременно).
+Код на HUP с preload не перечитывается - при выкладке нужен restart.
+"""
+import gc
+import math
+import os
+
+
+def _env(name, default):
+    return os.environ.get(f'GUNICORN_{name}', default)
+
+
+def _env_int(name, default):
+    value = _env(name, '')
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = _env(name, '')
+    return value.lower() in ('true', '1', 'yes') if value else default
+
+
+def available_cpus():
+    """CPU, доступные процессу: affinity и квота cgroup v2 (docker --cpus)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as fh:
+            quota, period = fh.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+CPUS = available_cpus()
+
+wsgi_app = _env('APP', 'web_2025.wsgi:application')
+IS_ASGI = '.asgi:' in wsgi_app
+
+# Процессы - по числу CPU (Python-код не выполняется параллельно в потоках),
+# потоки синхронного стека ждут БД и медленных клиентов; в ASGI ожидание
+# берет на себя цикл событий
+workers = _env_int('WORKERS', min(CPUS if IS_ASGI else CPUS + 1, _env_int('MAX_WORKERS', 16)))
+threads = _env_int('THREADS', 1 if IS_ASGI else 4)
+worker_class = _env('WORKER_CLASS', 'uvicorn_worker.UvicornWorker' if IS_ASGI else 'gthread' if threads > 1 else 'sync')
+
+# Бюджет соединений с БД делится между воркерами (DB_POOL_* в settings)
+os.environ.setdefault('DB_POOL_WORKERS', str(workers))
+
+bind = _env('BIND', '127.0.0.1:8000').split(',')
+backlog = _env_int('BACKLOG', 2048)
+timeout = _env_int('TIMEOUT', 30)
+graceful_timeout = _env_int('GRACEFUL_TIMEOUT', 30)
+# За nginx соединения держит он; keep-alive к nginx короткий
+keepalive = _env_int('KEEPALIVE', 5)
+
+preload_app = _env_bool('PRELOAD', True)
+WARMUP = _env_bool('WARMUP', True)
+
+max_requests = _env_int('MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('MAX_REQUESTS_JITTER', max_requests // 10)
+
+# Файлы heartbeat воркеров в памяти: на overlayfs/диске fsync может подвесить воркер
+worker_tmp_dir = _env('WORKER_TMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+# Пустое значение отключает журнал доступа
+accesslog = _env('ACCESS_LOG', '-') or None
+errorlog = _env('ERROR_LOG', '-')
+loglevel = _env('LOG_LEVEL', 'info')
+proc_name = _env('PROC_NAME', 'fefu_lab')
+
+
+def _warm_up(log):
+    from web_2025.warmup import warm_up
+
+    timings = warm_up()
+    log.info('Прогрев: %s', ', '.join(
+        f'{name} {count} за {seconds * 1000:.0f} мс' for name, (count, seconds) in timings.items()
+    ))
+
+
+def when_ready(server):
+    server.log.info(
+        'CPU: %d, воркеров: %d (%s), потоков: %d, preload: %s, max_requests: %d±%d',
+        CPUS, server.cfg.workers, server.cfg.worker_class_str, server.cfg.threads,
+        server.cfg.preload_app, server.cfg.max_requests, server.cfg.max_requests_jitter,
+    )
+    if server.cfg.preload_app and WARMUP:
+        _warm_up(server.log)
+        # Объекты прогрева не попадают в сборку мусора: GC не трогает их
+        # заголовки в воркерах, и страницы памяти остаются общими
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app and WARMUP:
+        _warm_up(worker.log)
+
+
+def worker_abort(worker):
+    # SIGABRT по таймауту: стек зависшего воркера в лог ошибок
+    import faulthandler
+    import sys
+
+    faulthandler.dump_traceback(file=sys.stderr, all_threads=True)
+
@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fefu_lab.middleware.RequestMetricsMiddleware',
+    'fefu_lab.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,7 +54,8 @@ ROOT_URLCONF = 'web_2025.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для метрик запросов
+        'BACKEND': 'fefu_lab.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -60,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'fefu_lab.context_processors.user_role',
             ],
         },
     },
@@ -95,6 +99,62 @@ else:
         }
     }
 
+# Реплики только для чтения (см. fefu_lab.db_router и блок READ REPLICAS):
+# хосты PostgreSQL через пробел, остальные параметры - как у основной БД;
+# без DB_HOST - файлы SQLite (например, копия db.sqlite3 для локальной проверки)
+DB_REPLICAS = []
+for _number, _location in enumerate(os.environ.get('DB_REPLICA_HOSTS', '').split(), start=1):
+    _alias = f'replica{_number}'
+    if os.environ.get('DB_HOST'):
+        DATABASES[_alias] = {
+            **DATABASES['default'],
+            'HOST': _location,
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+            'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+            # Недоступная реплика не должна надолго задерживать запрос
+            'OPTIONS': {'connect_timeout': int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', '2'))},
+        }
+    else:
+        DATABASES[_alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': _location}
+    # В тестах реплика - та же тестовая база
+    DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+    DB_REPLICAS.append(_alias)
+
+# Повторное использование соединений. Без него каждый запрос каждого воркера
+# заново открывает соединение (TCP, TLS, аутентификация в PostgreSQL).
+# DB_CONN_MAX_AGE - сколько секунд поток воркера держит соединение между
+# запросами; перед повторным использованием в новом запросе оно проверяется
+# (DB_CONN_HEALTH_CHECKS), оборванное соединение открывается заново.
+# Под ASGI запросы обслуживают разные потоки, и постоянные соединения там
+# не переиспользуются - вместо них пул psycopg 3 (DB_POOL, только PostgreSQL,
+# нужен пакет psycopg[binary,pool])
+DB_POOL = os.environ.get('DB_POOL', 'False').lower() in ('true', '1', 'yes')
+DB_CONN_MAX_AGE = 0 if DB_POOL else int(os.environ.get(
+    'DB_CONN_MAX_AGE',
+    '0' if os.environ.get('ASYNC_VIEWS', 'False').lower() in ('true', '1', 'yes') else '60'
+))
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True').lower() in ('true', '1', 'yes')
+
+# Размер пула на воркер: бюджет соединений приложения (меньше max_connections
+# сервера БД) делится между воркерами; число воркеров выставляет web_2025.gunicorn_conf
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', '80'))
+DB_POOL_WORKERS = int(os.environ.get('DB_POOL_WORKERS', '1'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', max(2, DB_MAX_CONNECTIONS // DB_POOL_WORKERS)))
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', min(2, DB_POOL_MAX_SIZE)))
+# Сколько секунд запрос ждет свободное соединение пула
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+
+for _database in DATABASES.values():
+    _database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    _database['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+    if DB_POOL and _database['ENGINE'] == 'django.db.backends.postgresql':
+        _database['OPTIONS'] = {**_database.get('OPTIONS', {}), 'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }}
+
 
 # Password validation
 
@@ -154,4 +214,189 @@ LOGOUT_REDIRECT_URL = '/'
 SESSION_COOKIE_AGE = 1209600  # 2 недели
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_SECURE = not DEBUG  # True только если DEBUG=False (продакшен)
-CSRF_COOKIE_SECURE = not DEBUG     # True только если DEBUG=False (продакшен)
\ No newline at end of file
+CSRF_COOKIE_SECURE = not DEBUG     # True только если DEBUG=False (продакшен)
+
+
+# ===================================================
+# REQUEST METRICS
+# ===================================================
+
+# Каталог для обмена метриками между воркерами gunicorn (пусто - только текущий процесс)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))
+# Размер окна последних запросов для квантилей
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', '500'))
+METRICS_RESPONSE_HEADERS = os.environ.get('METRICS_RESPONSE_HEADERS', 'True').lower() in ('true', '1', 'yes')
+# Бюджеты, при превышении которых в лог пишутся SQL-запросы
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', '20'))
+METRICS_TIME_BUDGET_MS = float(os.environ.get('METRICS_TIME_BUDGET_MS', '500'))
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1 ::1').split(' ')
+METRICS_EXCLUDE_VIEWS = ['fefu_lab:metrics', 'fefu_lab:health']
+
+
+# ===================================================
+# SITE STATISTICS
+# ===================================================
+
+# Время жизни кеша сводной статистики (главная, панель администратора), секунды
+SITE_STATS_TTL = int(os.environ.get('SITE_STATS_TTL', '60'))
+SITE_STATS_LOCK_TIMEOUT = int(os.environ.get('SITE_STATS_LOCK_TIMEOUT', '10'))
+
+
+# ===================================================
+# PAGINATION
+# ===================================================
+
+# Курсорная пагинация списков студентов и курсов (без COUNT(*) и OFFSET)
+KEYSET_PAGINATION = os.environ.get('KEYSET_PAGINATION', 'False').lower() in ('true', '1', 'yes')
+# До скольких строк считать точное количество найденных записей (0 - не считать)
+KEYSET_PAGINATION_COUNT_LIMIT = int(os.environ.get('KEYSET_PAGINATION_COUNT_LIMIT', '1000'))
+
+
+# ===================================================
+# STUDENT IMPORT
+# ===================================================
+
+# Импорт CSV из админки хеширует пароли в запросе (~0.5 с на строку): файлы,
+# где паролей больше, загружаются командой manage.py import_students
+STUDENT_IMPORT_ADMIN_MAX_PASSWORDS = int(os.environ.get('STUDENT_IMPORT_ADMIN_MAX_PASSWORDS', '20'))
+
+
+# ===================================================
+# AUTH USER CACHE
+# ===================================================
+
+# Снимок пользователя сессии с профилем в кеше вместо запроса к БД на каждый запрос.
+# Включать только с общим для воркеров кешем (см. проверку fefu_lab.W001)
+AUTH_USER_CACHE = os.environ.get('AUTH_USER_CACHE', 'False').lower() in ('true', '1', 'yes')
+AUTH_USER_CACHE_ALIAS = os.environ.get('AUTH_USER_CACHE_ALIAS', 'default')
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', '300'))
+
+
+# ===================================================
+# LOGIN THROTTLING
+# ===================================================
+
+# Лимиты неудачных попыток входа за окно; проверяются до хеширования пароля
+LOGIN_THROTTLE = os.environ.get('LOGIN_THROTTLE', 'True').lower() in ('true', '1', 'yes')
+LOGIN_THROTTLE_CACHE_ALIAS = os.environ.get('LOGIN_THROTTLE_CACHE_ALIAS', 'default')
+LOGIN_THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW', '300'))
+LOGIN_THROTTLE_IP_LIMIT = int(os.environ.get('LOGIN_THROTTLE_IP_LIMIT', '20'))
+LOGIN_THROTTLE_ACCOUNT_LIMIT = int(os.environ.get('LOGIN_THROTTLE_ACCOUNT_LIMIT', '5'))
+# Заголовок с адресом клиента за прокси (пусто - REMOTE_ADDR); за deploy/nginx - HTTP_X_REAL_IP
+LOGIN_THROTTLE_IP_HEADER = os.environ.get('LOGIN_THROTTLE_IP_HEADER', '')
+
+
+# ===================================================
+# PAGE CACHE
+# ===================================================
+
+# Кеш страниц каталога для анонимных посетителей и карточек курсов; сбрасывается
+# сигналами моделей, таймауты - только верхняя граница жизни записи
+PAGE_CACHE = os.environ.get('PAGE_CACHE', 'True').lower() in ('true', '1', 'yes')
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '600'))
+PAGE_CACHE_FRAGMENT_TIMEOUT = int(os.environ.get('PAGE_CACHE_FRAGMENT_TIMEOUT', '600'))
+
+
+# ===================================================
+# CONDITIONAL GET
+# ===================================================
+
+# ETag / Last-Modified для страниц каталога и ответ 304 без отрисовки
+CONDITIONAL_GET = os.environ.get('CONDITIONAL_GET', 'True').lower() in ('true', '1', 'yes')
+# Входит в ETag: меняется при выкладке, если изменились шаблоны страниц
+CONDITIONAL_GET_VERSION = os.environ.get('CONDITIONAL_GET_VERSION', '1')
+
+
+# ===================================================
+# ASYNC VIEWS
+# ===================================================
+
+# Асинхронные страницы каталога (fefu_lab.async_views); web_2025.asgi
+# включает их по умолчанию, WSGI-стек остается на синхронных
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False').lower() in ('true', '1', 'yes')
+
+
+# ===================================================
+# READ REPLICAS
+# ===================================================
+
+# Реплики задаются в DB_REPLICA_HOSTS (блок DATABASE CONFIGURATION)
+DATABASE_ROUTERS = ['fefu_lab.db_router.ReplicaRouter']
+# Представления, чьи GET-запросы читают с реплики (шаблоны fnmatch)
+DB_REPLICA_VIEWS = os.environ.get(
+    'DB_REPLICA_VIEWS',
+    'fefu_lab:index fefu_lab:student_list fefu_lab:student_detail fefu_lab:course_list '
+    'fefu_lab:course_detail fefu_lab:*_dashboard fefu_lab:export_* admin:fefu_lab_*_changelist'
+).split()
+# Приложения, модели которых читаются с реплики; пользователи и сессии - всегда с основной БД
+DB_REPLICA_APPS = os.environ.get('DB_REPLICA_APPS', 'fefu_lab').split()
+# Сколько секунд после записи посетитель читает с основной БД
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '15'))
+DB_REPLICA_PIN_COOKIE = os.environ.get('DB_REPLICA_PIN_COOKIE', 'db_pin')
+# Допустимое отставание реплики и период повторной проверки, секунды
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+DB_REPLICA_HEALTH_INTERVAL = float(os.environ.get('DB_REPLICA_HEALTH_INTERVAL', '5'))
+
+
+# ===================================================
+# SESSIONS
+# ===================================================
+
+# Хранилище сессий (fefu_lab.sessions, неизмененная сессия не сохраняется):
+# db; cached_db - чтение из кеша, запись в кеш и БД; cache - только кеш
+# (сессии теряются при его очистке). cached_db и cache - только с общим
+# для воркеров кешем (см. проверку fefu_lab.W002)
+SESSION_STORE = os.environ.get('SESSION_STORE', 'db')
+SESSION_ENGINE = f'fefu_lab.sessions.{SESSION_STORE}'
+SESSION_CACHE_ALIAS = os.environ.get('SESSION_CACHE_ALIAS', 'default')
+# Очистка истекших сессий (manage.py clear_expired_sessions): строк за один DELETE
+SESSION_SWEEP_BATCH_SIZE = int(os.environ.get('SESSION_SWEEP_BATCH_SIZE', '1000'))
+
+
+# ===================================================
+# CACHE
+# ===================================================
+
+# Кеш по умолчанию (fefu_lab.caching): sqlite - файл на локальном диске, общий
+# для воркеров машины; redis - для нескольких машин (CACHE_REDIS_URL, нужен
+# пакет redis); locmem - свой в каждом процессе, только для разработки
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', str(BASE_DIR / 'cache.sqlite3'))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '100000'))
+
+if CACHE_BACKEND == 'redis':
+    _cache = {'BACKEND': 'fefu_lab.caching.RedisCache', 'LOCATION': CACHE_REDIS_URL}
+elif CACHE_BACKEND == 'locmem':
+    _cache = {'BACKEND': 'fefu_lab.caching.LocMemCache', 'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES}}
+else:
+    _cache = {
+        'BACKEND': 'fefu_lab.caching.SQLiteCache',
+        'LOCATION': CACHE_SQLITE_PATH,
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }
+CACHES = {
+    'default': {
+        **_cache,
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'fefu'),
+    }
+}
+
+
+# ===================================================
+# AVATARS
+# ===================================================
+
+# Проверка загрузки аватара (fefu_lab.avatars): размер файла, форматы Pillow, пиксели
+AVATAR_MAX_UPLOAD_SIZE = int(os.environ.get('AVATAR_MAX_UPLOAD_SIZE', str(5 * 2 ** 20)))
+AVATAR_FORMATS = os.environ.get('AVATAR_FORMATS', 'JPEG PNG WEBP GIF').split()
+AVATAR_MAX_PIXELS = int(os.environ.get('AVATAR_MAX_PIXELS', '40000000'))
+# Основное изображение - не больше AVATAR_SIZE по большей стороне; миниатюры квадратные
+AVATAR_SIZE = int(os.environ.get('AVATAR_SIZE', '512'))
+AVATAR_THUMBNAIL_SIZES = [int(size) for size in os.environ.get('AVATAR_THUMBNAIL_SIZES', '64 160').split()]
+AVATAR_JPEG_QUALITY = int(os.environ.get('AVATAR_JPEG_QUALITY', '85'))
+AVATAR_WEBP_QUALITY = int(os.environ.get('AVATAR_WEBP_QUALITY', '80'))
+# Обработка в пуле потоков воркера после ответа; False - сразу после сохранения профиля
+AVATAR_ASYNC = os.environ.get('AVATAR_ASYNC', 'True').lower() in ('true', '1', 'yes')
+AVATAR_WORKERS = int(os.environ.get('AVATAR_WORKERS', '2'))
@@ -0,0 +1,65 @@
+"""
+Прогрев процесса до приема запросов.
+
+С preload_app gunicorn выполняет его в мастере до fork: таблицы URL,
+скомпилированные шаблоны и метаданные моделей попадают в общую
+copy-on-write память воркеров, и первый запрос каждого воркера не
+платит за их построение. Соединения с БД не открываются.
+"""
+import os
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+def warm_urls(resolver=None):
+    """Таблицы reverse() корневого резолвера и всех пространств имен"""
+    resolver = resolver or get_resolver()
+    # reverse_dict строит таблицы обратного разрешения для текущего языка
+    count = len(resolver.reverse_dict)
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        count += warm_urls(namespace_resolver)
+    return count
+
+
+def warm_models():
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+    return len(models)
+
+
+def template_names(engine):
+    for directory in engine.template_dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(('.html', '.txt')):
+                    yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    """Загрузка шаблонов в кеш cached.Loader (он включен и при DEBUG)"""
+    loaded = 0
+    for engine in engines.all():
+        for name in set(template_names(engine)):
+            try:
+                engine.get_template(name)
+            except (TemplateDoesNotExist, TemplateSyntaxError):
+                continue
+            loaded += 1
+    return loaded
+
+
+def warm_up():
+    """Прогрев с замером времени каждого шага: {шаг: (количество, секунды)}"""
+    timings = {}
+    for name, step in (('urls', warm_urls), ('models', warm_models), ('templates', warm_templates)):
+        started = time.perf_counter()
+        count = step()
+        timings[name] = (count, time.perf_counter() - started)
+    # Соединение, открытое мастером, нельзя разделять между воркерами
+    connections.close_all()
+    return timings